@@ -0,0 +1,8 @@
+"""Benchmarks for mtgcard.
+
+Run a benchmark module from the source directory (needs a generated
+database), e.g.:
+
+    python3 -m benchmarks.bench_get_cards
+
+"""
@@ -0,0 +1,88 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark `Interface.get_cards` against always joining legalities/prices.
+
+The 'joined' statement is the search as it was before format and price
+terms became semi-joins: every printing is multiplied by its legalities
+rows before `GROUP BY v_name` collapses them again.
+
+"""
+
+import sys
+import timeit
+
+from mtgcard import mtgdb
+from mtgcard.parser import parser
+
+
+QUERIES = ["", "t:creature c:r"]
+
+joined_sql = '''
+WITH main_first AS (
+    SELECT
+        v_name,
+        cards.name,cards.uuid,printings,setCode,convertedManaCost,
+        manaCost,power,toughness,loyalty,types,cards.type,rarity,
+        cards.text,layout,v_names,side,
+        max(setcode) OVER
+        (ORDER BY sets.type collate main_sets_first DESC,
+                  releaseDate DESC
+        ) latest_main,
+        colors_sp,
+        prices.price,prices.date
+    FROM card_search AS cards
+        JOIN sets ON cards.setCode = sets.code
+        LEFT JOIN legalities ON cards.uuid = legalities.uuid
+        LEFT JOIN prices ON cards.uuid = prices.uuid
+            AND prices.type = 'paper'
+    WHERE listed {where:s}
+) SELECT * FROM main_first
+GROUP BY v_name
+ORDER BY v_name
+'''
+
+
+def bench(fn, number):
+    """Return the best time of `fn` per call in milliseconds."""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1000
+
+
+def main(number=5):
+    db = mtgdb.Interface()
+    print("{:20s} {:>12s} {:>12s} {:>8s}".format(
+        "query", "joined (ms)", "current (ms)", "speedup"))
+    for q in QUERIES:
+        query = parser.parse(q) if q else ("", ())
+        where = " AND ({:s})".format(query[0]) if query[0] else ""
+        sql = joined_sql.format(where=where)
+
+        def joined():
+            db.cursor.execute(sql, query[1])
+            for result in db.cursor.fetchall():
+                db.card_from_result(result)
+
+        def current():
+            db.get_cards(query)
+
+        t_joined = bench(joined, number)
+        t_current = bench(current, number)
+        print("{:20s} {:12.1f} {:12.1f} {:7.1f}x".format(
+            repr(q), t_joined, t_current, t_joined / t_current))
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
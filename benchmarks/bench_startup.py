@@ -0,0 +1,89 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Benchmark the start-up of mtgcard with `python -X importtime`.
+
+Imports are timed in fresh interpreters, then the construction of the
+parser from the shipped tables and from the grammar. Exits with status 1
+if importing `mtgcard.mtgcard` builds the parser.
+
+"""
+
+import sys
+import timeit
+import subprocess
+
+from mtgcard import parser as parser_module
+
+
+MODULES = ["mtgcard.parser", "mtgcard.mtgdb", "mtgcard.mtgcard"]
+
+
+def import_times(module, repeat=5):
+    """Return the best cumulative import times of mtgcard modules in ms.
+
+    :param str module: module imported by the interpreter
+    :param int repeat: number of interpreters started
+
+    """
+    best = {}
+    for i in range(repeat):
+        err = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", "import " + module],
+            stderr=subprocess.PIPE, check=True).stderr.decode()
+        for line in err.splitlines():
+            # import time: self [us] | cumulative | imported package
+            fields = line.split("|")
+            if len(fields) != 3 or not fields[1].strip().isdigit():
+                continue
+            name = fields[2].strip()
+            if name.startswith("mtgcard"):
+                ms = int(fields[1]) / 1000
+                best[name] = min(best.get(name, ms), ms)
+    return best
+
+
+def bench(fn, number):
+    """Return the best time of `fn` per call in milliseconds."""
+    return min(timeit.repeat(fn, number=number, repeat=3)) / number * 1000
+
+
+def main(number=5):
+    times = import_times("mtgcard.mtgcard", number)
+    print("{:20s} {:>12s}".format("import", "cumul. (ms)"))
+    for module in MODULES:
+        print("{:20s} {:12.1f}".format(module, times[module]))
+    print()
+
+    def shipped():
+        parser_module._lexer()
+        parser_module._parser()
+
+    def generated():
+        parser_module._lexer(optimize=False)
+        parser_module._parser(optimize=False, tabmodule="mtgcard.no_tab")
+
+    print("{:20s} {:>12s}".format("parser build", "(ms)"))
+    print("{:20s} {:12.1f}".format("shipped tables", bench(shipped, number)))
+    print("{:20s} {:12.1f}".format("from grammar", bench(generated, number)))
+
+    if "mtgcard.yacctab" in times:
+        print("error: importing mtgcard.mtgcard builds the parser")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main(*map(int, sys.argv[1:]))
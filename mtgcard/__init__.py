@@ -39,6 +39,12 @@ def get_defaults():
                 "commander",
                 "vintage",
             ]
+            DB_READ_ONLY = True
+            DB_MMAP_SIZE = 268435456
+            DB_CACHE_SIZE = -32768
+            SERVER_SOCKET = None
+            QUERY_CACHE_SIZE = 256
+            SEARCH_ENGINE = "sqlite"
 
     if "ANSI_COLOR" not in dir(settings):
         settings.ANSI_COLOR = True
@@ -59,6 +65,18 @@ def get_defaults():
                 "commander",
                 "vintage",
                 ]
+    if "DB_READ_ONLY" not in dir(settings):
+        settings.DB_READ_ONLY = True
+    if "DB_MMAP_SIZE" not in dir(settings):
+        settings.DB_MMAP_SIZE = 268435456
+    if "DB_CACHE_SIZE" not in dir(settings):
+        settings.DB_CACHE_SIZE = -32768
+    if "SERVER_SOCKET" not in dir(settings):
+        settings.SERVER_SOCKET = None
+    if "QUERY_CACHE_SIZE" not in dir(settings):
+        settings.QUERY_CACHE_SIZE = 256
+    if "SEARCH_ENGINE" not in dir(settings):
+        settings.SEARCH_ENGINE = "sqlite"
 
 
 get_defaults()
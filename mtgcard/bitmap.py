@@ -0,0 +1,406 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Bitmap indexes of categorical search terms.
+
+A bitmap is a Python int whose bit N is set for the printing with
+`card_search` id N. `build_bitmaps` indexes the printings by set,
+rarity, layout, format, type word (including the other faces, as type
+searches check them) and color mask; `write_bitmaps` stores them in the
+`bitmaps` table of the database when it is updated.
+
+`BitmapInterface` evaluates the condition tree of a parsed query (see
+`mtgcard.parser.Query`) with bitwise operations on these bitmaps. Other
+terms are evaluated by SQLite into bitmaps. Only the printings found are
+read from the database to build cards.
+
+Conditions are three-valued as in SQL: bitmaps (true, unknown), a
+printing being unknown where SQL compares a NULL.
+
+"""
+
+import json
+import zlib
+import base64
+import sqlite3
+
+from mtgcard.mtgdb import Interface, r_namesep
+from mtgcard.parser import Term, Not, And, Or
+from mtgcard.parser import COLOR_BITS, OTHER_LAYOUTS
+
+
+BITMAPS_VERSION = 2
+
+# columns with a bitmap per value, as searched in `Term.search`
+CATEGORIES = (
+    "cards.setCode",
+    "cards.rarity",
+    "cards.layout",
+    "legalities.format",
+    "cards.type",
+)
+
+
+def bitmap(ids):
+    """Return the bitmap of the printings `ids`.
+
+    :param iterable ids: `card_search` ids
+
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    b = bytearray(max(ids) // 8 + 1)
+    for id in ids:
+        b[id >> 3] |= 1 << (id & 7)
+    return int.from_bytes(b, "little")
+
+
+def bitmap_ids(bits):
+    """Return the ids of the printings in bitmap `bits`, in order.
+
+    :param int bits: bitmap
+
+    """
+    ids = []
+    b = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    for i, byte in enumerate(b):
+        while byte:
+            low = byte & -byte
+            ids.append(i * 8 + low.bit_length() - 1)
+            byte ^= low
+    return ids
+
+
+def lower(s):
+    """Return `s` lowered as by SQLite's lower().
+
+    :param str s: string
+
+    """
+    return "".join(
+        chr(ord(c) + 32) if "A" <= c <= "Z" else c for c in s
+    )
+
+
+def color_matches(op, value, mask):
+    """Return whether color mask `mask` meets a colors search.
+
+    :param str op:    comparison operator (see `parser.color_term`)
+    :param str value: searched colors
+    :param int mask:  mask of `COLOR_BITS`
+
+    """
+    letters = set(value.lower())
+    searched = 0
+    for letter in letters:
+        searched |= COLOR_BITS.get(letter, 1 << len(COLOR_BITS))
+
+    popcount = bin(mask & ((1 << len(COLOR_BITS)) - 1)).count("1")
+    matches = {
+        "=": popcount == len(letters),
+        "!=": popcount != len(letters),
+        "<": popcount < len(letters),
+        "<=": popcount <= len(letters),
+        ">": popcount > len(letters),
+        ">=": popcount >= len(letters),
+    }[op]
+    if op in ("=", "<", "<="):
+        matches = matches and (mask & searched) == mask
+    if op in ("=", ">", ">="):
+        matches = matches and (mask & searched) == searched
+    return matches
+
+
+def build_bitmaps(cursor):
+    """Return the bitmaps of the database of `cursor`.
+
+    :param sqlite3.Cursor cursor: cursor of the database
+
+    Return a dict with the printings counted ("count", "max_id"), the
+    bitmap of all printings ("all"), the bitmaps by column and value
+    ("values"), of NULL values by column ("nulls"), and by color mask of
+    the printings ("colors_sp_mask") and of their other faces
+    ("face_color_mask").
+
+    """
+    values = {column: {} for column in CATEGORIES}
+    nulls = {column: [] for column in CATEGORIES}
+    colors = {}
+    words = {}
+    color_masks = {}
+    ids = []
+
+    for id, setcode, rarity, layout, subtypes, supertypes, types, \
+            color_mask, colors_sp_mask in cursor.execute('''
+            SELECT
+                cards.id,
+                lower(cards.setCode), lower(cards.rarity),
+                lower(cards.layout),
+                lower(cards.subtypes), lower(cards.supertypes),
+                lower(cards.types),
+                cards.color_mask, cards.colors_sp_mask
+            FROM card_search AS cards
+                JOIN sets ON cards.setCode = sets.code
+            ''').fetchall():
+        ids.append(id)
+        for column, value in (
+            ("cards.setCode", setcode),
+            ("cards.rarity", rarity),
+            ("cards.layout", layout),
+        ):
+            if value is None:
+                nulls[column].append(id)
+            else:
+                values[column].setdefault(value, []).append(id)
+        words[id] = set()
+        for value in (subtypes, supertypes, types):
+            if value is not None:
+                words[id].update(r_namesep.split(value))
+        for word in words[id]:
+            values["cards.type"].setdefault(word, []).append(id)
+        color_masks[id] = color_mask
+        colors.setdefault(colors_sp_mask, []).append(id)
+
+    for id, format in cursor.execute('''
+            SELECT cards.id, lower(legalities.format)
+            FROM legalities
+                JOIN card_search AS cards ON cards.uuid = legalities.uuid
+            ''').fetchall():
+        if id in words:
+            values["legalities.format"].setdefault(format, []).append(id)
+
+    # other faces checked by type and colors searches
+    face_colors = {}
+    for id, other, layout in cursor.execute('''
+            SELECT cards.id, o.id, card_faces.layout
+            FROM card_faces
+                JOIN card_search AS cards ON cards.uuid = card_faces.uuid
+                JOIN card_search AS o ON o.uuid = card_faces.other_uuid
+            ''').fetchall():
+        if id not in words or other not in words:
+            continue
+        if OTHER_LAYOUTS["cards.type"] is None or \
+                layout in OTHER_LAYOUTS["cards.type"]:
+            for word in words[other]:
+                values["cards.type"][word].append(id)
+        if layout in OTHER_LAYOUTS["cards.color"]:
+            face_colors.setdefault(color_masks[other], []).append(id)
+
+    return {
+        "count": len(ids),
+        "max_id": max(ids, default=0),
+        "all": bitmap(ids),
+        "values": {
+            column: {value: bitmap(v) for value, v in bitmaps.items()}
+            for column, bitmaps in values.items()
+        },
+        "nulls": {column: bitmap(v) for column, v in nulls.items()},
+        "colors_sp_mask": {mask: bitmap(v) for mask, v in colors.items()},
+        "face_color_mask": {
+            mask: bitmap(v) for mask, v in face_colors.items()
+        },
+    }
+
+
+def encode(bits):
+    """Return bitmap `bits` as compressed text."""
+    b = bits.to_bytes((bits.bit_length() + 7) // 8, "little")
+    return base64.b64encode(zlib.compress(b)).decode("ascii")
+
+
+def decode(s):
+    """Return the bitmap of compressed text `s` (see `encode`)."""
+    return int.from_bytes(zlib.decompress(base64.b64decode(s)), "little")
+
+
+def write_bitmaps(cursor):
+    """Write the bitmaps of the database of `cursor` to its `bitmaps` table.
+
+    :param sqlite3.Cursor cursor: cursor of the database
+
+    """
+    bitmaps = build_bitmaps(cursor)
+    data = {
+        "version": BITMAPS_VERSION,
+        "count": bitmaps["count"],
+        "max_id": bitmaps["max_id"],
+        "all": encode(bitmaps["all"]),
+        "values": {
+            column: {value: encode(b) for value, b in v.items()}
+            for column, v in bitmaps["values"].items()
+        },
+        "nulls": {
+            column: encode(b) for column, b in bitmaps["nulls"].items()
+        },
+        "colors_sp_mask": {
+            str(mask): encode(b)
+            for mask, b in bitmaps["colors_sp_mask"].items()
+        },
+        "face_color_mask": {
+            str(mask): encode(b)
+            for mask, b in bitmaps["face_color_mask"].items()
+        },
+    }
+    cursor.execute("DROP TABLE IF EXISTS bitmaps")
+    cursor.execute("CREATE TABLE bitmaps (version INTEGER, data TEXT)")
+    cursor.execute(
+        "INSERT INTO bitmaps VALUES (?, ?)",
+        (BITMAPS_VERSION, json.dumps(data, separators=(",", ":"))),
+    )
+
+
+def read_bitmaps(cursor):
+    """Return the bitmaps written by `write_bitmaps` to a database.
+
+    :param sqlite3.Cursor cursor: cursor of the database
+
+    Return None if the database has no bitmaps of this version.
+
+    """
+    try:
+        row = cursor.execute(
+            "SELECT data FROM bitmaps WHERE version = ?", (BITMAPS_VERSION,)
+        ).fetchone()
+    except sqlite3.OperationalError:
+        # no bitmaps table
+        return None
+    if row is None:
+        return None
+    data = json.loads(row[0])
+    return {
+        "count": data["count"],
+        "max_id": data["max_id"],
+        "all": decode(data["all"]),
+        "values": {
+            column: {value: decode(s) for value, s in v.items()}
+            for column, v in data["values"].items()
+        },
+        "nulls": {column: decode(s) for column, s in data["nulls"].items()},
+        "colors_sp_mask": {
+            int(mask): decode(s)
+            for mask, s in data["colors_sp_mask"].items()
+        },
+        "face_color_mask": {
+            int(mask): decode(s)
+            for mask, s in data["face_color_mask"].items()
+        },
+    }
+
+
+class BitmapInterface(Interface):
+    """MTG database interface searching with bitmap indexes."""
+
+    def __init__(self):
+        """Initialize database cursor and load the bitmaps.
+
+        The bitmaps are read from the database, which the update writes
+        them to (so they are replaced with it), or built from it if it has
+        none.
+
+        """
+        super().__init__()
+        self.bitmaps = read_bitmaps(self.cursor)
+        if self.bitmaps is None:
+            self.bitmaps = build_bitmaps(self.cursor)
+        self.all = self.bitmaps["all"]
+
+    # mtgdb functions
+    def iter_cards(
+        self, query, sort="name", reverse=False, limit=None, prices=False,
+        after=None, offset=None,
+    ):
+        """Yield the cards from database matching `query`.
+
+        :param Query query:   parsed search query
+        :param str   sort:    sort key (cmc, name, price, or setcode)
+        :param bool  reverse: whether to reverse result order
+        :param bool  limit:   maximum number of cards to return
+        :param bool  prices:  whether to get prices
+        :param tuple after:   key of the card to list cards after
+        :param int   offset:  number of cards to skip
+
+        Queries without a condition tree are searched with SQL.
+
+        """
+        tree = getattr(query, "tree", None)
+        if tree is None:
+            yield from super().iter_cards(
+                query, sort, reverse, limit, prices, after, offset
+            )
+            return
+
+        true, unknown = self.evaluate(tree)
+        yield from self.iter_cards_by_id(
+            bitmap_ids(true), sort, reverse, limit, prices, after, offset
+        )
+
+    def evaluate(self, node):
+        """Return the bitmaps of the printings meeting condition `node`.
+
+        :param node: Term, Not, And or Or
+
+        """
+        if isinstance(node, Term):
+            return self.evaluate_term(node)
+
+        if isinstance(node, Not):
+            true, unknown = self.evaluate(node.child)
+            return self.all & ~true & ~unknown, unknown
+
+        if isinstance(node, And):
+            true, false = self.all, 0
+        else:
+            true, false = 0, self.all
+        for child in node.children:
+            child_true, child_unknown = self.evaluate(child)
+            child_false = self.all & ~child_true & ~child_unknown
+            if isinstance(node, And):
+                true &= child_true
+                false |= child_false
+            else:
+                true |= child_true
+                false &= child_false
+        return true, self.all & ~true & ~false
+
+    def evaluate_term(self, term):
+        """Return the bitmaps of the printings meeting `term`."""
+        column, op, value = term.search or (None, None, None)
+
+        if column in CATEGORIES:
+            true = self.bitmaps["values"][column].get(lower(value), 0)
+            return true, self.bitmaps["nulls"][column]
+
+        if column == "cards.color":
+            true = 0
+            for key in ("colors_sp_mask", "face_color_mask"):
+                for mask, bits in self.bitmaps[key].items():
+                    if color_matches(op, value, mask):
+                        true |= bits
+            return true, 0
+
+        return self.evaluate_sql(term)
+
+    def evaluate_sql(self, term):
+        """Return the bitmaps of the printings meeting `term` by its SQL."""
+        results = self.cursor.execute('''
+            SELECT cards.id, ('''+term.sql+''')
+            FROM card_search AS cards
+                JOIN sets ON cards.setCode = sets.code
+            ''', term.params).fetchall()
+        true = bitmap(id for id, value in results if value)
+        unknown = bitmap(id for id, value in results if value is None)
+        return true, unknown
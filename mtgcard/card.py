@@ -54,6 +54,7 @@ class Card(object):
         self.names = None
         self.price = None
         self.price_date = None
+        self.price_key = None
         self.formats = None
 
     def __str__(self):
@@ -0,0 +1,364 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Search engine evaluating queries on in-memory columns with NumPy.
+
+`ColumnarInterface` loads the searched attributes of all printings in
+`card_search` into arrays once, and evaluates the condition tree of a
+parsed query (see `mtgcard.parser.Query`) as boolean masks instead of
+running its SQL. Terms without columns here (names, texts, prices, and
+manacosts with symbols `card_mana` does not count) are evaluated by
+SQLite over all printings. Grouping, sorting and the returned cards are
+those of `Interface.iter_cards`, run on the matching printings.
+
+Conditions are three-valued as in SQL: masks (true, unknown), a
+printing being unknown where SQL compares a NULL.
+
+"""
+
+import numpy as np
+
+from mtgcard.mtgdb import Interface
+from mtgcard.common import MANA_COLUMNS, manacost_counts, manacost_to_cmc
+from mtgcard.mtgdb import r_namesep
+from mtgcard.parser import Term, Not, And, Or
+from mtgcard.parser import COLOR_BITS, OTHER_LAYOUTS
+
+
+OPS = {
+    "=": np.equal,
+    "!=": np.not_equal,
+    "<": np.less,
+    "<=": np.less_equal,
+    ">": np.greater,
+    ">=": np.greater_equal,
+}
+
+# SQLite's lower() only folds ASCII letters
+ASCII_LOWER = str.maketrans(
+    "ABCDEFGHIJKLMNOPQRSTUVWXYZ", "abcdefghijklmnopqrstuvwxyz"
+)
+
+
+def sql_lower(s):
+    """Return `s` lowered as by SQLite's lower().
+
+    :param str s: string
+
+    """
+    return s.translate(ASCII_LOWER)
+
+
+class ColumnarInterface(Interface):
+    """MTG database interface searching with NumPy arrays."""
+
+    def __init__(self):
+        """Initialize database cursor and load the searched columns."""
+        super().__init__()
+
+        rows = self.cursor.execute('''
+            SELECT
+                cards.id, cards.listed,
+                lower(cards.setCode), lower(cards.rarity),
+                lower(cards.layout),
+                cards.convertedManaCost,
+                CAST(strftime('%Y', DATE(sets.releaseDate)) AS INTEGER),
+                cards.power, cards.toughness, cards.loyalty,
+                lower(cards.subtypes), lower(cards.supertypes),
+                lower(cards.types),
+                cards.color_mask, cards.colors_sp_mask,
+                card_mana.uuid IS NOT NULL, card_mana.cmc,
+                '''+", ".join("card_mana." + c for c in MANA_COLUMNS)+'''
+            FROM card_search AS cards
+                JOIN sets ON cards.setCode = sets.code
+                LEFT JOIN card_mana ON card_mana.uuid = cards.uuid
+            ORDER BY cards.id
+        ''').fetchall()
+        columns = list(zip(*rows)) or [()] * (17 + len(MANA_COLUMNS))
+
+        self.size = len(rows)
+        self.ids = np.array(columns[0], dtype=np.int64)
+        self.listed = np.array(columns[1], dtype=bool)
+
+        # categories: column -> (value -> code, codes)
+        self.categories = {}
+        for column, values in zip(
+            ("cards.setCode", "cards.rarity", "cards.layout"), columns[2:5]
+        ):
+            codes = {}
+            self.categories[column] = (codes, np.array(
+                [-1 if v is None else codes.setdefault(v, len(codes))
+                 for v in values],
+                dtype=np.int32,
+            ))
+
+        self.numbers = {
+            column: np.array(
+                [np.nan if v is None else v for v in values], dtype=float
+            )
+            for column, values in zip(
+                ("cards.convertedManaCost", "sets.releaseDate"), columns[5:7]
+            )
+        }
+
+        # TEXT columns, compared as text like SQLite does with parameters
+        self.texts = {
+            column: (
+                np.array(["" if v is None else v for v in values], dtype=str),
+                np.array([v is None for v in values], dtype=bool),
+            )
+            for column, values in zip(
+                ("cards.power", "cards.toughness", "cards.loyalty"),
+                columns[7:10],
+            )
+        }
+
+        # type words: lowered type, subtype or supertype -> rows
+        words = {}
+        for values in columns[10:13]:
+            for i, value in enumerate(values):
+                if value is not None:
+                    for word in r_namesep.split(value):
+                        words.setdefault(word, set()).add(i)
+        self.type_rows = {
+            word: np.fromiter(sorted(rows), dtype=np.int64)
+            for word, rows in words.items()
+        }
+
+        self.color_mask = np.array(columns[13], dtype=np.int64)
+        self.colors_sp_mask = np.array(columns[14], dtype=np.int64)
+
+        self.has_mana = np.array(columns[15], dtype=bool)
+        self.mana = {
+            column: np.array(
+                [np.nan if v is None else v for v in values], dtype=float
+            )
+            for column, values in zip(("cmc",) + MANA_COLUMNS, columns[16:])
+        }
+
+        # legalities: lowered format -> rows
+        results = self.cursor.execute('''
+            SELECT cards.id, lower(legalities.format)
+            FROM legalities
+                JOIN card_search AS cards ON cards.uuid = legalities.uuid
+        ''').fetchall()
+        rows, found = self.positions([r[0] for r in results])
+        formats = np.array([r[1] for r in results], dtype=object)[found]
+        rows = rows[found]
+        self.format_rows = {
+            format: np.unique(rows[formats == format])
+            for format in set(formats)
+        }
+
+        # card_faces: rows of the cards, rows of their other faces
+        results = self.cursor.execute('''
+            SELECT cards.id, o.id, card_faces.layout
+            FROM card_faces
+                JOIN card_search AS cards ON cards.uuid = card_faces.uuid
+                JOIN card_search AS o ON o.uuid = card_faces.other_uuid
+        ''').fetchall()
+        self.face_card, found = self.positions([r[0] for r in results])
+        self.face_other, other_found = self.positions([r[1] for r in results])
+        found &= other_found
+        self.face_card = self.face_card[found]
+        self.face_other = self.face_other[found]
+        self.face_layout = np.array(
+            [r[2] for r in results], dtype=object
+        )[found]
+
+    def positions(self, ids):
+        """Return the array positions of `card_search` ids.
+
+        :param list ids: ids of `card_search`
+
+        Return the positions and a mask of the ids that are loaded.
+
+        """
+        ids = np.array(ids, dtype=np.int64)
+        positions = np.searchsorted(self.ids, ids)
+        found = positions < self.size
+        found[found] = self.ids[positions[found]] == ids[found]
+        return np.where(found, positions, 0), found
+
+    def rows_mask(self, rows):
+        """Return a mask of the array positions `rows`."""
+        mask = np.zeros(self.size, dtype=bool)
+        if rows is not None:
+            mask[rows] = True
+        return mask
+
+    # mtgdb functions
+    def iter_cards(
+        self, query, sort="name", reverse=False, limit=None, prices=False,
+        after=None, offset=None,
+    ):
+        """Yield the cards from database matching `query`.
+
+        :param Query query:   parsed search query
+        :param str   sort:    sort key (cmc, name, price, or setcode)
+        :param bool  reverse: whether to reverse result order
+        :param bool  limit:   maximum number of cards to return
+        :param bool  prices:  whether to get prices
+        :param tuple after:   key of the card to list cards after
+        :param int   offset:  number of cards to skip
+
+        Queries without a condition tree are searched with SQL.
+
+        """
+        tree = getattr(query, "tree", None)
+        if tree is None:
+            yield from super().iter_cards(
+                query, sort, reverse, limit, prices, after, offset
+            )
+            return
+
+        true, unknown = self.evaluate(tree)
+        ids = self.ids[true & self.listed]
+        yield from self.iter_cards_by_id(
+            ids.tolist(), sort, reverse, limit, prices, after, offset
+        )
+
+    def evaluate(self, node):
+        """Return the masks of the printings meeting condition `node`.
+
+        :param node: Term, Not, And or Or
+
+        """
+        if isinstance(node, Term):
+            return self.evaluate_term(node)
+
+        if isinstance(node, Not):
+            true, unknown = self.evaluate(node.child)
+            return ~true & ~unknown, unknown
+
+        true = np.full(self.size, isinstance(node, And))
+        false = ~true
+        for child in node.children:
+            child_true, child_unknown = self.evaluate(child)
+            child_false = ~child_true & ~child_unknown
+            if isinstance(node, And):
+                true &= child_true
+                false |= child_false
+            else:
+                true |= child_true
+                false &= child_false
+        return true, ~true & ~false
+
+    def evaluate_term(self, term):
+        """Return the masks of the printings meeting `term`."""
+        if term.search is None:
+            return self.evaluate_sql(term)
+
+        column, op, value = term.search
+        true, unknown = self.condition(column, op, value)
+        if column in OTHER_LAYOUTS:
+            # printings with another face meeting the condition
+            face_true, face_unknown = self.condition(
+                column, op, value, face=True
+            )
+            hits = face_true[self.face_other]
+            if OTHER_LAYOUTS[column] is not None:
+                hits &= np.isin(self.face_layout, OTHER_LAYOUTS[column])
+            faces = self.rows_mask(self.face_card[hits])
+            true = true | faces
+            unknown = unknown & ~faces
+        return true, unknown
+
+    def evaluate_sql(self, term):
+        """Return the masks of the printings meeting `term` by its SQL."""
+        values = [
+            result[0] for result in self.cursor.execute('''
+            SELECT ('''+term.sql+''')
+            FROM card_search AS cards
+                JOIN sets ON cards.setCode = sets.code
+            ORDER BY cards.id
+            ''', term.params)
+        ]
+        unknown = np.array([v is None for v in values], dtype=bool)
+        true = np.array([bool(v) for v in values], dtype=bool)
+        return true, unknown
+
+    def condition(self, column, op, value, face=False):
+        """Return the masks of the printings meeting a searched condition.
+
+        :param str  column: column searched (see `Term.search`)
+        :param str  op:     comparison operator
+        :param      value:  value searched
+        :param bool face:   whether the condition on other faces is wanted
+
+        """
+        no_nulls = np.zeros(self.size, dtype=bool)
+
+        if column in self.categories:
+            codes, values = self.categories[column]
+            code = codes.get(sql_lower(value), -2)
+            return values == code, values == -1
+
+        if column == "legalities.format":
+            rows = self.format_rows.get(sql_lower(value))
+            return self.rows_mask(rows), no_nulls
+
+        if column in self.numbers:
+            values = self.numbers[column]
+            unknown = np.isnan(values)
+            return OPS[op](values, value) & ~unknown, unknown
+
+        if column in self.texts:
+            values, unknown = self.texts[column]
+            return OPS[op](values, str(value)) & ~unknown, unknown
+
+        if column == "cards.type":
+            rows = self.type_rows.get(sql_lower(value))
+            return self.rows_mask(rows), no_nulls
+
+        if column == "cards.color":
+            return self.color_condition(op, value, face), no_nulls
+
+        if column == "cards.mana":
+            return self.mana_condition(op, value), no_nulls
+
+        raise ValueError("no column for '{}'".format(column))
+
+    def color_condition(self, op, value, face):
+        """Return the mask of a color search (see `parser.color_term`)."""
+        masks = self.color_mask if face else self.colors_sp_mask
+        letters = set(value.lower())
+        mask = 0
+        for letter in letters:
+            mask |= COLOR_BITS.get(letter, 1 << len(COLOR_BITS))
+
+        popcount = sum((masks >> i) & 1 for i in range(len(COLOR_BITS)))
+        true = OPS[op](popcount, len(letters))
+        if op in ("=", "<", "<="):
+            true &= (masks & mask) == masks
+        if op in ("=", ">", ">="):
+            true &= (masks & mask) == mask
+        return true
+
+    def mana_condition(self, op, value):
+        """Return the mask of a manacost search (see `sql_manacost`)."""
+        counts = manacost_counts(value)
+        cmc = manacost_to_cmc(value)
+        true = self.has_mana & OPS[op](self.mana["cmc"], cmc)
+        for column in MANA_COLUMNS:
+            if op in (">", ">="):
+                if counts[column]:
+                    true &= self.mana[column] >= counts[column]
+            elif op == "=":
+                true &= self.mana[column] == counts[column]
+            else:
+                true &= self.mana[column] <= counts[column]
+        return true
@@ -0,0 +1,115 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Constants and functions shared by the search parser and the database.
+
+They are kept apart so the parser does not load the database module, and
+the other way around.
+
+"""
+
+import re
+
+
+r_unbraced_char = re.compile(r"(?<!{)(\d+|[WUBRGSCXwubrgscx])(?!})")
+r_mana_symbol = re.compile(r"{([^{}]*)}")
+
+# mana symbol counts stored in `card_mana`
+MANA_COLUMNS = (
+    "w", "u", "b", "r", "g", "c", "s", "x",
+    "generic", "hybrid", "phyrexian", "other",
+)
+
+# search condition no card meets; `mtgdb.Interface.iter_cards` skips it
+NO_CARDS = "0"
+
+
+def manacost_to_cmc(mc):
+    """Return converted manacost of manacost `mc`.
+
+    :param str mc: manacost
+
+    Example:
+
+        manacost_to_cmc("3wg")
+        # 5
+
+        manacost_to_cmc("{1}{w}g")
+        # 3
+
+    """
+    if mc is None:
+        return 0
+
+    # surround unbraced colors with braces
+    mc = r_unbraced_char.subn(r"{\1}", mc)[0]
+
+    # remove x
+    mc = re.subn("{[Xx]}", "", mc)[0]
+
+    # count and remove {#}
+    count = 0
+    match = re.findall(r"{(\d+)(?:/[WUBRGSCXwubrgscx])?}", mc)
+    for i in match:
+        count += int(i)
+    mc = re.subn(r"{\d+(?:/[WUBRGSCXwubrgscx])?}", "", mc)[0]
+
+    # make list of mana
+    if len(mc) == 0:
+        listmc = ""
+    else:
+        listmc = sorted(mc.replace("}{", "},{").split(","))
+
+    return len(listmc) + count
+
+
+def manacost_counts(mc):
+    """Return the number of each mana symbol in manacost `mc`.
+
+    :param str mc: manacost
+
+    Generic mana is counted by its value. Symbols with a slash are counted
+    as "phyrexian" if one of their halves is "p" and as "hybrid" otherwise.
+    Anything else, including unbraced characters that are not mana symbols,
+    is counted as "other".
+
+    Example:
+
+        manacost_counts("2{w}g")
+        # {'w': 1, 'g': 1, 'generic': 2, ...}  (all other counts 0)
+
+    """
+    counts = dict.fromkeys(MANA_COLUMNS, 0)
+    if mc is None:
+        return counts
+
+    # surround unbraced colors with braces
+    mc = r_unbraced_char.subn(r"{\1}", mc.lower())[0]
+
+    for symbol in r_mana_symbol.findall(mc):
+        if symbol.isdigit():
+            counts["generic"] += int(symbol)
+        elif len(symbol) == 1 and symbol in "wubrgcsx":
+            counts[symbol] += 1
+        elif "p" in symbol.split("/"):
+            counts["phyrexian"] += 1
+        elif "/" in symbol:
+            counts["hybrid"] += 1
+        else:
+            counts["other"] += 1
+    counts["other"] += len(r_mana_symbol.sub("", mc))
+
+    return counts
@@ -0,0 +1,10 @@
+# lextab.py. This file automatically created by PLY (version 3.11). Don't edit!
+_tabversion   = '3.10'
+_lextokens    = set(('CHARS', 'DQUOTE', 'EQ', 'EXACT', 'GE', 'GT', 'KWEQ', 'LE', 'LPAREN', 'LT', 'NE', 'NOT', 'OR', 'RPAREN', 'SQUOTE'))
+_lexreflags   = 64
+_lexliterals  = ''
+_lexstateinfo = {'INITIAL': 'inclusive'}
+_lexstatere   = {'INITIAL': [('(?P<t_DQUOTE>"[^"]*")|(?P<t_SQUOTE>\'[^\']*\')|(?P<t_CHARS>[a-zA-Z0-9.,{}/]+)|(?P<t_LPAREN>\\()|(?P<t_RPAREN>\\))|(?P<t_GE>>=)|(?P<t_LE><=)|(?P<t_NE>!=)|(?P<t_NOT>-)|(?P<t_EXACT>!)|(?P<t_KWEQ>:)|(?P<t_EQ>=)|(?P<t_GT>>)|(?P<t_LT><)', [None, ('t_DQUOTE', 'DQUOTE'), ('t_SQUOTE', 'SQUOTE'), ('t_CHARS', 'CHARS'), (None, 'LPAREN'), (None, 'RPAREN'), (None, 'GE'), (None, 'LE'), (None, 'NE'), (None, 'NOT'), (None, 'EXACT'), (None, 'KWEQ'), (None, 'EQ'), (None, 'GT'), (None, 'LT')])]}
+_lexstateignore = {'INITIAL': ' \t'}
+_lexstateerrorf = {'INITIAL': 't_error'}
+_lexstateeoff = {}
@@ -20,18 +20,21 @@
 # for debugging
 from pprint import pprint
 
+import os
 import sys
 import argparse
 import signal
 
-from mtgcard import mtgdb
 from mtgcard import settings
-from mtgcard.mtgcard import get_and_print_card
-from mtgcard.mtgcard import list_cards
+from mtgcard import server
 
 
-def get_args():
-    """Parse arguments."""
+def get_args(argv=None):
+    """Parse arguments.
+
+    :param list argv: arguments to parse (default: `sys.argv[1:]`)
+
+    """
     parser = argparse.ArgumentParser(
         prog="mtgcard",
         description="""
@@ -101,6 +104,18 @@ def get_args():
     parser.add_argument(
         "-L", dest="limit", type=int, help="set a listing limit"
     )
+    parser.add_argument(
+        "--page",
+        dest="page",
+        type=int,
+        help="list page PAGE of LIMIT cards (requires -L)",
+    )
+    parser.add_argument(
+        "--after",
+        dest="after",
+        metavar="NAME",
+        help="list the cards after card NAME",
+    )
     parser.add_argument(
         "-R", dest="rulings", action="store_true", help="show rulings"
     )
@@ -135,8 +150,21 @@ def get_args():
         action="store_true",
         help="update the local MTG database",
     )
+    parser.add_argument(
+        "--serve",
+        dest="serve",
+        action="store_true",
+        help="keep the database loaded and answer other mtgcard commands",
+    )
+    parser.add_argument(
+        "--engine",
+        dest="engine",
+        choices=("sqlite", "numpy", "bitmap"),
+        help="search engine of listings (default: the engine of the "
+        "server, or {})".format(settings.SEARCH_ENGINE),
+    )
 
-    return parser.parse_args()
+    return parser.parse_args(argv)
 
 
 def interrupt_handler(a, b):
@@ -147,10 +175,94 @@ def interrupt_handler(a, b):
 
 def main():
     """Entry point."""
+    argv = sys.argv[1:]
+    args = get_args(argv)
+
+    if args.serve:
+        try:
+            server.serve(verbose=args.verbose, engine=args.engine)
+        except (OSError, ImportError) as e:
+            print("error:", e, file=sys.stderr)
+            sys.exit(1)
+        except KeyboardInterrupt:
+            print()
+        sys.exit(0)
+
     # exit quietly on KeyboardInterrupt
     signal.signal(signal.SIGINT, interrupt_handler)
 
-    args = get_args()
+    # let a running server answer
+    if not args.update_db:
+        try:
+            status = server.request(argv)
+            sys.stdout.flush()
+        except BrokenPipeError:
+            status = close_stdout()
+        if status is not None:
+            sys.exit(status)
+
+    from mtgcard import mtgdb
+
+    # setup database
+    try:
+        db = mtgdb.connect(args.engine)
+    except ImportError as e:
+        print("error:", e, file=sys.stderr)
+        sys.exit(1)
+    except FileNotFoundError as e:
+        if args.update_db:
+            import mtgcard.update
+
+            print("updating database... (this could take a while [>100MB])")
+            mtgcard.update.update_database(verbose=args.verbose)
+            print("update complete")
+            sys.exit(0)
+        else:
+            print(e)
+            sys.exit(1)
+    if args.update_db:
+        import mtgcard.update
+
+        print("updating database")
+        mtgcard.update.update_database(verbose=args.verbose)
+        sys.exit(0)
+
+    try:
+        status = run(args, db)
+        sys.stdout.flush()
+    except BrokenPipeError:
+        status = close_stdout()
+    sys.exit(status)
+
+
+def close_stdout():
+    """Discard the rest of the output after it was closed, and return 1.
+
+    Called when the output was closed early (e.g. piped to head), to stop
+    quietly.
+
+    """
+    devnull = os.open(os.devnull, os.O_WRONLY)
+    os.dup2(devnull, sys.stdout.fileno())
+    return 1
+
+
+def run(args, db, out=None, err=None):
+    """Print the card or listing of command line `args` and return status.
+
+    :param argparse.Namespace args: arguments from `get_args`
+    :param MTGDatabase        db:   database
+    :param file               out:  output (default: sys.stdout)
+    :param file               err:  error output (default: sys.stderr)
+
+    """
+    from mtgcard.mtgcard import get_and_print_card
+    from mtgcard.mtgcard import iter_list_cards
+
+    if out is None:
+        out = sys.stdout
+    if err is None:
+        err = sys.stderr
 
     full_list = args.full_list
     image_list = args.nr_columns  # number of columns
@@ -160,6 +272,8 @@ def main():
     sort = args.sort
     reverse = args.reverse
     limit = args.limit
+    page = args.page
+    after = args.after
     rulings = args.rulings
 
     query = " ".join(args.query)
@@ -170,29 +284,6 @@ def main():
     setcode = args.setcode
     format = args.format
 
-    update_db = args.update_db
-
-    # setup database
-    try:
-        db = mtgdb.Interface()
-    except FileNotFoundError as e:
-        if update_db:
-            import mtgcard.update
-
-            print("updating database... (this could take a while [>100MB])")
-            mtgcard.update.update_database(verbose=verbose)
-            print("update complete")
-            sys.exit(0)
-        else:
-            print(e)
-            sys.exit(1)
-    if update_db:
-        import mtgcard.update
-
-        print("updating database")
-        mtgcard.update.update_database(verbose=verbose)
-        sys.exit(0)
-
     def option_warn(arg, type):
         """Print warning message for incompatabile command line arguments."""
         message = """
@@ -200,7 +291,7 @@ def main():
             """.strip().format(
             arg, type
         )
-        print(message, file=sys.stderr)
+        print(message, file=err)
         sys.exit(1)
 
     # retrieve cards
@@ -225,11 +316,20 @@ def main():
                 option_warn("-n", "image listings (-i)")
         if setcode:
             option_warn("-s", "listings")
+        if page is not None and not limit:
+            print("error: command line argument '--page' requires -L",
+                  file=err)
+            sys.exit(1)
+        if page is not None and page < 1:
+            print("error: invalid page: {:d}".format(page), file=err)
+            sys.exit(1)
 
         if name_list_multi:
             name_list = True
 
-        cardlist, total = list_cards(
+        # print lines as cards are found
+        stats = {"total": 0}
+        lines = iter_list_cards(
             db,
             query,
             image_columns=image_list,
@@ -241,16 +341,27 @@ def main():
             reverse=reverse,
             limit=limit,
             ansi=ansi,
+            stats=stats,
+            after=after,
+            offset=(page - 1) * limit if page else None,
         )
-        if cardlist:
-            print(cardlist)
+        try:
+            for line in lines:
+                print(line, file=out)
+        except ValueError as e:
+            print("error:", e, file=err)
+            return 1
         if verbose:
-            print("{:d} matches".format(total))
+            print("{:d} matches".format(stats["total"]), file=out)
 
     else:
 
         if not header:
             option_warn("-q", "card printings")
+        if page is not None:
+            option_warn("--page", "card printings")
+        if after is not None:
+            option_warn("--after", "card printings")
 
         try:
             cardprint = get_and_print_card(
@@ -264,10 +375,12 @@ def main():
                 verbose=verbose,
             )
         except ValueError as e:
-            print("error:", e, file=sys.stderr)
-            sys.exit(1)
+            print("error:", e, file=err)
+            return 1
         else:
-            print(cardprint)
+            print(cardprint, file=out)
+
+    return 0
 
 
 if __name__ == "__main__":
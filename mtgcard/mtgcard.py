@@ -16,6 +16,7 @@
 
 """Core functionality."""
 
+import itertools
 
 from mtgcard import settings
 from mtgcard.card import Card
@@ -171,80 +172,100 @@ def list_cards_images(
     :param bool ansi:     whether color
 
     """
-    images = []
+    return list(
+        iter_cards_images(
+            cards, columns, w=w, img_pad=img_pad, text_pad=text_pad,
+            min_text=min_text, image=image, ansi=ansi,
+        )
+    )
 
-    # extract double faced cards (transform/meld)
-    cards_expand = []
-    for c in cards:
-        cards_expand.append(c)
-        if c.layout in ("transform", "meld"):
-            cards_expand.append(util.get_transform_meld_sideb(c))
 
-    # create list of rows
+def iter_cards_images(
+    cards,
+    columns,
+    w=36,
+    img_pad=2,
+    text_pad=1,
+    min_text=6,
+    image=True,
+    ansi=True,
+):
+    """Yield the lines of `cards` listed as images.
+
+    :param iterable cards: Card objects
+
+    Other parameters are those of `list_cards_images`. Each row is yielded
+    once its cards are read from `cards`.
+
+    """
+    # extract double faced cards (transform/meld) into rows
     # [ [c1, c2], [c3, c4], ... ]
-    card_prints = []
     row = []
-    for i, c in enumerate(cards_expand):
-        if i % columns == 0:
-            if row:
-                card_prints.append(row)
-            row = []
+    for c in cards:
         row.append(c)
+        if c.layout in ("transform", "meld"):
+            row.append(util.get_transform_meld_sideb(c))
+        while len(row) >= columns:
+            yield from image_row(
+                row[:columns], w, img_pad, text_pad, min_text, image, ansi
+            )
+            row = row[columns:]
     if row:
-        card_prints.append(row)
+        yield from image_row(
+            row, w, img_pad, text_pad, min_text, image, ansi
+        )
 
-    # for each row of Cards, print them at same height and append to result
-    for row in card_prints:
 
-        # get text height of card with max height
-        adv_side_a = True
-        if c.layout == "adventure":
-            adv_side_a = util.highest_adv_side_a(c, w=w, text_pad=text_pad)
-        text_height_high, c = util.text_height_of_highest(
-            *row, w=w, img_pad=img_pad, min_text=min_text, image=image
-        )
+def image_row(row, w, img_pad, text_pad, min_text, image, ansi):
+    """Return the lines of a row of Cards printed at the same height.
 
-        # normalize text height
-        # - 'normalizer' is the the line count difference between a normal card
-        #   and another card with the same text height
-        image_width = w - img_pad * 2 - 2
-        norm_iheight = round(image_width * 0.37)
-        flip_iheight = round(image_width * 0.3)
-        split_iheight = util.split_image_height(w, img_pad=img_pad)
-        normalizers = {
-            "flip": lambda: 2 - (norm_iheight - flip_iheight) * int(image),
-            "split": lambda: split_iheight - norm_iheight if image else 7,
-            "aftermath": lambda: split_iheight - norm_iheight if image else 7,
-            "adventure": lambda: 3 if adv_side_a else 1,
-        }
+    Parameters are those of `list_cards_images`.
+
+    """
+    # get text height of card with max height
+    text_height_high, c = util.text_height_of_highest(
+        *row, w=w, img_pad=img_pad, min_text=min_text, image=image
+    )
+    adv_side_a = True
+    if c.layout == "adventure":
+        adv_side_a = util.highest_adv_side_a(c, w=w, text_pad=text_pad)
+
+    # normalize text height
+    # - 'normalizer' is the the line count difference between a normal card
+    #   and another card with the same text height
+    image_width = w - img_pad * 2 - 2
+    norm_iheight = round(image_width * 0.37)
+    flip_iheight = round(image_width * 0.3)
+    split_iheight = util.split_image_height(w, img_pad=img_pad)
+    normalizers = {
+        "flip": lambda: 2 - (norm_iheight - flip_iheight) * int(image),
+        "split": lambda: split_iheight - norm_iheight if image else 7,
+        "aftermath": lambda: split_iheight - norm_iheight if image else 7,
+        "adventure": lambda: 3 if adv_side_a else 1,
+    }
+    layout = "normal" if c.side is None else c.layout
+    add = normalizers.get(layout, lambda: 0)()
+    max_theight = text_height_high + add
+
+    # row of 'card as list' with aligned heights
+    row_prints = []
+    for c in row:
+        if c.layout == "adventure":
+            adv_side_a = util.highest_adv_side_a(c)
         layout = "normal" if c.side is None else c.layout
         add = normalizers.get(layout, lambda: 0)()
-        max_theight = text_height_high + add
-
-        # row of 'card as list' with aligned heights
-        row_prints = []
-        for c in row:
-            if c.layout == "adventure":
-                adv_side_a = util.highest_adv_side_a(c)
-            layout = "normal" if c.side is None else c.layout
-            add = normalizers.get(layout, lambda: 0)()
-            theight = max_theight - add
-            card_print = c.print_card(
-                w=w, img_pad=img_pad, min_text=theight, image=image, ansi=ansi
-            ).splitlines()
-            if c.layout in ("transform", "meld") and c.side == "a":
-                card_print[2] = card_print[2][0:-1] + ">"
-            if c.layout in ("transform", "meld") and c.side != "a":
-                card_print[2] = "<" + card_print[2][1:]
-            row_prints.append(card_print)
-
-        # concatenate cards as lists
-        row_print_list = util.columnize(w, *row_prints, sep=2)
-
-        # append to result
-        images = images + row_print_list
-
-    return images
+        theight = max_theight - add
+        card_print = c.print_card(
+            w=w, img_pad=img_pad, min_text=theight, image=image, ansi=ansi
+        ).splitlines()
+        if c.layout in ("transform", "meld") and c.side == "a":
+            card_print[2] = card_print[2][0:-1] + ">"
+        if c.layout in ("transform", "meld") and c.side != "a":
+            card_print[2] = "<" + card_print[2][1:]
+        row_prints.append(card_print)
+
+    # concatenate cards as lists
+    return util.columnize(w, *row_prints, sep=2)
 
 
 def list_cards_detailed(
@@ -271,12 +292,37 @@ def list_cards_detailed(
     :param str ansi   : width of ansi column
 
     """
-    details = []
+    return list(
+        iter_cards_detailed(
+            cards, header=header, lname=lname, lset=lset, lmana=lmana,
+            ltype=ltype, lptl=lptl, lr=lr, ansi=ansi,
+        )
+    )
+
+
+def iter_cards_detailed(
+    cards,
+    header=True,
+    lname=32,
+    lset=5,
+    lmana=15,
+    ltype=14,
+    lptl=7,
+    lr=3,
+    ansi=True,
+):
+    """Yield the lines of `cards` listed as rows of details.
+
+    :param iterable cards: Card objects
+
+    Other parameters are those of `list_cards_detailed`.
+
+    """
     fmt_details = """
 {:{lname!s}s}{:{lset!s}s}{:{lmana!s}s}{:{ltype!s}s}{:{lptl!s}s}{:{lr!s}s}{:s}
 """.strip()
     if header:
-        details.append(
+        yield (
             fmt_details.format(
                 "NAME",
                 "SET",
@@ -352,7 +398,7 @@ def list_cards_detailed(
         )
 
         # add row
-        details.append(
+        yield (
             fmt_details.format(
                 name[: lname - 2],
                 set[:lset],
@@ -370,10 +416,6 @@ def list_cards_detailed(
             )
         )
 
-    matches = details
-
-    return matches
-
 
 def list_cards(
     db,
@@ -387,6 +429,8 @@ def list_cards(
     reverse=False,
     limit=None,
     ansi=True,
+    after=None,
+    offset=None,
 ):
     """Return list of cards names matching `query` or None, and total matches.
 
@@ -401,6 +445,8 @@ def list_cards(
     :param bool        reverse:       whether sort order is reversed
     :param int         limit:         maximum amount of cards to list
     :param bool        ansi:          whether color
+    :param str         after:         name of the card to list cards after
+    :param int         offset:        number of cards to skip
 
     There are three types of lists:
 
@@ -411,9 +457,69 @@ def list_cards(
     * a true value of column in parentheses determines list type
 
     """
+    stats = {"total": 0}
+    matches = list(
+        iter_list_cards(
+            db,
+            query,
+            image_columns=image_columns,
+            image_compact=image_compact,
+            header=header,
+            onlynames=onlynames,
+            onename=onename,
+            sort=sort,
+            reverse=reverse,
+            limit=limit,
+            ansi=ansi,
+            stats=stats,
+            after=after,
+            offset=offset,
+        )
+    )
+
+    if matches and len(matches) >= 1:
+        return "\n".join(matches), stats["total"]
+    else:
+        return None, 0
+
+
+def iter_list_cards(
+    db,
+    query,
+    image_columns=None,
+    image_compact=False,
+    header=True,
+    onlynames=True,
+    onename=True,
+    sort="name",
+    reverse=False,
+    limit=None,
+    ansi=True,
+    stats=None,
+    after=None,
+    offset=None,
+):
+    """Yield the lines listing cards matching `query`.
+
+    :param dict stats:  if given, "total" is set to the count of cards
+                        listed so far, and to the count of all matches once
+                        the listing is complete
+
+    Other parameters are those of `list_cards`. Cards are listed as they
+    are read from the database, so the first lines are yielded before the
+    search is complete, and stopping early skips the rest of the work. When
+    `limit` cuts the listing, or cards are skipped, matches are counted with
+    `MTGDatabase.count_cards`. Raise ValueError if card `after` is not
+    listed.
+
+    """
+    if stats is None:
+        stats = {}
+    stats["total"] = 0
+
     if len(query) != 0:
 
-        sql_query = parser.parse(query)
+        sql_query = parser.compile(query)
 
         # if sql_query[0] is None:
         #     # temporary:
@@ -423,16 +529,34 @@ def list_cards(
         # get all cards
         sql_query = ("", ())
 
-    cards = db.get_cards(sql_query, sort=sort, reverse=reverse, limit=limit)
-    if cards is None:
-        return None, 0
+    if after is not None:
+        after = db.find_page_key(sql_query, after, sort=sort)
+
+    cards = db.iter_cards(
+        sql_query,
+        sort=sort,
+        reverse=reverse,
+        limit=limit,
+        prices=not image_columns and not onlynames,
+        after=after,
+        offset=offset,
+    )
 
-    total = len(cards)
+    def counted(cards):
+        for c in cards:
+            stats["total"] += 1
+            yield c
+
+    # nothing is listed, not even a header, if no card matches
+    first = next(cards, None)
+    if first is None:
+        return
+    cards = counted(itertools.chain([first], cards))
 
     if image_columns:
         # image listing
 
-        matches = list_cards_images(
+        yield from iter_cards_images(
             cards, image_columns, image=not image_compact, ansi=ansi
         )
 
@@ -441,19 +565,16 @@ def list_cards(
         if not onlynames:
             # line listing
 
-            matches = list_cards_detailed(cards, header=header, ansi=ansi)
+            yield from iter_cards_detailed(cards, header=header, ansi=ansi)
 
         else:
             # name listing
 
-            matches = []
             for c in cards:
                 if onename:
-                    matches.append(c.name)
+                    yield c.name
                 else:
-                    matches.append(util.multi_name(c))
+                    yield util.multi_name(c)
 
-    if matches and len(matches) >= 1:
-        return "\n".join(matches), total
-    else:
-        return None, 0
+    if after is not None or offset or limit and stats["total"] >= limit:
+        stats["total"] = db.count_cards(sql_query)
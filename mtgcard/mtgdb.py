@@ -19,11 +19,15 @@
 
 import sys
 from os import path
+import pathlib
 import re
 import json
 import sqlite3
+import functools
 
 from mtgcard.card import Card
+from mtgcard.common import MANA_COLUMNS, NO_CARDS, r_unbraced_char
+from mtgcard.common import manacost_counts, manacost_to_cmc
 from mtgcard import util
 from mtgcard import settings
 
@@ -34,7 +38,10 @@ from pprint import pprint
 # regex
 r_facenamesep = re.compile(r" // ")
 r_namesep = re.compile(r",(?=[^ ])")
-r_unbraced_char = re.compile(r"(?<!{)(\d+|[WUBRGSCXwubrgscx])(?!})")
+
+
+# cards fetched (and other faces loaded) at a time by `Interface.iter_cards`
+CARDS_BATCH = 64
 
 
 # SQLite functions
@@ -140,6 +147,22 @@ def facename_element(l, i):
         return None
 
 
+def name_key(name):
+    """Return case-folded `name` as stored in the `name_key` columns.
+
+    :param str name: card name
+
+    Example:
+
+        >>> name_key("Lim-Dûl's Vault")
+        # "lim-dûl's vault"
+
+    """
+    if name is None:
+        return None
+    return name.casefold()
+
+
 def manacost_contains(a, b):
     """Return if color list a contains color list b.
 
@@ -191,45 +214,6 @@ def manacost_contains(a, b):
     return listb in lista
 
 
-def manacost_to_cmc(mc):
-    """Return converted manacost of manacost `mc`.
-
-    :param str mc: manacost
-
-    Example:
-
-        manacost_to_cmc("3wg")
-        # 5
-
-        manacost_to_cmc("{1}{w}g")
-        # 3
-
-    """
-    if mc is None:
-        return 0
-
-    # surround unbraced colors with braces
-    mc = r_unbraced_char.subn(r"{\1}", mc)[0]
-
-    # remove x
-    mc = re.subn("{[Xx]}", "", mc)[0]
-
-    # count and remove {#}
-    count = 0
-    match = re.findall(r"{(\d+)(?:/[WUBRGSCXwubrgscx])?}", mc)
-    for i in match:
-        count += int(i)
-    mc = re.subn(r"{\d+(?:/[WUBRGSCXwubrgscx])?}", "", mc)[0]
-
-    # make list of mana
-    if len(mc) == 0:
-        listmc = ""
-    else:
-        listmc = sorted(mc.replace("}{", "},{").split(","))
-
-    return len(listmc) + count
-
-
 def collate_exp_core_first(settype1, settype2):
     """Return a number indicating if `settype1` is greater than `settype2`.
 
@@ -268,6 +252,230 @@ def collate_exp_core_first(settype1, settype2):
         return -1
 
 
+def database_path():
+    """Return the path of the sqlite database."""
+    return path.join(path.dirname(__file__), "data/mtg.sqlite")
+
+
+# sort keys of `Interface.iter_cards`: column of the grouped cards
+SORT_KEYS = {
+    "cmc": "grouped.cmc_key",
+    "name": "grouped.v_name",
+    "price": "grouped.price_key",
+    "setcode": "grouped.setCode",
+}
+
+# sort keys with an index of the printings in (key, name) order
+INDEXED_SORTS = ("cmc", "price")
+
+
+@functools.lru_cache(maxsize=settings.QUERY_CACHE_SIZE)
+def cards_statement(
+    where, sort, reverse, limit, prices, after=None, offset=None
+):
+    """Return the statement of `Interface.iter_cards`.
+
+    :param str  where:   WHERE condition of the search (see `Parser.parse`)
+    :param str  sort:    sort key (cmc, name, price, or setcode)
+    :param bool reverse: whether to reverse result order
+    :param int  limit:   maximum number of cards to return
+    :param bool prices:  whether to join prices
+    :param str  after:   "key" to list cards after parameters (sort key,
+                         name), "null" after parameter (name) when sorting
+                         by name or the sort key is NULL
+    :param int  offset:  number of cards to skip
+
+    Cards are ordered by sort key, then by name, so the cards after one are
+    always the same (keyset pagination). A NULL cmc or price is sorted as
+    -1 (see `mtgcard.update.search`), so first, or last when reversed, as
+    SQLite sorts NULL.
+
+    Each name is listed with its matching printing of lowest id, the one of
+    lowest set rank. Sorted by name, the cards are grouped in the order of
+    the `isearch_name` index; a limited search stops after the cards
+    returned, and the cards before a page are skipped before grouping.
+
+    A limited search sorted by cmc or price scans the printings in the
+    order of the `isearch_cmc` or `isearch_price` index from the key of the
+    page on, and stops after the cards returned; a printing is listed if no
+    matching printing of its name has a lower id. With the setcode key, or
+    without a limit, all the cards are grouped; SQLite then keeps the first
+    `limit` of them while sorting.
+
+    Cached, so a repeated search executes the same statement text and hits
+    the statement cache of the connection.
+
+    """
+    key = SORT_KEYS[sort]
+    op = "<" if reverse else ">"
+
+    # cards after the last one listed
+    if after is None:
+        keyset = ""
+    elif sort == "name":
+        keyset = "v_name " + op + " ?"
+    elif after == "null":
+        keyset = "(" + key + ", grouped.v_name) " + op + " (-1, ?)"
+    else:
+        keyset = "(" + key + ", grouped.v_name) " + op + " (?, ?)"
+
+    order = "DESC" if reverse else "ASC"
+    scan = bool(limit) and sort in INDEXED_SORTS
+
+    columns = '''
+            v_name,
+            cards.name,cards.uuid,printings,setCode,convertedManaCost,
+            manaCost,power,toughness,loyalty,types,cards.type,rarity,
+            cards.text,layout,v_names,side,colors_sp,cards.set_rank,
+            cards.cmc_key,cards.price_key,
+    '''
+
+    matches = '''
+        FROM card_search AS cards
+            JOIN sets ON cards.setCode = sets.code
+
+        WHERE
+
+            listed
+
+            '''+(' AND ('+where+')' if len(where) > 0 else '')+'''
+    '''
+
+    if scan:
+        grouped = '''
+    WITH matches AS NOT MATERIALIZED (
+
+        SELECT'''+columns+'''cards.id
+        '''+matches+'''
+
+    ), grouped AS (
+
+        SELECT grouped.*
+        FROM matches AS grouped
+        WHERE NOT EXISTS (
+            SELECT 1 FROM matches AS other
+            WHERE other.v_name = grouped.v_name AND other.id < grouped.id
+        )
+
+            '''+(' AND '+keyset if keyset else '')+f'''
+
+        ORDER BY {key} {order}, grouped.v_name {order}
+        LIMIT {limit + (offset or 0)}
+
+    )'''
+    else:
+        grouped = '''
+    WITH grouped AS (
+
+
+        SELECT'''+columns+'''min(cards.id) AS id
+        '''+matches+'''
+
+            '''+(' AND '+keyset if keyset and sort == "name" else '')+'''
+
+        GROUP BY v_name
+
+        '''+(f'''
+        ORDER BY v_name {order}
+        LIMIT {limit + (offset or 0)}
+        ''' if sort == "name" and limit else '')+'''
+
+    )'''
+
+    sql = grouped+''' SELECT grouped.*
+
+    '''+('''
+        ,prices.price,prices.date
+    FROM grouped
+        LEFT JOIN prices ON prices.id = (
+            SELECT latest.id FROM prices AS latest
+            WHERE latest.uuid = grouped.uuid AND latest.type = 'paper'
+            ORDER BY latest.date DESC, latest.id DESC
+            LIMIT 1
+        )
+    ''' if prices else '''
+    FROM grouped
+    ''')+'''
+
+    '''+('WHERE ('+keyset+')'
+         if keyset and sort != "name" and not scan else '')+'''
+
+    '''+('ORDER BY {} {}'.format(key, order)
+         + ('' if sort == "name" else ', grouped.v_name ' + order))+'''
+    '''+(f'LIMIT {limit}' if limit else ('LIMIT -1' if offset else ''))+'''
+    '''+(f'OFFSET {offset}' if offset else '')+'''
+
+    '''
+
+    return sql
+
+
+def page_key(card, sort="name"):
+    """Return the key to list the cards after `card` (see `iter_cards`).
+
+    :param Card card: last card listed
+    :param str  sort: sort key (cmc, name, price, or setcode)
+
+    The price is the `price_key` of the card, the price that the cards are
+    sorted by (a price of 0 is not shown).
+
+    """
+    key = {
+        "cmc": card.cmc,
+        "name": card.name,
+        "price": card.price_key,
+        "setcode": card.setcode,
+    }[sort]
+    return (key, card.name)
+
+
+@functools.lru_cache(maxsize=settings.QUERY_CACHE_SIZE)
+def count_statement(where):
+    """Return the statement of `Interface.count_cards`.
+
+    :param str where: WHERE condition of the search (see `Parser.parse`)
+
+    """
+    sql = '''
+        SELECT count(DISTINCT v_name)
+
+        FROM card_search AS cards
+            JOIN sets ON cards.setCode = sets.code
+
+        WHERE
+
+            listed
+
+            '''+(' AND ('+where+')' if len(where) > 0 else '')+'''
+    '''
+
+    return sql
+
+
+def connect(engine=None):
+    """Return the database interface of search engine `engine`.
+
+    :param str engine: "sqlite", "numpy" or "bitmap" (default:
+                       `SEARCH_ENGINE` setting)
+
+    """
+    engine = engine or settings.SEARCH_ENGINE
+    if engine == "numpy":
+        try:
+            from mtgcard.columnar import ColumnarInterface
+        except ImportError as e:
+            raise ImportError(
+                "the numpy search engine requires numpy ({})".format(e)
+            )
+        return ColumnarInterface()
+    if engine == "bitmap":
+        from mtgcard.bitmap import BitmapInterface
+        return BitmapInterface()
+    if engine != "sqlite":
+        raise ValueError("unknown search engine '{}'".format(engine))
+    return Interface()
+
+
 class MTGDatabase(object):
     """MTG database interface."""
 
@@ -292,18 +500,37 @@ class Interface(MTGDatabase):
         self.cursor = None
 
         # get cursor
-        root_dir = path.dirname(__file__)
-        filepath = path.join(root_dir, "data/mtg.sqlite")
+        filepath = database_path()
         if not path.exists(filepath):
             raise FileNotFoundError(
                 "'mtgcard [-v] --update-db' to generate database"
             )
-        conn = sqlite3.connect(filepath)
+        if settings.DB_READ_ONLY:
+            # the database is only written by updates, which replace the file
+            uri = pathlib.Path(filepath).resolve().as_uri()
+            conn = sqlite3.connect(
+                uri + "?mode=ro&immutable=1",
+                uri=True,
+                cached_statements=settings.QUERY_CACHE_SIZE,
+            )
+        else:
+            conn = sqlite3.connect(
+                filepath, cached_statements=settings.QUERY_CACHE_SIZE
+            )
         conn.row_factory = sqlite3.Row
         self.cursor = conn.cursor()
 
         # settings
         self.cursor.execute("PRAGMA case_sensitive_like=ON")
+        self.cursor.execute(
+            "PRAGMA mmap_size={:d}".format(int(settings.DB_MMAP_SIZE))
+        )
+        self.cursor.execute(
+            "PRAGMA cache_size={:d}".format(int(settings.DB_CACHE_SIZE))
+        )
+        self.cursor.execute("PRAGMA temp_store=MEMORY")
+        if settings.DB_READ_ONLY:
+            self.cursor.execute("PRAGMA query_only=ON")
 
         # functions
         conn.create_function("csv_in", 2, csv_in)
@@ -372,9 +599,7 @@ class Interface(MTGDatabase):
             """
             SELECT DISTINCT code, type
             FROM sets
-            ORDER BY
-                sets.type collate main_sets_first DESC,
-                sets.releaseDate DESC
+            ORDER BY sets.set_rank
             """
         )
         result = self.cursor.fetchall()
@@ -405,11 +630,11 @@ class Interface(MTGDatabase):
                 FROM cards
                     LEFT JOIN prices ON cards.uuid = prices.uuid
                         AND prices.type = 'paper'
-                WHERE lower(v_name) = lower(?) AND lower(setCode) = lower(?)
+                WHERE name_key = ? AND lower(setCode) = lower(?)
                 ORDER BY prices.price
                 LIMIT 1
                 """,
-                (name, setcode),
+                (name_key(name), setcode),
             )
             # result = self.cursor.fetchall()
             result = self.cursor.fetchone()
@@ -431,14 +656,11 @@ class Interface(MTGDatabase):
                         LEFT JOIN sets ON tokens.setCode = sets.code
                         LEFT JOIN prices ON tokens.uuid = prices.uuid
                             AND prices.type = 'paper'
-                    WHERE lower(v_name) = lower(?)
+                    WHERE name_key = ?
                     GROUP BY setCode
-                    ORDER BY
-                        sets.type collate main_sets_first DESC,
-                        sets.releaseDate DESC,
-                        prices.price
+                    ORDER BY sets.set_rank, prices.price
                     """,
-                    (name,),
+                    (name_key(name),),
                 )
 
             else:
@@ -454,14 +676,11 @@ class Interface(MTGDatabase):
                         LEFT JOIN sets ON cards.setCode = sets.code
                         LEFT JOIN prices ON cards.uuid = prices.uuid
                             AND prices.type = 'paper'
-                    WHERE lower(v_name) = lower(?)
+                    WHERE name_key = ?
                     GROUP BY setCode
-                    ORDER BY
-                        sets.type collate main_sets_first DESC,
-                        sets.releaseDate DESC,
-                        prices.price
+                    ORDER BY sets.set_rank, prices.price
                     """,
-                    (name,),
+                    (name_key(name),),
                 )
 
             result = self.cursor.fetchall()
@@ -479,16 +698,64 @@ class Interface(MTGDatabase):
 
         """
         if card.names:
-            otherFaces = []
-            for n in card.names:
-                if n != card.name:
-                    otherFaces.append(
-                        self.get_card(n, card.setcode, single_side=True)
-                    )
-            return otherFaces
+            self.load_other_faces([card])
+            return card.otherfaces
         else:
             return None
 
+    def load_other_faces(self, cards):
+        """Assign the other faces of all `cards` using a single query.
+
+        :param list cards: list of Card objects
+
+        Other faces are single-sided cards looked up by name in the set of
+        the card.
+
+        """
+        keys = {}
+        for card in cards:
+            for n in card.names or ():
+                if n != card.name:
+                    keys[(name_key(n), card.setcode)] = None
+
+        faces = {}
+        if keys:
+            self.cursor.execute(
+                """
+                SELECT
+                    v_name,cards.name_key,
+                    cards.name,cards.uuid,printings,setCode,convertedManaCost,
+                    manaCost,power,toughness,loyalty,types,cards.type,rarity,
+                    cards.text,layout,v_names,side,colors_sp
+                FROM card_search AS cards
+                WHERE (cards.name_key, cards.setCode) IN (
+                    SELECT json_extract(value, '$[0]'),
+                           json_extract(value, '$[1]')
+                    FROM json_each(?)
+                )
+                """,
+                (json.dumps(list(keys)),),
+            )
+            for result in self.cursor.fetchall():
+                key = (result["name_key"], result["setCode"])
+                if key not in faces:
+                    faces[key] = self.card_from_result(
+                        result, single_side=True
+                    )
+
+        for card in cards:
+            if not card.names:
+                continue
+            card.otherfaces = []
+            for n in card.names:
+                if n != card.name:
+                    face = faces.get((name_key(n), card.setcode))
+                    if face is None:
+                        face = self.get_card(
+                            n, card.setcode, single_side=True
+                        )
+                    card.otherfaces.append(face)
+
     def get_token(self, name, setcode=None, verbose=False):
         """Return a token Card called `name`.
 
@@ -497,7 +764,7 @@ class Interface(MTGDatabase):
         :param bool verbose: whether to get price
 
         """
-        t = [name]
+        t = [name_key(name)]
         if setcode:
             t.append(setcode)
         t = tuple(t)
@@ -530,15 +797,14 @@ class Interface(MTGDatabase):
 
             WHERE
 
-                lower(v_name) = lower(?)
+                name_key = ?
 
                 '''+('''
                 AND lower(setCode) = lower(?)
                 ''' if setcode else '')+'''
 
             '''+('''
-            ORDER BY sets.type collate main_sets_first DESC,
-                     sets.releaseDate DESC
+            ORDER BY sets.set_rank
             ''' if not setcode else '')+'''
             LIMIT 1
             '''
@@ -629,123 +895,164 @@ class Interface(MTGDatabase):
             card.price_date = result["date"] if result["date"] else None
         except IndexError as e:
             pass
+        try:
+            # the price listings are sorted by (see `cards_statement`)
+            if result["price_key"] != -1:
+                card.price_key = result["price_key"]
+        except IndexError as e:
+            pass
 
         return card
 
-    def get_cards(self, query, sort="name", reverse=False, limit=None):
+    def get_cards(
+        self, query, sort="name", reverse=False, limit=None, prices=False,
+        after=None, offset=None,
+    ):
         """Return a list of cards from database.
 
-        :param str  query:   search query
-        :param str  sort:    sort key (cmc, name, price, or setcode)
-        :param bool reverse: whether to reverse result order
-        :param bool limit:   maximum number of cards to return
+        :param str   query:   search query
+        :param str   sort:    sort key (cmc, name, price, or setcode)
+        :param bool  reverse: whether to reverse result order
+        :param bool  limit:   maximum number of cards to return
+        :param bool  prices:  whether to get prices (always when sorting by
+                              price)
+        :param tuple after:   key of the card to list cards after (see
+                              `page_key`)
+        :param int   offset:  number of cards to skip
+
+        Return None if no card matches (see `iter_cards`).
 
         """
-        sortkey = {
-            "cmc": "convertedManaCost",
-            "name": "v_name",
-            "price": "price",
-            "setcode": "setCode",
-        }
+        cards = list(self.iter_cards(
+            query, sort, reverse, limit, prices, after, offset
+        ))
+        return cards if cards else None
+
+    def iter_cards(
+        self, query, sort="name", reverse=False, limit=None, prices=False,
+        after=None, offset=None,
+    ):
+        """Yield the cards from database matching `query`.
+
+        :param str   query:   search query
+        :param str   sort:    sort key (cmc, name, price, or setcode)
+        :param bool  reverse: whether to reverse result order
+        :param bool  limit:   maximum number of cards to return
+        :param bool  prices:  whether to get prices (always when sorting by
+                              price)
+        :param tuple after:   key of the card to list cards after (see
+                              `page_key`)
+        :param int   offset:  number of cards to skip
+
+        Sorted by name, cmc or price, a page of cards after the last card of
+        the previous one only reads the cards of the page. Sorted by set
+        code, all the matches are grouped for every page, and an `offset`
+        reads the skipped cards.
+
+        Each card is the matching printing with the lowest set rank. The
+        latest price of a printing is joined after grouping by name, so only
+        the returned printings are looked up. Results are fetched and their other faces loaded
+        `CARDS_BATCH` at a time, so the first cards are yielded before the
+        search is complete.
 
-        sql = '''
-        WITH main_first AS (
+        """
+        if query[0] == NO_CARDS:
+            return
+
+        prices = prices or sort == "price"
+        params = tuple(query[1])
+        keyset = None
+        if after is not None:
+            key, name = after
+            if sort == "name" or key is None:
+                keyset = "null"
+                params += (name,)
+            else:
+                keyset = "key"
+                params += (key, name)
+        sql = cards_statement(
+            query[0], sort, reverse, limit, prices, keyset, offset
+        )
 
+        sqlite3.enable_callback_tracebacks(True)
 
-            SELECT
-                CASE WHEN cards.faceName IS NULL
-                THEN cards.name
-                ELSE cards.faceName
-                END AS v_name,
-                cards.name,cards.uuid,printings,setCode,convertedManaCost,
-                manaCost,power,toughness,loyalty,types,cards.type,rarity,
-                cards.text,layout,
-                replace(cards.name, " // ", ",") as v_names,side,
-                max(setcode) OVER
-                (ORDER BY sets.type collate main_sets_first DESC,
-                          releaseDate DESC
-                ) latest_main,
-                CASE WHEN (layout) IN ('split','aftermath') THEN
-
-                        (WITH split(word, str) AS (
-                                SELECT '', otherFaceIds||','
-                                UNION ALL
-                                SELECT
-                                substr(str, 1, instr(str, ',')-1),
-                                substr(str, instr(str, ',')+1)
-                                FROM split WHERE str != ''
-                            ) SELECT
-                                group_concat(
-                                    (SELECT colors FROM cards c1
-                                     WHERE c1.uuid = word)
-                                )
-                            FROM split WHERE word != ''
-                        )||','||colors
-
-                ELSE colors
-                END AS colors_sp,
-                prices.price,prices.date
+        # own cursor, as loading other faces runs queries on `self.cursor`
+        cursor = self.cursor.connection.cursor()
+        try:
+            cursor.execute(sql, params)
 
-            FROM cards
-                JOIN sets ON cards.setCode = sets.code
-                LEFT JOIN legalities ON cards.uuid = legalities.uuid
-                LEFT JOIN prices ON cards.uuid = prices.uuid
-                    AND prices.type = 'paper'
+            while True:
+                results = cursor.fetchmany(CARDS_BATCH)
+                if not results:
+                    break
 
-            WHERE
+                # get cards, other faces are loaded for the batch below
+                cards = []
+                for result in results:
+                    cards.append(self.card_from_result(
+                        result, single_side=True, verbose=False,
+                        rulings=False
+                    ))
 
-                csv_in(availability, 'paper')
-
-                AND (
-                    -- exclude set 'Mystery Booster Playtest Cards (CMB1)'
-                    -- exclude set 'Happy Holidays (HHO)'
-                    -- exclude set 'Ponies: The Galloping (PTG)'
-                    -- exclude set '2016 Heroes of the Realm (HTR)'
-                    -- exclude set '2017 Heroes of the Realm (HTR17)'
-                    -- exclude set '2018 Heroes of the Realm (HTR18)'
-                    -- exclude set 'HasCon (H17)'
-                    setCode not in ('CMB1', 'HHO', 'PTG', 'HTR', 'HTR17',
-                                    'HTR18', 'H17')
-                )
+                self.load_other_faces(cards)
+                yield from cards
+        finally:
+            cursor.close()
 
-                AND (
-                    (side IS NULL AND layout != 'split') OR
-                    side = 'a' OR (layout = 'meld' AND side = 'b') OR
-                    (side IS NULL AND layout = 'split'
-                        AND v_name = facename_element(cards.name,0))
-                )
+    def find_page_key(self, query, name, sort="name"):
+        """Return the key to list the cards matching `query` after `name`.
 
-                '''+(' AND ('+query[0]+')' if len(query[0]) > 0 else '')+'''
+        :param str query: search query
+        :param str name:  name of a card matching `query`
+        :param str sort:  sort key (cmc, name, price, or setcode)
 
+        Raise ValueError if no card `name` matches (see `page_key`).
 
-        ) SELECT * FROM main_first
-        GROUP BY v_name
-        '''+('ORDER BY {} {}'.format(sortkey[sort],
-                                     ("DESC" if reverse else "ASC")))+'''
-        '''+(f'LIMIT {limit}' if limit else '')+'''
+        """
+        where = "lower(v_name) = lower(?)"
+        if query[0]:
+            where = "(" + query[0] + ") AND " + where
+        cards = self.get_cards(
+            (where, tuple(query[1]) + (name,)), sort=sort, limit=1
+        )
+        if cards is None:
+            raise ValueError("card not listed: '{:s}'".format(name))
+        return page_key(cards[0], sort)
 
-        '''
+    def count_cards(self, query):
+        """Return the number of cards matching `query`.
 
-        # pprint( query )
-        # print( sql )
+        :param str query: search query
 
-        sqlite3.enable_callback_tracebacks(True)
-        self.cursor.execute(sql, query[1])
+        Counts the cards `iter_cards` would return without a limit, without
+        reading them.
 
-        results = self.cursor.fetchall()
-        cards = {}
-        for result in results:
+        """
+        if query[0] == NO_CARDS:
+            return 0
+        self.cursor.execute(count_statement(query[0]), query[1])
+        return self.cursor.fetchone()[0]
+
+    def iter_cards_by_id(
+        self, ids, sort="name", reverse=False, limit=None, prices=False,
+        after=None, offset=None,
+    ):
+        """Yield the cards from the printings of `card_search` ids.
 
-            # get card
-            cards[result["v_name"]] = self.card_from_result(
-                result, verbose=False, rulings=False
-            )
+        :param list ids: ids of the printings found by a search engine
 
-        if len(cards) == 0:
-            pass
-        else:
-            cards = list(cards.values())
-            return cards
+        Other parameters and the yielded cards are those of `iter_cards`.
+
+        """
+        if len(ids) == 0:
+            return
+        query = (
+            "cards.id IN (SELECT value FROM json_each(?))",
+            (json.dumps(list(ids)),),
+        )
+        yield from self.iter_cards(
+            query, sort, reverse, limit, prices, after, offset
+        )
 
     def get_card(
         self,
@@ -772,56 +1079,35 @@ class Interface(MTGDatabase):
 
         else:
 
-            t = [name]
+            t = [name_key(name)]
             if setcode:
                 t.append(setcode)
             if format:
                 t.append(format)
             t = tuple(t)
 
+            # the default printing needs no ordering of printings
+            preferred = not setcode and not format
+            key_table = "preferred_printing" if preferred else "cards"
+
             self.cursor.execute("""
                 SELECT
-                    CASE WHEN cards.faceName IS NULL
-                    THEN cards.name
-                    ELSE cards.faceName
-                    END AS v_name,
+                    v_name,
                     cards.name,cards.uuid,printings,setCode,convertedManaCost,
                     manaCost,power,toughness,loyalty,types,cards.type,rarity,
-                    cards.text,layout,
-                    replace(cards.name, " // ", ",") as v_names,side,
-                    CASE WHEN (layout) IN ('split','aftermath') THEN
-
-                            (WITH split(word, str) AS (
-                                    SELECT '', otherFaceIds||','
-                                    UNION ALL
-                                    SELECT
-                                    substr(str, 1, instr(str, ',')-1),
-                                    substr(str, instr(str, ',')+1)
-                                    FROM split WHERE str != ''
-                                ) SELECT
-                                    group_concat(
-                                        (SELECT colors FROM cards c1
-                                         WHERE c1.uuid = word)
-                                    )
-                                FROM split WHERE word != ''
-                            )||','||colors
-
-                    ELSE colors
-                    END AS colors_sp
+                    cards.text,layout,v_names,side,colors_sp
 
                     """+(""",
                     prices.price,prices.date
                     """ if verbose else '')+"""
 
-                FROM cards
-
-                    """+("""
-                    JOIN sets ON cards.setCode = sets.code
-                    """ if not setcode else '')+"""
-
-                    """+("""
-                    LEFT JOIN legalities ON cards.uuid = legalities.uuid
-                    """ if format else '')+"""
+                """+("""
+                FROM preferred_printing
+                    JOIN card_search AS cards
+                        ON cards.uuid = preferred_printing.uuid
+                """ if preferred else """
+                FROM card_search AS cards
+                """)+"""
 
                     """+("""
                     LEFT JOIN prices ON cards.uuid = prices.uuid
@@ -830,23 +1116,24 @@ class Interface(MTGDatabase):
 
                 WHERE
 
-                    lower(v_name) = lower(?)
-
-                    AND csv_in(availability, 'paper')
+                    """+key_table+""".name_key = ?
 
                     """+("""
                     AND lower(setCode) = lower(?)
                     """ if setcode else '')+"""
 
                     """+("""
-                    AND lower(legalities.format) = lower(?) AND
-                    legalities.status = 'Legal'
+                    AND EXISTS (
+                        SELECT 1 FROM legalities
+                        WHERE legalities.uuid = cards.uuid AND
+                            lower(legalities.format) = lower(?) AND
+                            legalities.status = 'Legal'
+                    )
                     """ if format else '')+"""
 
                 """+("""
-                ORDER BY sets.type collate main_sets_first DESC,
-                         sets.releaseDate DESC
-                """ if not setcode else '')+"""
+                ORDER BY cards.set_rank
+                """ if format and not setcode else '')+"""
                 LIMIT 1
                 """, t)
 
@@ -14,14 +14,47 @@
 # You should have received a copy of the GNU General Public License
 # along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
 
-"""LR parsing algorithm for mtgcard search."""
+"""LR parsing algorithm for mtgcard search.
+
+The lexer and LALR tables are generated by `write_tables` when mtgcard is
+built, and the parser is only constructed for the first query parsed.
+
+"""
 
 
 from .ply import lex
 from .ply import yacc
+import os
 import re
+import sys
+import functools
+import importlib.util
 
 from mtgcard import settings
+from mtgcard.common import MANA_COLUMNS, NO_CARDS
+from mtgcard.common import manacost_counts, manacost_to_cmc
+
+
+# modules of the lexer and parser tables shipped with mtgcard
+LEXTAB = "mtgcard.lextab"
+YACCTAB = "mtgcard.yacctab"
+
+# characters escaped in LIKE patterns
+r_like_special = re.compile(r"[\\%_]")
+
+# bit of each color in the color masks of `card_search`
+COLOR_BITS = {"w": 1, "u": 2, "b": 4, "r": 8, "g": 16}
+
+# layouts of the cards whose other faces are also checked, by searched
+# column (None means all layouts linked in `card_faces`)
+OTHER_LAYOUTS = {
+    "cards.power": ("aftermath", "flip", "transform", "meld"),
+    "cards.toughness": ("aftermath", "flip", "transform", "meld"),
+    "cards.type": None,
+    "cards.color": ("transform", "meld"),
+    # do not combine manacosts for split card searches
+    "cards.mana": ("adventure", "split", "aftermath"),
+}
 
 
 """*
@@ -108,10 +141,7 @@ tokens = [
     "NE",
 ] + list(set(reserved.values()))
 
-l_keywords = list()
-
-
-def _lexer():
+def _lexer(optimize=True):
 
     t_NOT = r"-"
     t_LPAREN = r"\("
@@ -149,7 +179,10 @@ def _lexer():
         print(f"Illegal character {t.value[0]!r}")
         t.lexer.skip(1)
 
-    return lex.lex()
+    if optimize and importlib.util.find_spec(LEXTAB) is None:
+        # no tables were built; do not write them into the package
+        optimize = False
+    return lex.lex(optimize=optimize, lextab=LEXTAB)
 
 
 ###############################################################################
@@ -157,7 +190,7 @@ def _lexer():
 ###############################################################################
 
 
-def _parser():
+def _parser(optimize=True, write_tables=False, tabmodule=YACCTAB):
 
     ############
     #  option  #
@@ -165,7 +198,7 @@ def _parser():
 
     def p_option_or(p):
         "option          : option OR combination"
-        p[0] = "{:s} OR {:s}".format(p[1], p[3])
+        p[0] = Or([p[1], p[3]])
 
     def p_option_combination(p):
         "option          : combination"
@@ -177,7 +210,7 @@ def _parser():
 
     def p_combination_and(p):
         "combination     : combination term"
-        p[0] = "{:s} AND {:s}".format(p[1], p[2])
+        p[0] = And([p[1], p[2]])
 
     def p_combination_term(p):
         "combination     : term"
@@ -203,17 +236,21 @@ def _parser():
 
     def p_term_not(p):
         "term            : NOT term"
-        p[0] = "NOT {:s}".format(p[2])
+        p[0] = Not(p[2])
 
     def p_term_group(p):
         "term            : LPAREN option RPAREN"
-        p[0] = "{:s} {:s} {:s}".format(p[1], p[2], p[3])
+        p[0] = p[2]
 
     ##############
     #  keywords  #
     ##############
 
     reserved_str = {"name": "v_name", "text": "cards.text"}
+    fts_columns = {
+        "name": ("name", "other_names"),
+        "text": ("text", "other_texts"),
+    }
     reserved_chars = {
         "set": "cards.setCode",
         "legal": "legalities.format",
@@ -228,6 +265,8 @@ def _parser():
         "toughness": "cards.toughness",
         "loyalty": "cards.loyalty",
     }
+    # TEXT columns of `reserved_int` (e.g. loyalty "X")
+    text_int = {"cards.power", "cards.toughness", "cards.loyalty"}
     reserved_price = {"price": "prices.price"}
     reserved_year = {"year": "sets.releaseDate"}
     reserved_type = {"type": "cards.type", "t": "cards.type"}
@@ -241,26 +280,14 @@ def _parser():
         term           : string
                        | CHARS
         """
-        p.lexer.l_keywords.append("%{:s}%".format(p[1]))
-        p.lexer.l_keywords.append("%{:s}%".format(p[1]))
-        sql_query = "lower({:s}) LIKE lower(?)".format("v_name")
-        other_query = "lower({:s}) LIKE lower(?)".format("cards.faceName")
-        p[0] = sql_where_card_or_otherids(
-            card_cond=sql_query, other_cond=other_query
-        )
+        substring_term(p, "name", p[1])
 
     def p_term_exact_name(p):
         """
         term           : EXACT string
                        | EXACT CHARS
         """
-        p.lexer.l_keywords.append(p[2])
-        p.lexer.l_keywords.append(p[2])
-        sql_query = "lower({:s}) = lower(?)".format("v_name")
-        other_query = "lower({:s}) = lower(?)".format("cards.faceName")
-        p[0] = sql_where_card_or_otherids(
-            card_cond=sql_query, other_cond=other_query
-        )
+        exact_name_term(p, p[2])
 
     def p_term_eq_exact_name(p):
         """
@@ -270,13 +297,7 @@ def _parser():
 
         if p[1] != "name":
             raise ValueError("invalid search keyword '{}'".format(p[1]))
-        p.lexer.l_keywords.append(p[4])
-        p.lexer.l_keywords.append(p[4])
-        sql_query = "lower({:s}) = lower(?)".format("v_name")
-        other_query = "lower({:s}) = lower(?)".format("cards.faceName")
-        p[0] = sql_where_card_or_otherids(
-            card_cond=sql_query, other_cond=other_query
-        )
+        exact_name_term(p, p[4])
 
     # name and non-name condition terms
 
@@ -338,61 +359,117 @@ def _parser():
     #  term functions  #
     ####################
 
+    def exact_name_term(p, value):
+        sql_query = "lower({:s}) = lower(?)".format("v_name")
+        other_query = "lower({:s}) = lower(?)".format("cards.faceName")
+        p[0] = Term(
+            sql_where_card_or_otherids(
+                card_cond=sql_query, other_cond=other_query
+            ),
+            [value, value],
+            COST["column"] + COST["faces"],
+        )
+
+    def other_layouts(column):
+        layouts = OTHER_LAYOUTS[column]
+        if layouts is None:
+            return None
+        return tuple("'{:s}'".format(layout) for layout in layouts)
+
     def str_term(p):
-        p.lexer.l_keywords.append("%{:s}%".format(p[3]))
-        p.lexer.l_keywords.append("%{:s}%".format(p[3]))
-        sql_query = "lower({:s}) LIKE lower(?)".format(reserved_str[p[1]])
-        other_str = reserved_str[p[1]].replace("v_name", "cards.faceName")
-        other_query = "lower({:s}) LIKE lower(?)".format(other_str)
-        p[0] = sql_where_card_or_otherids(
-            card_cond=sql_query, other_cond=other_query
+        substring_term(p, p[1], p[3])
+
+    def substring_term(p, keyword, value):
+        # trigrams of the full-text index need at least three characters
+        if len(value) >= 3:
+            p[0] = Term(
+                sql_where_card_or_otherids(card_cond=sql_fts_match()),
+                [fts_phrase(fts_columns[keyword], value)],
+                COST["fts"],
+            )
+            return
+
+        # "%" and "_" are literal, as in the full-text index; unlike it,
+        # lower() only folds the case of ASCII letters
+        like = "lower({:s}) LIKE lower(?) ESCAPE '\\'"
+        sql_query = like.format(reserved_str[keyword])
+        other_str = reserved_str[keyword].replace("v_name", "cards.faceName")
+        other_query = like.format(other_str)
+        p[0] = Term(
+            sql_where_card_or_otherids(
+                card_cond=sql_query, other_cond=other_query
+            ),
+            ["%{:s}%".format(r_like_special.sub(r"\\\g<0>", value))] * 2,
+            COST["like"] + COST["faces"],
         )
 
     def chars_term(p):
-        p.lexer.l_keywords.append(p[3])
         sql_query = "lower({:s}) = lower(?)".format(reserved_chars[p[1]])
-        p[0] = sql_where_card_or_otherids(card_cond=sql_query, other_cond=None)
+        if reserved_chars[p[1]].startswith("legalities."):
+            sql_query = sql_exists("legalities", sql_query)
+            cost, constraint = COST["exists"], None
+        else:
+            # a printing has a single value
+            cost = COST["column"]
+            constraint = (reserved_chars[p[1]], "=", p[3].lower())
+        p[0] = Term(
+            sql_where_card_or_otherids(card_cond=sql_query, other_cond=None),
+            [p[3]],
+            cost,
+            constraint,
+            (reserved_chars[p[1]], "=", p[3]),
+        )
 
     def int_term(p):
-        p.lexer.l_keywords.append(int(p[3]))
         if p[2] == ":":
             p[2] = "="
 
-        if p[1] in ("power", "toughness"):
-            p.lexer.l_keywords.append(int(p[3]))
-            layouts = ("'aftermath'", "'flip'", "'transform'", "'meld'")
-            sql_query = "{:s} {:s} ?".format(reserved_int[p[1]], p[2])
-            p[0] = sql_where_card_or_otherids(
-                card_cond=sql_query,
-                other_cond=sql_query,
-                other_layouts=layouts,
+        column = reserved_int[p[1]]
+        sql_query = "{:s} {:s} ?".format(column, p[2])
+        search = (column, p[2], int(p[3]))
+        if column in OTHER_LAYOUTS:
+            p[0] = Term(
+                sql_where_card_or_otherids(
+                    card_cond=sql_query,
+                    other_cond=sql_query,
+                    other_layouts=other_layouts(column),
+                ),
+                [int(p[3])] * 2,
+                COST["column"] + COST["faces"],
+                search=search,
             )
         else:
-            sql_query = "{:s} {:s} ?".format(reserved_int[p[1]], p[2])
-            p[0] = sql_where_card_or_otherids(
-                card_cond=sql_query, other_cond=None
+            p[0] = Term(
+                sql_where_card_or_otherids(
+                    card_cond=sql_query, other_cond=None
+                ),
+                [int(p[3])],
+                COST["column"],
+                # TEXT columns compare with the number as text in SQL, so
+                # their ranges are not numeric constraints
+                search if column not in text_int else None,
+                search,
             )
 
     def price_term(p):
         match = re.match(r"\d+(?:\.\d+)?", p[3])
         if not match:
             raise SyntaxError
-        for i in range(1):
-            p.lexer.l_keywords.append(
-                float(float(match.group()) / settings.US_TO_CUR_RATE)
-            )
         if p[2] == ":":
             p[2] = "="
-        sql_query = """
-        ( {:s} {:s} round(?,2) AND prices.type = 'paper' )
-        """.format(
-            "prices.price", p[2]
+        sql_query = sql_exists(
+            "prices",
+            "{:s} {:s} round(?,2) AND prices.type = 'paper'".format(
+                "prices.price", p[2]
+            ),
+        )
+        p[0] = Term(
+            sql_where_card_or_otherids(card_cond=sql_query, other_cond=None),
+            [float(float(match.group()) / settings.US_TO_CUR_RATE)],
+            COST["exists"],
         )
-        p[0] = sql_where_card_or_otherids(card_cond=sql_query, other_cond=None)
 
     def year_term(p):
-        p.lexer.l_keywords.append(int(p[3]))
-        p.lexer.l_keywords.append(int(p[3]))
         if p[2] == ":":
             p[2] = "="
         sql_query = """
@@ -400,154 +477,113 @@ def _parser():
         """.strip().format(
             "sets.releaseDate", p[2]
         )
-        p[0] = sql_where_card_or_otherids(card_cond=sql_query, other_cond=None)
+        p[0] = Term(
+            sql_where_card_or_otherids(card_cond=sql_query, other_cond=None),
+            [int(p[3])],
+            COST["function"],
+            ("sets.releaseDate", p[2], int(p[3])),
+            ("sets.releaseDate", p[2], int(p[3])),
+        )
 
     def type_term(p):
-        for i in range(6):
-            p.lexer.l_keywords.append(p[3])
         sql_query = """
         (csv_in(lower(cards.subtypes), lower(?)) OR
         csv_in(lower(cards.supertypes), lower(?)) OR
         csv_in(lower(cards.types), lower(?)))
         """
-        p[0] = sql_where_card_or_otherids(
-            card_cond=sql_query, other_cond=sql_query
+        p[0] = Term(
+            sql_where_card_or_otherids(
+                card_cond=sql_query,
+                other_cond=sql_query,
+                other_layouts=other_layouts("cards.type"),
+            ),
+            [p[3]] * 6,
+            COST["udf"] + COST["faces"],
+            search=("cards.type", "=", p[3]),
         )
 
     def color_term(p):
-        layouts = ("'transform'", "'meld'")
-        for i in range(4):
-            p.lexer.l_keywords.append(",".join(p[3]))
         if p[2] == ":":
             p[2] = ">="
 
-        if p[2] == "=":
-            for i in range(2):
-                p.lexer.l_keywords.append(",".join(p[3]))
-
-            sql_query_split = """
-        ( csv_len({tbl_col}) {:s} csv_len(lower(?)) AND
-        csv_set_contains(lower(?), lower({tbl_col})) AND
-        csv_set_contains(lower({tbl_col}), lower(?)) )
-        """.format(
-                p[2], tbl_col="colors_sp"
-            )
-            sql_query = """
-        ( csv_len({tbl_col}) {:s} csv_len(lower(?)) AND
-        csv_set_contains(lower(?), lower({tbl_col})) AND
-        csv_set_contains(lower({tbl_col}), lower(?)) )
-        """.format(
-                p[2], tbl_col="cards.colors"
-            )
+        # letters other than WUBRG get a bit no card color mask has set
+        letters = set(p[3].lower())
+        mask = 0
+        for letter in letters:
+            mask |= COLOR_BITS.get(letter, 1 << len(COLOR_BITS))
 
-            p[0] = sql_where_card_or_otherids(
-                card_cond=sql_query_split,
-                other_cond=sql_query,
-                other_layouts=layouts,
-            )
+        if p[2] == "=":
+            cond = """
+        ( {popcount} {:s} ? AND
+        ({tbl_col} & ?) = {tbl_col} AND
+        ({tbl_col} & ?) = ? )
+        """
+            params = [len(letters), mask, mask, mask]
 
         elif p[2] == ">" or p[2] == ">=":
-            sql_query_split = """
-        ( csv_len({tbl_col}) {:s} csv_len(lower(?)) AND
-        csv_set_contains(lower({tbl_col}), lower(?)) )
-        """.format(
-                p[2], tbl_col="colors_sp"
-            )
-            sql_query = """
-        ( csv_len({tbl_col}) {:s} csv_len(lower(?)) AND
-        csv_set_contains(lower({tbl_col}), lower(?)) )
-        """.format(
-                p[2], tbl_col="cards.colors"
-            )
-            p[0] = sql_where_card_or_otherids(
-                card_cond=sql_query_split,
-                other_cond=sql_query,
-                other_layouts=layouts,
-            )
+            cond = """
+        ( {popcount} {:s} ? AND
+        ({tbl_col} & ?) = ? )
+        """
+            params = [len(letters), mask, mask]
 
         elif p[2] == "<" or p[2] == "<=":
-            sql_query_split = """
-        ( csv_len({tbl_col}) {:s} csv_len(lower(?)) AND
-        csv_set_contains(lower(?), lower({tbl_col})) )
-        """.format(
-                p[2], tbl_col="colors_sp"
-            )
-            sql_query = """
-        ( csv_len({tbl_col}) {:s} csv_len(lower(?)) AND
-        csv_set_contains(lower(?), lower({tbl_col})) )
-        """.format(
-                p[2], tbl_col="cards.colors"
-            )
-            p[0] = sql_where_card_or_otherids(
+            cond = """
+        ( {popcount} {:s} ? AND
+        ({tbl_col} & ?) = {tbl_col} )
+        """
+            params = [len(letters), mask]
+
+        else:
+            raise ValueError("invalid operator '{}' for colors".format(p[2]))
+
+        sql_query_split = cond.format(
+            p[2], tbl_col="colors_sp_mask",
+            popcount=sql_popcount("colors_sp_mask")
+        )
+        sql_query = cond.format(
+            p[2], tbl_col="cards.color_mask",
+            popcount=sql_popcount("cards.color_mask")
+        )
+        p[0] = Term(
+            sql_where_card_or_otherids(
                 card_cond=sql_query_split,
                 other_cond=sql_query,
-                other_layouts=layouts,
-            )
+                other_layouts=other_layouts("cards.color"),
+            ),
+            params * 2,
+            COST["column"] + COST["faces"],
+            search=("cards.color", p[2], p[3]),
+        )
 
     def mana_term(p):
-        # do not combine manacosts for split card searches
-        layouts = ("'adventure'", "'split'", "'aftermath'")
-        for i in range(4):
-            p.lexer.l_keywords.append(p[3])
         if p[2] == ":":
             p[2] = ">="
-
-        if p[2] == ">" or p[2] == ">=":
-            sql_query = """
-        ( manacost_to_cmc({tbl_col}) {:s} manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower({tbl_col}), lower(?)) )
-        """.format(
-                p[2], tbl_col="cards.manaCost"
-            )
-            #     sql_query_split = '''
-            # ( {:s} {:s} manacost_to_cmc(lower(?)) AND
-            # manacost_contains(lower({:s}), lower(?)) )
-            # '''.format('cards.convertedManaCost', p[2], 'manacost_sp')
-            p[0] = sql_where_card_or_otherids(
-                card_cond=sql_query,
-                other_cond=sql_query,
-                other_layouts=layouts,
-            )
-
-        elif p[2] == "<" or p[2] == "<=":
-            sql_query = """
-        ( manacost_to_cmc({tbl_col}) {:s} manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower(?), lower({tbl_col})) )
-        """.format(
-                p[2], tbl_col="cards.manaCost"
-            )
-            #     sql_query_split = '''
-            # ( {:s} {:s} manacost_to_cmc(lower(?)) AND
-            # manacost_contains(lower(?), lower({:s})) )
-            # '''.format('cards.convertedManaCost', p[2], 'manacost_sp')
-            p[0] = sql_where_card_or_otherids(
-                card_cond=sql_query,
-                other_cond=sql_query,
-                other_layouts=layouts,
+        elif p[2] == "!=":
+            raise ValueError("invalid operator '{}' for mana".format(p[2]))
+
+        counts = manacost_counts(p[3])
+        if counts["hybrid"] or counts["phyrexian"] or counts["other"]:
+            # symbols without a count column are compared as strings
+            sql_query = sql_manacost_udf(p[2])
+            params = [p[3], p[3]] + ([p[3]] if p[2] == "=" else [])
+            cost, search = COST["udf"], None
+        else:
+            sql_query, params = sql_manacost(
+                p[2], manacost_to_cmc(p[3]), counts
             )
+            cost, search = COST["exists"], ("cards.mana", p[2], p[3])
 
-        elif p[2] == "=":
-            for i in range(2):
-                p.lexer.l_keywords.append(p[3])
-            sql_query = """
-        ( manacost_to_cmc({tbl_col}) {:s} manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower(?), lower({tbl_col})) AND
-        manacost_contains(lower({tbl_col}), lower(?)) )
-        """.format(
-                p[2], tbl_col="cards.manaCost"
-            )
-            #     sql_query_split = '''
-            # ( {:s} {:s} manacost_to_cmc(lower(?)) AND
-            # manacost_contains(lower(?), lower({tbl_col})) AND
-            # manacost_contains(lower({tbl_col}), lower(?)) )
-            # '''.format(
-            #   'cards.convertedManaCost', p[2], tbl_col='manacost_sp'
-            # )
-            p[0] = sql_where_card_or_otherids(
+        p[0] = Term(
+            sql_where_card_or_otherids(
                 card_cond=sql_query,
                 other_cond=sql_query,
-                other_layouts=layouts,
-            )
+                other_layouts=other_layouts("cards.mana"),
+            ),
+            params * 2,
+            cost + COST["faces"],
+            search=search,
+        )
 
     ############
     #  string  #
@@ -594,7 +630,27 @@ def _parser():
             # print(f"syntax error at {p.value!r}")
             raise SyntaxError(f"syntax error at {p.value!r}")
 
-    return yacc.yacc(debug=debug)
+    return yacc.yacc(
+        debug=debug,
+        optimize=optimize,
+        write_tables=write_tables,
+        tabmodule=tabmodule,
+    )
+
+
+def write_tables():
+    """Write the lexer and parser tables into the mtgcard package."""
+    outputdir = os.path.dirname(os.path.abspath(__file__))
+    for tabmodule in (LEXTAB, YACCTAB):
+        # yacc only writes the tables it did not find
+        filename = tabmodule.split(".")[-1] + ".py"
+        if os.path.exists(os.path.join(outputdir, filename)):
+            os.remove(os.path.join(outputdir, filename))
+        sys.modules.pop(tabmodule, None)
+    importlib.invalidate_caches()
+
+    _lexer(optimize=False).writetab(LEXTAB, outputdir)
+    _parser(optimize=False, write_tables=True)
 
 
 ###################
@@ -602,6 +658,114 @@ def _parser():
 ###################
 
 
+def sql_exists(table, cond):
+    """Return SQL for a semi-join of the card with rows of `table`.
+
+    :param str table: table with a `uuid` column referencing the card
+    :param str cond:  WHERE condition on `table`
+
+    """
+    sql = """
+        EXISTS (
+            SELECT 1 FROM """+table+"""
+            WHERE """+table+""".uuid = cards.uuid AND """+cond+"""
+        )
+        """
+
+    return sql
+
+
+def fts_phrase(columns, s):
+    """Return a full-text query for phrase `s` in any of `columns`.
+
+    :param tuple columns: columns of `card_fts`
+    :param str   s:       searched substring
+
+    """
+    return "{" + " ".join(columns) + "} : \"" + s.replace('"', '""') + "\""
+
+
+def sql_fts_match():
+    """Return SQL for cards with a face matching a full-text query."""
+    sql = """
+        cards.id IN (
+            SELECT rowid FROM card_fts WHERE card_fts MATCH ?
+        )
+        """
+    return sql
+
+
+def sql_manacost(op, cmc, counts):
+    """Return SQL and parameters comparing the card manacost with `counts`.
+
+    :param str   op:     comparison operator
+    :param int   cmc:    converted manacost searched
+    :param dict  counts: mana symbol counts searched (see `manacost_counts`)
+
+    Costs compare as multisets of mana symbols, generic mana counting as
+    that many {1}.
+
+    """
+    conds = ["card_mana.cmc {:s} ?".format(op)]
+    params = [cmc]
+    if op == ">" or op == ">=":
+        # the card has at least the searched symbols
+        for col in MANA_COLUMNS:
+            if counts[col]:
+                conds.append("card_mana.{:s} >= ?".format(col))
+                params.append(counts[col])
+    else:
+        # the card has at most (or exactly) the searched symbols
+        col_op = "=" if op == "=" else "<="
+        for col in MANA_COLUMNS:
+            conds.append("card_mana.{:s} {:s} ?".format(col, col_op))
+            params.append(counts[col])
+
+    sql = """
+        cards.uuid IN (
+            SELECT card_mana.uuid FROM card_mana
+            WHERE """+" AND ".join(conds)+"""
+        )
+        """
+    return sql, params
+
+
+def sql_manacost_udf(op):
+    """Return SQL comparing the card manacost with functions of mtgdb.
+
+    :param str op: comparison operator
+
+    Used for searched symbols that `card_mana` does not count. The searched
+    manacost is passed twice, three times for "=".
+
+    """
+    if op == ">" or op == ">=":
+        contains = "manacost_contains(lower(cards.manaCost), lower(?))"
+    elif op == "<" or op == "<=":
+        contains = "manacost_contains(lower(?), lower(cards.manaCost))"
+    else:
+        contains = """manacost_contains(lower(?), lower(cards.manaCost)) AND
+        manacost_contains(lower(cards.manaCost), lower(?))"""
+
+    sql = """
+        ( manacost_to_cmc(cards.manaCost) """+op+"""
+            manacost_to_cmc(lower(?)) AND
+        """+contains+""" )
+        """
+    return sql
+
+
+def sql_popcount(col):
+    """Return SQL for the number of colors in a color mask.
+
+    :param str col: column with a mask of `COLOR_BITS`
+
+    """
+    return "(" + " + ".join(
+        "(({:s} >> {:d}) & 1)".format(col, i) for i in range(len(COLOR_BITS))
+    ) + ")"
+
+
 def sql_where_card_or_otherids(card_cond, other_cond=None, other_layouts=None):
     """Return SQL for WHERE code for the card and its other faces.
 
@@ -611,6 +775,9 @@ def sql_where_card_or_otherids(card_cond, other_cond=None, other_layouts=None):
     :param tuple other_layouts: limit layouts to which other faces are checked
                                 (None means all layouts are checked)
 
+    The other faces are those linked in `card_faces`; the subquery does not
+    depend on the card, so it is evaluated once per statement.
+
     """
     if other_layouts is not None:
         s_other_layouts = ",".join(other_layouts)
@@ -627,40 +794,20 @@ def sql_where_card_or_otherids(card_cond, other_cond=None, other_layouts=None):
 
         """+("""
         OR
-        (
-            otherFaceIds NOT NULL AND
+        cards.uuid IN (
+            SELECT card_faces.uuid
+            FROM card_faces
+                JOIN card_search AS cards
+                    ON cards.uuid = card_faces.other_uuid
+            WHERE
 
             """+("""
-            layout in ("""+s_other_layouts+""") AND
-            """ if other_layouts else """
-            layout in
-                ('adventure','aftermath','flip','split','transform','meld') AND
-            """)+"""
-
-            ( WITH split(word, str) AS (
-                SELECT '', otherFaceIds||','
-                UNION ALL
-                SELECT
-                substr(str, 1, instr(str, ',')-1),
-                substr(str, instr(str, ',')+1)
-                FROM split WHERE str != ''
-                ) SELECT count(*) FROM split WHERE word != '' AND
-                (
-                    SELECT count(*) FROM cards
-                    WHERE uuid = word AND
-                        (
-                            (layout != 'meld' AND side != 'a')
-                            OR
-                            (layout = 'meld' AND side != 'a' AND side != 'b')
-                            OR
-                            (side IS NULL AND layout = 'split'
-                                AND cards.faceName != facename_element(cards.name,0))
-                        ) AND (
-                            """+other_cond+"""
-                        )
-                    ) >= 1
-                ) >= 1
+            card_faces.layout in ("""+s_other_layouts+""") AND
+            """ if other_layouts else "")+"""
 
+            (
+                """+other_cond+"""
+            )
         )
         """ if other_cond else '')+"""
 
@@ -672,6 +819,247 @@ def sql_where_card_or_otherids(card_cond, other_cond=None, other_layouts=None):
     return sql
 
 
+###############
+#  query AST  #
+###############
+
+# estimated cost of evaluating a condition on a printing
+COST = {
+    "column": 1,  # comparison of a column of the printing
+    "faces": 2,  # added when the other faces are also checked
+    "fts": 3,  # lookup in the full-text index
+    "function": 3,  # SQL function on a column
+    "exists": 4,  # semi-join with another table
+    "like": 6,  # LIKE pattern
+    "udf": 8,  # python function
+}
+
+
+class Term(object):
+    """Search condition with its SQL and parameters.
+
+    :param str   sql:        WHERE condition
+    :param list  params:     parameters of `sql`
+    :param int   cost:       estimated cost (see `COST`)
+    :param tuple constraint: (column, op, value) when the condition compares
+                             a single-valued column of the printing
+    :param tuple search:     (column, op, value) searched, for search
+                             engines that do not run `sql` (None if only
+                             `sql` describes the condition)
+
+    """
+
+    def __init__(self, sql, params, cost, constraint=None, search=None):
+        self.sql = sql
+        self.params = tuple(params)
+        self.cost = cost
+        self.constraint = constraint
+        self.search = search
+
+    def key(self):
+        return ("term", self.sql, self.params)
+
+
+class Not(object):
+    """Negated condition."""
+
+    def __init__(self, child):
+        self.child = child
+        self.cost = child.cost
+
+    def key(self):
+        return ("not", self.child.key())
+
+
+class And(object):
+    """Conjunction of conditions; true without children."""
+
+    def __init__(self, children):
+        self.children = list(children)
+        self.cost = sum(child.cost for child in self.children)
+
+    def key(self):
+        return ("and",) + tuple(child.key() for child in self.children)
+
+
+class Or(object):
+    """Disjunction of conditions; false without children."""
+
+    def __init__(self, children):
+        self.children = list(children)
+        self.cost = sum(child.cost for child in self.children)
+
+    def key(self):
+        return ("or",) + tuple(child.key() for child in self.children)
+
+
+NEGATED_OPS = {
+    "=": "!=",
+    "!=": "=",
+    "<": ">=",
+    ">=": "<",
+    ">": "<=",
+    "<=": ">",
+}
+
+
+def satisfiable(constraints):
+    """Return whether a value can meet all `constraints`.
+
+    :param list constraints: (op, value) tuples
+
+    """
+    eq, ne = set(), set()
+    low = high = None  # (value, inclusive)
+    for op, value in constraints:
+        if op == "=":
+            eq.add(value)
+        elif op == "!=":
+            ne.add(value)
+        elif op in (">", ">="):
+            if low is None or value > low[0] or (
+                value == low[0] and op == ">"
+            ):
+                low = (value, op == ">=")
+        elif op in ("<", "<="):
+            if high is None or value < high[0] or (
+                value == high[0] and op == "<"
+            ):
+                high = (value, op == "<=")
+
+    if len(eq) > 1:
+        return False
+    if eq:
+        value = eq.pop()
+        return value not in ne and (
+            low is None or value > low[0] or (value == low[0] and low[1])
+        ) and (
+            high is None or value < high[0] or (value == high[0] and high[1])
+        )
+    if low is not None and high is not None:
+        if low[0] > high[0]:
+            return False
+        if low[0] == high[0]:
+            return low[1] and high[1] and low[0] not in ne
+    return True
+
+
+def contradiction(children):
+    """Return whether the conjunction of `children` is always false.
+
+    :param list children: optimized conditions
+
+    """
+    keys = set(child.key() for child in children)
+    constraints = {}
+    for child in children:
+        if isinstance(child, Not):
+            if child.child.key() in keys:
+                return True
+            term, negated = child.child, True
+        else:
+            term, negated = child, False
+        if not isinstance(term, Term) or term.constraint is None:
+            continue
+        column, op, value = term.constraint
+        if negated:
+            op = NEGATED_OPS[op]
+        constraints.setdefault(column, []).append((op, value))
+
+    return not all(satisfiable(c) for c in constraints.values())
+
+
+def optimize_tree(node):
+    """Return the condition `node` simplified, cheapest conditions first.
+
+    :param node: Term, Not, And or Or
+
+    NOT is pushed down to the terms, nested AND and OR are flattened and
+    duplicate conditions are merged. An AND that can never be true
+    becomes `Or([])`.
+
+    """
+    if isinstance(node, Term):
+        return node
+
+    if isinstance(node, Not):
+        child = node.child
+        if isinstance(child, Not):
+            return optimize_tree(child.child)
+        if isinstance(child, And):
+            return optimize_tree(Or([Not(c) for c in child.children]))
+        if isinstance(child, Or):
+            return optimize_tree(And([Not(c) for c in child.children]))
+        return node
+
+    cls = type(node)
+    children = []
+    keys = set()
+    for child in node.children:
+        child = optimize_tree(child)
+        for c in child.children if isinstance(child, cls) else [child]:
+            if c.key() not in keys:
+                keys.add(c.key())
+                children.append(c)
+
+    # the constant of the other connective decides the result
+    other = Or if cls is And else And
+    if any(isinstance(c, other) and not c.children for c in children):
+        return other([])
+    if cls is And and contradiction(children):
+        return Or([])
+
+    if len(children) == 1:
+        return children[0]
+    children.sort(key=lambda c: c.cost)
+    return cls(children)
+
+
+class Query(tuple):
+    """WHERE condition and parameters of a search, and its condition tree.
+
+    :param str   sql:    WHERE condition
+    :param tuple params: parameters of `sql`
+    :param       tree:   optimized condition (see `optimize_tree`)
+
+    """
+
+    def __new__(cls, sql, params, tree=None):
+        query = super().__new__(cls, (sql, params))
+        query.tree = tree
+        return query
+
+
+def emit_sql(node, parent=None):
+    """Return the WHERE condition and parameters of the condition `node`.
+
+    :param node:   optimized condition (see `optimize_tree`)
+    :param parent: class of the parent node
+
+    An empty condition matches all cards, `NO_CARDS` none.
+
+    """
+    if isinstance(node, Term):
+        return node.sql, node.params
+
+    if isinstance(node, Not):
+        sql, params = emit_sql(node.child, Not)
+        return "NOT {:s}".format(sql), params
+
+    if not node.children:
+        return ("" if isinstance(node, And) else NO_CARDS), ()
+
+    sqls, params = [], ()
+    for child in node.children:
+        child_sql, child_params = emit_sql(child, type(node))
+        sqls.append(child_sql)
+        params += child_params
+    sql = (" AND " if isinstance(node, And) else " OR ").join(sqls)
+    if parent is Not or (parent is And and isinstance(node, Or)):
+        sql = "( {:s} )".format(sql)
+    return sql, params
+
+
 ###############################################################################
 #                                   Parser                                    #
 ###############################################################################
@@ -681,34 +1069,70 @@ debug = False
 # debug = True
 
 
+def normalize_query(string):
+    """Return `string` with whitespace outside quotes made single spaces.
+
+    :param str string: search query
+
+    """
+    return re.sub(
+        r"""("[^"]*"|'[^']*')|\s+""",
+        lambda m: m.group(1) or " ",
+        string,
+    ).strip()
+
+
 class Parser(object):
-    """Wrapper for lex and yacc parser."""
+    """Wrapper for lex and yacc parser.
+
+    The lexer and parser are built by the first `parse`.
+
+    """
 
     def __init__(self):
-        self.lexer = _lexer()
-        self.lexer.l_keywords = []
-        self.parser = _parser()
+        self.lexer = None
+        self.parser = None
+        self._compile = functools.lru_cache(
+            maxsize=settings.QUERY_CACHE_SIZE
+        )(self.parse)
+
+    def build(self):
+        """Build the lexer and parser if not built yet."""
+        if self.parser is None:
+            self.lexer = _lexer()
+            self.parser = _parser()
 
     def parse(self, string):
+        """Return the `Query` of search `string`.
+
+        :param str string: search query
+
+        """
+        self.build()
         if debug:
             self.tokens(string)
 
         try:
-            ret = (
-                self.parser.parse(string, debug=v_debug),
-                tuple(self.lexer.l_keywords),
-            )
-        except TypeError as e:
-            pass
-            # # temporary:
-            # raise SyntaxError("parser found `None` as a terminal")
+            tree = self.parser.parse(string, lexer=self.lexer, debug=v_debug)
         except ValueError as e:
             raise SyntaxError(e)
-        finally:
-            self.lexer.l_keywords = []
-        return ret
+        tree = optimize_tree(tree)
+        return Query(*emit_sql(tree), tree)
+
+    def compile(self, string):
+        """Return `parse` of `string`, cached by its normalized form.
+
+        :param str string: search query
+
+        """
+        return self._compile(normalize_query(string))
+
+    def cache_info(self):
+        """Return the hits and misses of the `compile` cache."""
+        return self._compile.cache_info()
 
     def tokens(self, string):
+        self.build()
         print("tokens for '{:s}':".format(string))
         self.lexer.input(string)
         while True:
@@ -0,0 +1,312 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Query server on a Unix socket, and its client.
+
+`mtgcard --serve` keeps the database and parser loaded and runs the
+command line of each client as `mtgcard.main.run` would. A request is a
+JSON line `{"argv": [...]}`. The response is JSON lines: `{"started":
+true}` when the server starts the command, `{"out": STR}` and `{"err":
+STR}` as the command prints lines, and `{"status": INT}` at the end. The
+output is streamed, so a client reading only the first lines (e.g. piped
+to head) stops the command early by closing the socket.
+
+The client side only needs the standard library, so `mtgcard.main` can
+try the server before importing the rest of mtgcard.
+
+"""
+
+import os
+import sys
+import json
+import stat
+import socket
+import tempfile
+
+from mtgcard import settings
+
+
+def socket_path():
+    """Return the path of the server socket."""
+    if settings.SERVER_SOCKET:
+        return settings.SERVER_SOCKET
+    runtime_dir = os.environ.get("XDG_RUNTIME_DIR")
+    if runtime_dir:
+        return os.path.join(runtime_dir, "mtgcard-{}.sock".format(os.getuid()))
+    # a directory of the user only, not the shared temporary directory
+    return os.path.join(
+        tempfile.gettempdir(), "mtgcard-{}".format(os.getuid()), "mtgcard.sock"
+    )
+
+
+def is_private(path, mode):
+    """Return whether `path` is of type `mode` and only the user's.
+
+    :param str path: file
+    :param int mode: file type (e.g. `stat.S_IFSOCK`)
+
+    The file must be owned by the user, without permissions for group and
+    others, and its directory must be owned by the user and writable only
+    by the user, so nobody else can replace the file.
+
+    """
+    try:
+        st = os.lstat(path)
+        dir_st = os.stat(os.path.dirname(os.path.abspath(path)))
+    except OSError:
+        return False
+    uid = os.getuid()
+    return (
+        stat.S_IFMT(st.st_mode) == mode
+        and st.st_uid == uid
+        and not st.st_mode & 0o077
+        and dir_st.st_uid in (uid, 0)
+        and not dir_st.st_mode & 0o022
+    )
+
+
+def connect(path, timeout):
+    """Return a socket connected to the server, or None.
+
+    :param str   path:    socket path
+    :param float timeout: socket timeout in seconds
+
+    Only a socket of the user is connected to (see `is_private`).
+
+    """
+    if not is_private(path, stat.S_IFSOCK):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(timeout)
+    try:
+        sock.connect(path)
+    except OSError:
+        sock.close()
+        return None
+    return sock
+
+
+def read_message(f):
+    """Return the next message of the server from file `f`, or None.
+
+    :param file f: socket file
+
+    A message is a JSON line, an object of one of the keys "started"
+    (true), "out" or "err" (string), or "status" (integer). None is
+    returned at the end of the file or if the line is not a message.
+
+    """
+    line = f.readline()
+    if not line:
+        return None
+    try:
+        message = json.loads(line.decode("utf8"))
+    except ValueError:
+        return None
+    if not (isinstance(message, dict) and len(message) == 1):
+        return None
+    types = {"started": bool, "out": str, "err": str, "status": int}
+    (key, value), = message.items()
+    if key not in types or type(value) is not types[key]:
+        return None
+    return message
+
+
+def request(argv, path=None, timeout=30, out=None, err=None):
+    """Let the server run command line `argv` and return its status.
+
+    :param list  argv:    command line arguments (without program name)
+    :param str   path:    socket path (default: `socket_path()`)
+    :param float timeout: seconds to wait for the server to start the
+                          command
+    :param file  out:     output (default: sys.stdout)
+    :param file  err:     error output (default: sys.stderr)
+
+    The output of the command is written as the server sends it. Return
+    None, with nothing written, if no server is running or if it does not
+    start the command in time, so the command can run locally. A started
+    command is waited for however long it runs; if the connection is lost
+    before its status, status 1 is returned.
+
+    """
+    if not hasattr(socket, "AF_UNIX"):
+        return None
+    sock = connect(path or socket_path(), timeout)
+    if sock is None:
+        return None
+    if out is None:
+        out = sys.stdout
+    if err is None:
+        err = sys.stderr
+    with sock, sock.makefile("rb") as f:
+        try:
+            sock.sendall(json.dumps({"argv": argv}).encode("utf8") + b"\n")
+            if read_message(f) != {"started": True}:
+                return None
+            sock.settimeout(None)
+        except OSError:
+            return None
+        while True:
+            try:
+                message = read_message(f)
+            except OSError:
+                message = None
+            if message is None:
+                print("error: lost the connection to the server", file=err)
+                return 1
+            if "status" in message:
+                return message["status"]
+            if "out" in message:
+                out.write(message["out"])
+            elif "err" in message:
+                err.write(message["err"])
+
+
+def serve(path=None, verbose=False, engine=None):
+    """Answer command lines of clients until interrupted.
+
+    :param str  path:    socket path (default: `socket_path()`)
+    :param bool verbose: whether to print the requests
+    :param str  engine:  search engine of the commands without --engine
+                         (see `mtgdb.connect`)
+
+    """
+    import signal
+    import socketserver
+    import traceback
+
+    from mtgcard import main
+    from mtgcard import mtgdb
+    from mtgcard.parser import parser
+
+    path = path or socket_path()
+    directory = os.path.dirname(os.path.abspath(path))
+    if not os.path.isdir(directory):
+        os.mkdir(directory, 0o700)
+    sock = connect(path, 1)
+    if sock is not None:
+        sock.close()
+        raise OSError("server already running on '{}'".format(path))
+    if os.path.lexists(path):
+        if not is_private(path, stat.S_IFSOCK):
+            raise OSError("'{}' is not a socket of the user".format(path))
+        # left behind by a server that did not exit cleanly
+        os.remove(path)
+
+    dbs = {}
+
+    def get_db(name=None):
+        # reopen the database after an update replaced it
+        name = name or engine or settings.SEARCH_ENGINE
+        stat = os.stat(mtgdb.database_path())
+        stat = (stat.st_ino, stat.st_mtime_ns)
+        if name not in dbs or dbs[name][1] != stat:
+            dbs[name] = (mtgdb.connect(name), stat)
+        return dbs[name][0]
+
+    class Output(object):
+        """Output sending the lines written to it to the client."""
+
+        def __init__(self, send, key):
+            self.send = send
+            self.key = key
+            self.buffer = ""
+
+        def write(self, s):
+            self.buffer += s
+            end = self.buffer.rfind("\n") + 1
+            if end:
+                self.send({self.key: self.buffer[:end]})
+                self.buffer = self.buffer[end:]
+            return len(s)
+
+        def flush(self):
+            if self.buffer:
+                self.send({self.key: self.buffer})
+                self.buffer = ""
+
+    class Handler(socketserver.StreamRequestHandler):
+        def send(self, message):
+            self.wfile.write(json.dumps(message).encode("utf8") + b"\n")
+
+        def handle(self):
+            line = self.rfile.readline()
+            if not line:
+                return
+            argv = json.loads(line.decode("utf8"))["argv"]
+            if verbose:
+                print("mtgcard", " ".join(argv))
+
+            try:
+                self.run(argv)
+            except ConnectionError:
+                # the client stopped reading (e.g. its output piped to head)
+                pass
+            if verbose:
+                print("query cache: {}".format(parser.cache_info()))
+                print("statement cache: {}".format(
+                    mtgdb.cards_statement.cache_info()))
+
+        def run(self, argv):
+            self.send({"started": True})
+            out, err = Output(self.send, "out"), Output(self.send, "err")
+            try:
+                args = main.get_args(argv)
+                status = main.run(args, get_db(args.engine), out, err)
+            except SystemExit as e:
+                status = e.code if isinstance(e.code, int) else 1
+            except ImportError as e:
+                print("error:", e, file=err)
+                status = 1
+            except ConnectionError:
+                raise
+            except Exception:
+                traceback.print_exc(file=err)
+                status = 1
+            out.flush()
+            err.flush()
+            self.send({"status": status or 0})
+
+    def stop(signum, frame):
+        raise KeyboardInterrupt
+
+    signal.signal(signal.SIGINT, stop)
+    signal.signal(signal.SIGTERM, stop)
+
+    old_umask = os.umask(0o077)
+    try:
+        server = socketserver.UnixStreamServer(path, Handler)
+    finally:
+        os.umask(old_umask)
+    if not is_private(path, stat.S_IFSOCK):
+        server.server_close()
+        os.remove(path)
+        raise OSError(
+            "'{}' is not private: its directory must be the user's "
+            "only".format(path)
+        )
+
+    try:
+        get_db()
+        if verbose:
+            print("serving on '{}'".format(path))
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(path):
+            os.remove(path)
@@ -17,18 +17,25 @@
 """Update database."""
 
 import sys
-import urllib.request
 import json
 import ssl
-import shutil
 import os.path
-import zipfile
 import subprocess
 import sqlite3
 import pathlib
 
 import mtgcard.update.json2sql
+import mtgcard.update.download
 import mtgcard.update.indexes
+import mtgcard.update.search
+from mtgcard.update.jsonstream import ZipMember
+import mtgcard.mtgdb
+import mtgcard.bitmap
+
+# oldest SQLite running the statements of mtgcard: NOT MATERIALIZED common
+# table expressions (3.35), the trigram tokenizer of FTS5 (3.34), and
+# UPDATE ... FROM (3.33)
+MIN_SQLITE_VERSION = (3, 35, 0)
 
 
 def update_database(verbose=False):
@@ -42,12 +49,23 @@ def update_database(verbose=False):
     data_dir = os.path.abspath(os.path.join(this_dir, "../data"))
     zip_file = os.path.join(data_dir, "download.zip")
     json_filename = "AllPrintings.json"
-    json_file = os.path.join(data_dir, json_filename)
     sqlite_file = os.path.join(data_dir, "mtg.sqlite")
+    # built apart and renamed over `sqlite_file` once complete
+    new_sqlite_file = os.path.join(data_dir, "mtg.sqlite.new")
+    old_bitmaps_file = os.path.join(data_dir, "mtg.bitmaps")
 
     pzip_file = os.path.join(data_dir, "pdownload.zip")
     pjson_filename = "AllPrices.json"
-    pjson_file = os.path.join(data_dir, pjson_filename)
+
+    if sqlite3.sqlite_version_info < MIN_SQLITE_VERSION:
+        print(
+            "error: SQLite {} or newer is required, found {}".format(
+                ".".join(map(str, MIN_SQLITE_VERSION)),
+                sqlite3.sqlite_version,
+            ),
+            file=sys.stderr,
+        )
+        sys.exit(1)
 
     if not os.path.exists(data_dir):
         os.mkdir(data_dir)
@@ -72,68 +90,87 @@ def update_database(verbose=False):
 
     # url = "https://www.mtgjson.com/files/AllPrintings.json.zip"
     url = "https://www.mtgjson.com/api/v5/AllPrintings.json.zip"
-    req = urllib.request.Request(url)
-    req.add_header("Accept-Language", "en-US,en;q=0.5")
-    req.add_header(
-        "User-Agent",
-        "Mozilla/5.0 (X11; U; Linux i686) Gecko/20071127 Firefox/2.0.0.11",
-    )
     price_url = "https://www.mtgjson.com/api/v5/AllPrices.json.zip"
-    preq = urllib.request.Request(price_url)
-    preq.add_header("Accept-Language", "en-US,en;q=0.5")
-    preq.add_header(
-        "User-Agent",
-        "Mozilla/5.0 (X11; U; Linux i686) Gecko/20071127 Firefox/2.0.0.11",
-    )
-
-    with urllib.request.urlopen(req, context=cxt) as contents:
-        with open(zip_file, "wb") as f:
-            vprint("  downloading '{}' to '{}'...".format(url, zip_file))
-            shutil.copyfileobj(contents, f)
-            vprint("  download complete")
-
-    with urllib.request.urlopen(preq, context=cxt) as contents:
-        with open(pzip_file, "wb") as f:
-            vprint("  downloading '{}' to '{}'...".format(price_url, pzip_file))
-            shutil.copyfileobj(contents, f)
-            vprint("  download complete")
-
-    ##############################################
-    #  unzip AllPrintings.zip and AllPrices.zip  #
-    ##############################################
-
-    with zipfile.ZipFile(zip_file) as zf:
-        vprint("  extracting '{}' to '{}'...".format(zip_file, data_dir))
-        zf.extract(json_filename, path=data_dir)
-        vprint("  extraction complete")
-
-    with zipfile.ZipFile(pzip_file) as zf:
-        vprint("  extracting '{}' to '{}'...".format(pzip_file, data_dir))
-        zf.extract(pjson_filename, path=data_dir)
-        vprint("  extraction complete")
+    meta_url = "https://www.mtgjson.com/api/v5/Meta.json"
+    downloads = [(url, zip_file), (price_url, pzip_file)]
+
+    last = mtgcard.update.download.last_import(sqlite_file)
+    if last is not None:
+        try:
+            published = mtgcard.update.download.published_meta(meta_url, cxt)
+        except (OSError, ValueError) as e:
+            vprint("  could not get '{}': {}".format(meta_url, e))
+        else:
+            if published == (last["date"], last["version"]):
+                print("success -- database is up to date")
+                return
+
+    # both at once, each only if changed since the last import
+    for u, path in downloads:
+        vprint("  downloading '{}' to '{}'...".format(u, path))
+    try:
+        results = mtgcard.update.download.download_all(
+            [(u, path, last and last["downloads"].get(u))
+             for u, path in downloads],
+            context=cxt,
+        )
+        if last is not None and all(r is None for r in results):
+            print("success -- database is up to date")
+            return
+        # files unchanged are still needed to build the database
+        unchanged = [(u, path, None)
+                     for (u, path), r in zip(downloads, results) if r is None]
+        retried = iter(mtgcard.update.download.download_all(unchanged, cxt))
+        results = [r if r is not None else next(retried) for r in results]
+    except OSError as e:
+        print("error: {} (run the update again to resume)".format(e),
+              file=sys.stderr)
+        sys.exit(1)
+    vprint("  download complete")
 
     ########################
     #  convert to sqlite3  #
     ########################
 
-    if os.path.exists(sqlite_file):
-        os.remove(sqlite_file)
+    if os.path.exists(new_sqlite_file):
+        os.remove(new_sqlite_file)
     vprint("  generating database file...")
 
-    infile = pathlib.Path(json_file)
-    outfile = {"path": pathlib.Path(sqlite_file), "handle": None}
+    # read from the archives as they are decompressed, not extracted
+    infile = ZipMember(zip_file, json_filename)
+    extras = {pjson_filename: ZipMember(pzip_file, pjson_filename)}
+    outfile = {"path": pathlib.Path(new_sqlite_file), "handle": None}
     try:
         result = mtgcard.update.json2sql.execute(infile, outfile,
-                check_extras=True)
-    except Exception:
-        vprint("error creating database file")
-        sys.exit(1)
-    else:
+                check_extras=True, extras=extras)
+        for table, (count, seconds) in sorted(result.items()):
+            vprint("    {}: {:d} rows in {:.2f}s".format(
+                table, count, seconds))
         vprint("  database file complete")
 
-    with sqlite3.connect(sqlite_file) as conn:
-        cursor = conn.cursor()
-        cursor.executescript(mtgcard.update.indexes.indexes)
+        conn = sqlite3.connect(new_sqlite_file)
+        try:
+            build_database(
+                conn,
+                {u: r for (u, path), r in zip(downloads, results)},
+                vprint,
+            )
+        finally:
+            conn.close()
+
+        # readers see the old database or the new one, never a partial one
+        os.replace(new_sqlite_file, sqlite_file)
+        # bitmaps of mtgcard versions that wrote them next to the database
+        if os.path.exists(old_bitmaps_file):
+            os.remove(old_bitmaps_file)
+    except BaseException as e:
+        # no partial database is left behind, even when interrupted
+        if os.path.exists(new_sqlite_file):
+            os.remove(new_sqlite_file)
+        if not isinstance(e, Exception):
+            raise
+        print("error creating database file: {}".format(e), file=sys.stderr)
+        sys.exit(1)
 
     if verbose:
         print("success -- update of '{}' complete".format(sqlite_file))
@@ -145,6 +182,35 @@ def update_database(verbose=False):
     ##############
 
     os.remove(zip_file)
-    os.remove(json_file)
     os.remove(pzip_file)
-    os.remove(pjson_file)
+
+
+def build_database(conn, downloads, vprint):
+    """Build the search tables and indexes of a database from json2sql.
+
+    :param sqlite3.Connection conn:      connection to the database
+    :param dict               downloads: validators of the files by url
+    :param function           vprint:    print function of the update
+
+    """
+    conn.create_function(
+        "name_key", 1, mtgcard.mtgdb.name_key, deterministic=True
+    )
+    cursor = conn.cursor()
+    cursor.executescript(mtgcard.update.indexes.bulk_load)
+    vprint("  building search tables...")
+    cursor.executescript(mtgcard.update.search.search)
+    mtgcard.update.search.insert_card_mana(cursor)
+    mtgcard.update.download.record_downloads(cursor, downloads)
+
+    # indexed once loaded, faster than updating the indexes by row
+    vprint("  building indexes...")
+    cursor.executescript(mtgcard.update.indexes.indexes)
+
+    # in the database, so replaced with it
+    vprint("  building bitmap indexes...")
+    mtgcard.bitmap.write_bitmaps(cursor)
+
+    # the database is opened read-only, so ship it in rollback journal mode
+    vprint("  optimizing database file...")
+    cursor.executescript(mtgcard.update.indexes.optimize)
@@ -0,0 +1,246 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Downloads of the update.
+
+A file is downloaded to PATH.part, renamed to PATH once complete. The
+validators of the response (ETag and Last-Modified) are kept in
+PATH.part.json, so that an interrupted download is resumed with a Range
+request if the file did not change since (If-Range).
+
+Given the validators of the last download of a file, a download is
+conditional (If-None-Match, If-Modified-Since) and skipped if the file
+did not change. The validators of the files imported are recorded in
+the `downloads` table of the database (see `record_downloads`), next to
+the MTGJSON version in its `meta` table.
+
+"""
+
+import os
+import json
+import shutil
+import pathlib
+import sqlite3
+import http.client
+import urllib.error
+import urllib.request
+import concurrent.futures
+
+
+HEADERS = {
+    "Accept-Language": "en-US,en;q=0.5",
+    "User-Agent":
+        "Mozilla/5.0 (X11; U; Linux i686) Gecko/20071127 Firefox/2.0.0.11",
+}
+
+# bytes written at a time
+BLOCK_SIZE = 1 << 16
+
+
+def request(url, headers=None):
+    """Return the request of `url` with the headers of mtgcard.
+
+    :param str  url:     url requested
+    :param dict headers: other headers
+
+    """
+    req = urllib.request.Request(url)
+    for name, value in dict(HEADERS, **(headers or {})).items():
+        req.add_header(name, value)
+    return req
+
+
+def read_json(path):
+    """Return the JSON value of file `path`, or None if unreadable."""
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def download(url, path, validators=None, context=None):
+    """Download `url` to file `path` and return the validators of the file.
+
+    :param str            url:        url of the file
+    :param str            path:       file downloaded to
+    :param dict           validators: "etag" and "last_modified" of the
+                                      last download of the file
+    :param ssl.SSLContext context:    context of https requests
+
+    The validators are returned as a dict like `validators`, or None if
+    the file did not change since `validators` (nothing is downloaded).
+    Raise OSError if the download fails; it is resumed by the next
+    download of the file.
+
+    """
+    part = path + ".part"
+    part_info = part + ".json"
+
+    headers = {}
+    size = 0
+    partial = read_json(part_info) if os.path.exists(part) else None
+    if partial and (partial.get("etag") or partial.get("last_modified")):
+        size = os.path.getsize(part)
+        headers["Range"] = "bytes={:d}-".format(size)
+        headers["If-Range"] = partial.get("etag") or partial["last_modified"]
+    elif validators:
+        if validators.get("etag"):
+            headers["If-None-Match"] = validators["etag"]
+        if validators.get("last_modified"):
+            headers["If-Modified-Since"] = validators["last_modified"]
+
+    try:
+        response = urllib.request.urlopen(
+            request(url, headers), context=context
+        )
+    except urllib.error.HTTPError as e:
+        if e.code == 304:
+            return None
+        if e.code == 416 and size:
+            # the part is not of the file: download it again
+            os.remove(part)
+            return download(url, path, validators, context)
+        raise
+
+    with response:
+        info = {
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+        }
+        if response.status == 206:
+            mode = "ab"
+        else:
+            # the file changed, or the server does not resume downloads
+            mode = "wb"
+            size = 0
+            with open(part_info, "w") as f:
+                json.dump(info, f)
+        length = response.headers.get("Content-Length")
+        with open(part, mode) as f:
+            try:
+                shutil.copyfileobj(response, f, BLOCK_SIZE)
+            except http.client.HTTPException as e:
+                raise OSError(
+                    "download of '{}' interrupted: {!r}".format(url, e)
+                )
+            received = f.tell()
+
+    if length is not None and received != size + int(length):
+        raise OSError(
+            "download of '{}' incomplete: {:d} of {:d} bytes".format(
+                url, received, size + int(length)
+            )
+        )
+    os.replace(part, path)
+    os.remove(part_info)
+    return info
+
+
+def download_all(downloads, context=None):
+    """Download files concurrently and return their validators.
+
+    :param list           downloads: (url, path, validators) of the files,
+                                     as the arguments of `download`
+    :param ssl.SSLContext context:   context of https requests
+
+    The results of `download` are returned in the order of `downloads`.
+    Raise the error of the first download that fails, once all are done.
+
+    """
+    if not downloads:
+        return []
+    with concurrent.futures.ThreadPoolExecutor(len(downloads)) as executor:
+        futures = [
+            executor.submit(download, url, path, validators, context)
+            for url, path, validators in downloads
+        ]
+    return [future.result() for future in futures]
+
+
+def published_meta(url, context=None):
+    """Return the (date, version) of the MTGJSON files published.
+
+    :param str            url:     url of the MTGJSON Meta.json
+    :param ssl.SSLContext context: context of https requests
+
+    """
+    with urllib.request.urlopen(request(url), context=context) as response:
+        meta = json.loads(response.read().decode("utf8"))
+    data = meta.get("data") or meta.get("meta") or {}
+    return data.get("date"), data.get("version")
+
+
+def last_import(path):
+    """Return the MTGJSON meta and downloads of the database at `path`.
+
+    :param str path: database file
+
+    The result is a dict of "date" and "version" of the MTGJSON files
+    imported, and of "downloads", the validators of the files downloaded
+    by url (see `download`). None is returned without a database.
+
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        uri = pathlib.Path(path).resolve().as_uri() + "?mode=ro"
+        conn = sqlite3.connect(uri, uri=True)
+    except sqlite3.Error:
+        return None
+    try:
+        row = conn.execute("SELECT date, version FROM meta").fetchone()
+        if row is None:
+            return None
+        downloads = {}
+        if conn.execute('''
+            SELECT 1 FROM sqlite_master
+            WHERE type = 'table' AND name = 'downloads'
+        ''').fetchone():
+            for url, etag, last_modified in conn.execute(
+                "SELECT url, etag, last_modified FROM downloads"
+            ):
+                downloads[url] = {
+                    "etag": etag, "last_modified": last_modified
+                }
+    except sqlite3.Error:
+        return None
+    finally:
+        conn.close()
+    return {"date": row[0], "version": row[1], "downloads": downloads}
+
+
+def record_downloads(cursor, downloads):
+    """Record the validators of the files imported in the database.
+
+    :param sqlite3.Cursor cursor:    cursor of the database
+    :param dict           downloads: validators of the files by url
+
+    """
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS downloads (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT
+        )
+    ''')
+    cursor.executemany(
+        "INSERT OR REPLACE INTO downloads VALUES (?, ?, ?)",
+        [
+            (url, v.get("etag"), v.get("last_modified"))
+            for url, v in downloads.items()
+        ],
+    )
@@ -14,6 +14,19 @@
 # You should have received a copy of the GNU General Public License
 # along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
 
+# a new database is built in a file of its own that nothing else reads,
+# so it is not synced, and failing batches of inserts are rolled back in
+# memory (see `json2sql.flush_inserts`)
+bulk_load = '''
+
+PRAGMA synchronous=OFF;
+PRAGMA journal_mode=MEMORY;
+PRAGMA cache_size=-262144;
+PRAGMA temp_store=MEMORY;
+PRAGMA locking_mode=EXCLUSIVE;
+
+'''.strip()
+
 indexes = '''
 
 create index cards_idx on cards(availability,name,printings,setCode,convertedManaCost,manaCost,power,toughness,loyalty,types,type,rarity,text,layout);
@@ -21,5 +34,27 @@ create index icard on cards(availability,name,setCode);
 create index iprice on prices(uuid,price);
 create index ilegal on legalities(uuid,format,status);
 create index isets on sets(code, type desc, releaseDate desc);
+create index isearch_listed on card_search(listed, v_name);
+create index isearch_uuid on card_search(uuid);
+create index isearch_name on card_search(v_name, setCode);
+create index icard_key on cards(name_key, setCode);
+create index itoken_key on tokens(name_key, setCode);
+create index isearch_key on card_search(name_key, setCode);
+create index isearch_rank on card_search(name_key, set_rank);
+create index isearch_cmc on card_search(cmc_key, v_name);
+create index isearch_price on card_search(price_key, v_name);
+create index isets_rank on sets(set_rank);
+create index imana_cmc on card_mana(cmc);
+create index iface_uuid on card_faces(uuid);
+create index iface_other on card_faces(other_uuid, layout);
+
+'''.strip()
+
+optimize = '''
+
+ANALYZE;
+PRAGMA journal_mode=DELETE;
+PRAGMA synchronous=FULL;
+VACUUM;
 
 '''.strip()
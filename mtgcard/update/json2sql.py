@@ -33,31 +33,70 @@ import logging
 import pathlib
 import sqlite3
 import time
-from typing import Any, Dict, List, Union
+from typing import Any, Dict, Iterator, List, Tuple, Union
+
+import mtgcard.update.indexes
+from mtgcard.update.jsonstream import Reader, iter_members
 
 LOGGER = logging.getLogger(__name__)
 JsonDict = Dict[str, any]
 
+# rows of a table inserted at a time into SQLite (see `sql_dict_insert`)
+BATCH_SIZE = 10000
+
 
-def execute(json_input, output_file, check_extras=False) -> None:
+def execute(json_input, output_file, check_extras=False, extras=None) -> Dict:
     """Main function to handle the logic
 
-    :param json_input: Input file (JSON)
+    :param json_input: Input file (JSON), a path or a `ZipMember`
     :param output_file: Output dir
-    :param extras: additional json files to process
+    :param check_extras: whether to process additional json files
+    :param extras: Paths of additional json files by name (default: next
+        to `json_input`)
+    :return: Rows inserted and seconds spent by table (see `flush_inserts`)
     """
     if not valid_input_output(json_input, output_file):
         exit(1)
-    check_extra_inputs(json_input, output_file, check_extras)
+    check_extra_inputs(json_input, output_file, check_extras, extras)
 
-    LOGGER.info("Loading json file into memory")
-    with json_input.open("r", encoding="utf8") as json_file:
-        json_data = json.load(json_file)
+    # this function has been modified for mtgcard: the sets are read one at
+    # a time, once for the schema and once for the rows (see `read_sets`)
+    json_data = {}
+    schema = build_sql_schema(read_sets(json_input, json_data), json_data,
+                              output_file)
     build_sql_database(output_file, json_data)
-    build_sql_schema(json_data, output_file)
-    parse_and_import_cards(json_data, json_input, output_file)
+    write_sql_schema(schema, output_file)
+    parse_and_import_cards(
+        read_sets(json_input, {}), json_data, json_input, output_file
+    )
     parse_and_import_extras(json_input, output_file)
-    commit_changes_and_close_db(output_file)
+    return commit_changes_and_close_db(output_file)
+
+
+def read_sets(
+    json_input: pathlib.Path, json_data: JsonDict
+) -> Iterator[Tuple[str, JsonDict]]:
+    """Yield the sets of an AllPrintings file one at a time
+
+    Other members of the document (e.g. "meta") are stored in `json_data`
+    as they are read.
+
+    :param json_input: Input file (JSON)
+    :param json_data: Dict of the other top-level members
+    """
+    with json_input.open("r", encoding="utf8") as json_file:
+        reader = Reader(json_file)
+        for key in reader.keys():
+            if key == "data":
+                for set_code in reader.keys():
+                    yield set_code, reader.value()
+                continue
+            value = reader.value()
+            if isinstance(value, dict) and "cards" in value:
+                # MTGJSON v4: sets are top-level members
+                yield key, value
+            else:
+                json_data[key] = value
 
 
 def valid_input_output(input_file: pathlib.Path,
@@ -84,10 +123,13 @@ def valid_input_output(input_file: pathlib.Path,
 
 
 def check_extra_inputs(input_file: pathlib.Path,
-                       output_dir: Dict, check_extras=False) -> None:
+                       output_dir: Dict, check_extras=False,
+                       extra_paths: Dict = None) -> None:
     """
     Check if there are more json files to convert to sql
     """
+    # this function has been modified for mtgcard: the path of each extra
+    # found is stored, and may be given (e.g. a `ZipMember`)
     extras = ["AllPrices.json", "AllDeckFiles",
               "Keywords.json", "CardTypes.json"]
 
@@ -97,12 +139,15 @@ def check_extra_inputs(input_file: pathlib.Path,
     if not check_extras:
         return 
     for extra in extras:
-        if input_file.parent.joinpath(extra).is_file() or input_file.parent.joinpath(extra).is_dir():
+        path = (extra_paths or {}).get(extra, input_file.parent.joinpath(extra))
+        if path.is_file() or path.is_dir():
             LOGGER.info("Building with " + extra + " supplement")
-            output_dir[extra] = True
+            output_dir[extra] = path
 
 
 def build_sql_database(output_file: str, json_data: JsonDict) -> None:
+    # this function has been modified for mtgcard: sqlite databases are
+    # bulk loaded (see `mtgcard.update.indexes.bulk_load`)
     if output_file["path"].suffix == ".sql":
         version = get_version(json_data)
         output_file["handle"] = open(output_file["path"], "w", encoding="utf8")
@@ -123,38 +168,50 @@ def build_sql_database(output_file: str, json_data: JsonDict) -> None:
         )
     else:
         output_file["handle"] = sqlite3.connect(str(output_file["path"]))
-        output_file["handle"].execute("pragma journal_mode=wal;")
+        output_file["handle"].executescript(mtgcard.update.indexes.bulk_load)
+        output_file["columns"] = {}
+        output_file["batches"] = {}
+        output_file["timings"] = {}
 
 
-def get_version(json_data: Dict) -> str:
+def get_version(json_data: Dict, sets: Iterator = ()) -> str:
     if "meta" in json_data:
         if "version" in json_data["meta"]:
             return json_data["meta"]["version"]
     else:
-        for set_code, set_data in json_data.items():
+        for set_code, set_data in sets:
             if "meta" in set_data:
                 if "version" in set_data["meta"]:
                     return set_data["meta"]["version"]
     return "Unknown"
 
 
-def build_sql_schema(json_data: Dict, output_file: Dict) -> None:
+def build_sql_schema(sets: Iterator, json_data: Dict,
+                     output_file: Dict) -> str:
     """
-    Create the SQLite DB schema
+    Return the SQLite DB schema of the sets
     """
     LOGGER.info("Building SQLite schema")
     if output_file["path"].suffix == ".sql":
-        schema = generate_sql_schema(json_data, output_file, "mysql")
+        return generate_sql_schema(sets, json_data, output_file, "mysql")
+    else:
+        return generate_sql_schema(sets, json_data, output_file, "sqlite")
+
+
+def write_sql_schema(schema: str, output_file: Dict) -> None:
+    """
+    Create the SQLite DB schema
+    """
+    if output_file["path"].suffix == ".sql":
         output_file["handle"].write(schema)
         output_file["handle"].write("COMMIT;\n\n")
     else:
-        schema = generate_sql_schema(json_data, output_file, "sqlite")
         cursor = output_file["handle"].cursor()
         cursor.executescript(schema)
         output_file["handle"].commit()
 
 
-def generate_sql_schema(json_data: Dict,
+def generate_sql_schema(sets: Iterator, json_data: Dict,
                         output_file: Dict, engine: str) -> str:
     """
     Generate the SQL database schema from the JSON input
@@ -163,11 +220,12 @@ def generate_sql_schema(json_data: Dict,
     specifying what columns and data types should be in the SQL tables,
     then uses that object to output an actual SQL query string to make
     the table.
-    :param json_data: JSON dictionary
+    :param sets: (set code, set data) pairs (see `read_sets`)
+    :param json_data: JSON dictionary of the other top-level members
     :param engine: target SQL engine
     """
     
-    version = get_version(json_data)
+    set_meta = []
     schema = {
         "sets": {},
         "cards": {},
@@ -208,12 +266,12 @@ def generate_sql_schema(json_data: Dict,
                   "rarity"],
         "tokens": ["borderColor", "layout"],
     }
-    if "data" in json_data:
-        json_data = json_data["data"]
     # To understand the following code you may need to open
     # https://www.mtgjson.com/files/AllPrintings.json
     # to see the json structure
-    for setCode, setData in json_data.items():
+    for setCode, setData in sets:
+        if "meta" in setData and not set_meta:
+            set_meta = [(setCode, {"meta": setData["meta"]})]
         # loop through the set properties
         for setKey, setValue in setData.items():
             if setKey == "translations":
@@ -358,6 +416,7 @@ def generate_sql_schema(json_data: Dict,
                             )
 
     # add extra tables manually if necessary
+    version = get_version(json_data, set_meta)
     if version.startswith("5"):
         schema["meta"] = {
             "date": {"type": "DATE"},
@@ -443,19 +502,21 @@ def get_query_from_dict(schema, engine):
 
 
 def parse_and_import_cards(
-    json_data: Dict, input_file: pathlib.Path, output_file: Dict
+    sets: Iterator, json_data: Dict, input_file: pathlib.Path,
+    output_file: Dict
 ) -> None:
     """
     Parse the JSON cards and input them into the database
 
+    :param sets: (set code, set data) pairs (see `read_sets`)
+    :param json_data: JSON dictionary of the other top-level members
     :param input_file: AllPrintings.json file
     :param output_file: Output info dictionary
     """
     LOGGER.info("Building sets")
-    if "data" in json_data:
+    if "meta" in json_data:
         sql_dict_insert(json_data["meta"], "meta", output_file)
-        json_data = json_data["data"]
-    for set_code, set_data in json_data.items():
+    for set_code, set_data in sets:
         LOGGER.info(f"Inserting set row for {set_code}")
         set_insert_values = handle_set_row_insertion(set_data)
         sql_dict_insert(set_insert_values, "sets", output_file)
@@ -623,44 +684,18 @@ def parse_and_import_extras(input_file: pathlib.Path, output_file: Dict) -> None
     :param input_file: AllPrintings.json file
     :param output_file: Output info dictionary
     """
-    # this function has been modified for mtgcard (2022-05-27)
-    card_type = "paper"
-    price_source = "cardkingdom"
-    price_type = "retail"
-    card_subtype = "normal"
     if output_file["AllPrices.json"]:
         LOGGER.info("Inserting AllPrices rows")
-        with input_file.parent.joinpath("AllPrices.json").open(
+        with output_file["AllPrices.json"].open(
             "r", encoding="utf8"
         ) as f:
-            json_data = json.load(f)
-        for card_uuid, price_data in json_data['data'].items():
-            if card_type in price_data.keys():
-                price_sources = price_data[card_type]
-                if price_source in price_sources.keys():
-                    price_types = price_sources[price_source]
-                    if price_type in price_types.keys():
-                        card_subtypes = price_types[price_type]
-                        if card_subtype in card_subtypes.keys():
-                            card_dates = card_subtypes[card_subtype]
-                            if len(card_dates) > 0:
-                                price_date = list(card_dates.keys())[-1]
-                                price_value = card_dates[price_date]
-                                if price_value:
-                                    sql_dict_insert(
-                                        {
-                                            "uuid": card_uuid,
-                                            "type": card_type,
-                                            "date": price_date,
-                                            "price": float(price_value),
-                                        },
-                                        "prices",
-                                        output_file,
-                                    )
+            # streamed, like AllPrintings.json (see `read_sets`)
+            for card_uuid, price_data in iter_members(f, "data"):
+                insert_card_price(card_uuid, price_data, output_file)
 
     if output_file["AllDeckFiles"]:
         LOGGER.info("Inserting Deck rows")
-        for deck_file in input_file.parent.joinpath("AllDeckFiles").glob("*.json"):
+        for deck_file in output_file["AllDeckFiles"].glob("*.json"):
             with deck_file.open("r", encoding="utf8") as f:
                 json_data = json.load(f)
             deck_data = {}
@@ -681,7 +716,7 @@ def parse_and_import_extras(input_file: pathlib.Path, output_file: Dict) -> None
 
     if output_file["Keywords.json"]:
         LOGGER.info("Inserting Keyword rows")
-        with input_file.parent.joinpath("Keywords.json").open(
+        with output_file["Keywords.json"].open(
             "r", encoding="utf8"
         ) as f:
             json_data = json.load(f)
@@ -695,7 +730,7 @@ def parse_and_import_extras(input_file: pathlib.Path, output_file: Dict) -> None
 
     if output_file["CardTypes.json"]:
         LOGGER.info("Inserting Card Type rows")
-        with input_file.parent.joinpath("CardTypes.json").open(
+        with output_file["CardTypes.json"].open(
             "r", encoding="utf8"
         ) as f:
             json_data = json.load(f)
@@ -717,6 +752,45 @@ def parse_and_import_extras(input_file: pathlib.Path, output_file: Dict) -> None
             )
 
 
+def insert_card_price(
+    card_uuid: str, price_data: JsonDict, output_file: Dict
+) -> None:
+    """
+    Insert the latest retail paper price of a card from AllPrices
+
+    :param card_uuid: UUID of the card
+    :param price_data: Prices of the card
+    :param output_file: Output info dictionary
+    """
+    # this function has been modified for mtgcard (2022-05-27)
+    card_type = "paper"
+    price_source = "cardkingdom"
+    price_type = "retail"
+    card_subtype = "normal"
+    if card_type in price_data.keys():
+        price_sources = price_data[card_type]
+        if price_source in price_sources.keys():
+            price_types = price_sources[price_source]
+            if price_type in price_types.keys():
+                card_subtypes = price_types[price_type]
+                if card_subtype in card_subtypes.keys():
+                    card_dates = card_subtypes[card_subtype]
+                    if len(card_dates) > 0:
+                        price_date = list(card_dates.keys())[-1]
+                        price_value = card_dates[price_date]
+                        if price_value:
+                            sql_dict_insert(
+                                {
+                                    "uuid": card_uuid,
+                                    "type": card_type,
+                                    "date": price_date,
+                                    "price": float(price_value),
+                                },
+                                "prices",
+                                output_file,
+                            )
+
+
 def handle_foreign_rows(
     card_data: JsonDict, card_uuid: str
 ) -> List[JsonDict]:
@@ -857,6 +931,9 @@ def sql_dict_insert(data: JsonDict, table: str, output_file: Dict) -> None:
     """
     Insert a dictionary into a sqlite table
 
+    Rows of SQLite tables are buffered, in order, by table and inserted
+    `BATCH_SIZE` at a time (see `flush_inserts`).
+
     :param data: Dict to insert
     :param table: Table to insert to
     :param output_file: Output info dictionary
@@ -876,19 +953,95 @@ def sql_dict_insert(data: JsonDict, table: str, output_file: Dict) -> None:
             query = query.format(**data)
             output_file["handle"].write(query)
         else:
-            cursor = output_file["handle"].cursor()
-            columns = ", ".join(data.keys())
-            placeholders = ":" + ", :".join(data.keys())
-            query = f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"
-            cursor.execute(query, data)
+            columns = table_columns(table, output_file)
+            unknown = data.keys() - columns.keys()
+            if unknown:
+                raise KeyError(f"no such columns: {', '.join(unknown)}")
+            rows = output_file["batches"].setdefault(table, [])
+            rows.append(
+                tuple(data.get(c, default) for c, default in columns.items())
+            )
+            if len(rows) >= BATCH_SIZE:
+                flush_inserts(output_file, table)
     except:
         datastr = str(data)
         LOGGER.warning(f"Failed to insert row in '{table}' with values: {datastr}")
 
 
-def commit_changes_and_close_db(output_file: Dict) -> None:
+def table_columns(table: str, output_file: Dict) -> Dict[str, Any]:
+    """
+    Get the columns of a sqlite table and their default values
+
+    Rows are inserted with every column of their table, missing values
+    taking the default value of the column, so that rows of different
+    columns are inserted in order with one statement.
+
+    :param table: Table of the columns
+    :param output_file: Output info dictionary
+    :return: Default value by column name
+    """
+    if table not in output_file["columns"]:
+        cursor = output_file["handle"].cursor()
+        columns = {}
+        info = cursor.execute(f"PRAGMA table_info({table})").fetchall()
+        for _, name, _, _, default, _ in info:
+            if default is not None:
+                default = cursor.execute(f"SELECT {default}").fetchone()[0]
+            columns[name] = default
+        output_file["columns"][table] = columns
+    return output_file["columns"][table]
+
+
+def flush_inserts(output_file: Dict, table: str = None) -> None:
+    """
+    Insert the buffered rows of a table, or of all
+
+    Each batch is inserted with one prepared statement. If a row of the
+    batch fails, the batch is rolled back and its rows are inserted one by
+    one, so only the failing rows are skipped. Rows inserted and seconds
+    spent are counted by table in `output_file["timings"]`.
+
+    :param output_file: Output info dictionary
+    :param table: Table of the rows (default: all)
+    """
+    tables = [table] if table is not None else list(output_file["batches"])
+    for table in tables:
+        rows = output_file["batches"].pop(table, [])
+        if not rows:
+            continue
+        start = time.perf_counter()
+        columns = list(output_file["columns"][table])
+        query = "INSERT INTO {} ({}) VALUES ({})".format(
+            table, ", ".join(columns), ", ".join("?" * len(columns))
+        )
+        cursor = output_file["handle"].cursor()
+        cursor.execute("SAVEPOINT batch")
+        try:
+            cursor.executemany(query, rows)
+        except sqlite3.Error:
+            cursor.execute("ROLLBACK TO batch")
+            for row in rows:
+                try:
+                    cursor.execute(query, row)
+                except sqlite3.Error:
+                    datastr = str(dict(zip(columns, row)))
+                    LOGGER.warning(f"Failed to insert row in '{table}' with values: {datastr}")
+        cursor.execute("RELEASE batch")
+        count, seconds = output_file["timings"].get(table, (0, 0.0))
+        output_file["timings"][table] = (
+            count + len(rows), seconds + time.perf_counter() - start
+        )
+
+
+def commit_changes_and_close_db(output_file: Dict) -> Dict:
+    timings = {}
     if output_file["path"].suffix == ".sql":
         output_file["handle"].write("COMMIT;")
     else:
+        flush_inserts(output_file)
         output_file["handle"].commit()
+        timings = output_file["timings"]
+        for table, (count, seconds) in sorted(timings.items()):
+            LOGGER.info(f"Inserted {count} rows in '{table}' in {seconds:.2f}s")
     output_file["handle"].close()
+    return timings
@@ -0,0 +1,215 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Incremental reading of large JSON files.
+
+`Reader` walks the members of JSON objects in a file without decoding
+them, and decodes only the values asked for, so the MTGJSON files can be
+imported one set (or one card's prices) at a time:
+
+    reader = Reader(f)
+    for key in reader.keys():
+        if key == "data":
+            for code in reader.keys():
+                set_data = reader.value()
+        else:
+            reader.value()
+
+Only the value being decoded is buffered, so memory is bounded by the
+largest value read rather than by the file. With `ZipMember`, the files
+are read from their downloaded archives, decompressed as they are read.
+
+"""
+
+import io
+import re
+import json
+import pathlib
+import zipfile
+
+
+# characters read at a time, more while a value does not fit
+CHUNK_SIZE = 1 << 20
+
+r_whitespace = re.compile(r"[ \t\n\r]*")
+
+
+class Reader:
+    """Reader of the JSON document of a text file."""
+
+    def __init__(self, f, chunk_size=CHUNK_SIZE):
+        """Initialize the reader of file `f`.
+
+        :param file f:          text file
+        :param int  chunk_size: characters read at a time
+
+        """
+        self.f = f
+        self.chunk_size = chunk_size
+        self.buffer = ""
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self, size):
+        """Append at least `size` characters of the file to the buffer.
+
+        Return False at the end of the file. Characters before the current
+        position are dropped.
+
+        """
+        if self.eof:
+            return False
+        chunk = self.f.read(max(size, self.chunk_size))
+        if not chunk:
+            self.eof = True
+            return False
+        # drop what was read
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def skip_whitespace(self):
+        """Move to the next character that is not whitespace."""
+        while True:
+            self.pos = r_whitespace.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer) or not self.fill(0):
+                return
+
+    def next_char(self, expected):
+        """Read the next character, one of `expected`, and return it.
+
+        :param str expected: characters expected
+
+        """
+        self.skip_whitespace()
+        if self.pos >= len(self.buffer):
+            raise ValueError("unexpected end of JSON document")
+        c = self.buffer[self.pos]
+        if c not in expected:
+            raise ValueError(
+                "expected {!r} at character {:d} of buffer, got {!r}".format(
+                    expected, self.pos, c
+                )
+            )
+        self.pos += 1
+        return c
+
+    def value(self):
+        """Decode and return the JSON value at the current position."""
+        self.skip_whitespace()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                # incomplete: read as much again
+                if not self.fill(len(self.buffer) - self.pos):
+                    raise
+                continue
+            # a number may continue in the next chunk
+            if end == len(self.buffer) and self.fill(0):
+                continue
+            self.pos = end
+            return value
+
+    def keys(self):
+        """Yield the keys of the JSON object at the current position.
+
+        The value of each key must be read, with `value` or `keys`, before
+        the next key is asked for.
+
+        """
+        self.next_char("{")
+        self.skip_whitespace()
+        if self.buffer.startswith("}", self.pos):
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            if not isinstance(key, str):
+                raise ValueError("expected a key, got {!r}".format(key))
+            self.next_char(":")
+            yield key
+            if self.next_char(",}") == "}":
+                return
+
+
+def iter_members(f, key):
+    """Yield the members (key, value) of the object of top-level `key`.
+
+    :param file f:   text file of a JSON object
+    :param str  key: key of the object in the document
+
+    Other top-level members are decoded and discarded.
+
+    """
+    reader = Reader(f)
+    for k in reader.keys():
+        if k != key:
+            reader.value()
+            continue
+        for member in reader.keys():
+            yield member, reader.value()
+
+
+class ZipMember:
+    """File of a zip archive, read without extracting it.
+
+    Stands for the file extracted next to the archive, with the methods of
+    `pathlib.Path` used to read it.
+
+    """
+
+    def __init__(self, path, name):
+        """Initialize the file `name` of archive `path`.
+
+        :param str path: zip archive
+        :param str name: name of the file in the archive
+
+        """
+        self.path = pathlib.Path(path)
+        self.name = name
+        self.parent = self.path.parent
+
+    def __str__(self):
+        return "{}:{}".format(self.path, self.name)
+
+    def is_file(self):
+        """Return whether the archive has the file."""
+        try:
+            with zipfile.ZipFile(str(self.path)) as zf:
+                zf.getinfo(self.name)
+        except (OSError, KeyError, zipfile.BadZipFile):
+            return False
+        return True
+
+    def is_dir(self):
+        """Return False, archives are read by file."""
+        return False
+
+    def open(self, mode="r", encoding=None):
+        """Open the file for reading, decompressed as it is read.
+
+        :param str mode:     "r" or "rb"
+        :param str encoding: encoding of the text
+
+        """
+        # the member keeps the archive file open until it is closed
+        with zipfile.ZipFile(str(self.path)) as zf:
+            f = zf.open(self.name)
+        if "b" in mode:
+            return f
+        return io.TextIOWrapper(f, encoding=encoding)
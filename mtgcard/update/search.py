@@ -0,0 +1,303 @@
+# mtgcard - Command-line MTG card viewer and searcher.
+# Copyright (C) 2020  yoshi1@tutanota.com
+#
+# mtgcard is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# mtgcard is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with mtgcard.  If not, see <https://www.gnu.org/licenses/>.
+
+"""Precomputed search tables.
+
+`cards` and `tokens` get a `name_key` column, the case-folded face name
+computed by the `name_key` function that must be registered on the
+connection running the `search` script.
+
+`sets` gets a `set_rank` column, the position of the set when ordered as
+by the `main_sets_first` collation (expansions and core sets first, then
+newest first); the default printing of a card is the one with the lowest
+rank, listed per `name_key` in `preferred_printing`.
+
+`card_search` holds one row per paper card face with the columns that
+`mtgdb.Interface` used to derive on every query (`v_name`, `v_names`,
+`colors_sp`) and the color masks compared by color searches. `listed`
+marks the faces that are shown in listings. `cmc_key` and `price_key`
+are the cmc and paper price that listings are sorted by, -1 when NULL.
+Rows are numbered by set rank, so the listed printing of a name is the
+matching one with the lowest id.
+
+`card_faces` links each face in `card_search` to the other faces of the
+card that searches check, with the side of the other face and the layout
+of the card.
+
+`card_fts` is a full-text index with the trigram tokenizer over the face
+name and text of each listed face, and the names and texts of its other
+faces, for substring searches by `MATCH`.
+
+`card_mana` holds the mana symbol counts of each face in `card_search`;
+it is filled by `insert_card_mana` after the `search` script has run.
+
+"""
+
+from mtgcard.common import MANA_COLUMNS, manacost_counts, manacost_to_cmc
+
+
+search = '''
+
+ALTER TABLE cards ADD COLUMN name_key TEXT;
+UPDATE cards SET name_key = name_key(
+    CASE WHEN faceName IS NULL THEN name ELSE faceName END
+);
+
+ALTER TABLE tokens ADD COLUMN name_key TEXT;
+UPDATE tokens SET name_key = name_key(
+    CASE WHEN faceName IS NULL THEN name ELSE faceName END
+);
+
+ALTER TABLE sets ADD COLUMN set_rank INTEGER;
+WITH ranked AS (
+    SELECT code, row_number() OVER (
+        ORDER BY
+            type IN ('expansion', 'core') DESC,
+            CASE WHEN type IN ('expansion', 'core') THEN '' ELSE type END DESC,
+            releaseDate DESC,
+            code
+    ) AS set_rank
+    FROM sets
+)
+UPDATE sets SET set_rank = (
+    SELECT ranked.set_rank FROM ranked WHERE ranked.code = sets.code
+);
+
+DROP TABLE IF EXISTS card_search;
+DROP TABLE IF EXISTS card_mana;
+DROP TABLE IF EXISTS preferred_printing;
+DROP TABLE IF EXISTS card_faces;
+DROP TABLE IF EXISTS card_fts;
+
+CREATE TABLE card_search (
+    id INTEGER PRIMARY KEY,
+    uuid TEXT(36) NOT NULL,
+    name TEXT,
+    faceName TEXT,
+    v_name TEXT,
+    name_key TEXT,
+    v_names TEXT,
+    otherFaceIds TEXT,
+    printings TEXT,
+    setCode TEXT(8),
+    set_rank INTEGER,
+    convertedManaCost FLOAT,
+    manaCost TEXT,
+    power TEXT,
+    toughness TEXT,
+    loyalty TEXT,
+    types TEXT,
+    subtypes TEXT,
+    supertypes TEXT,
+    type TEXT,
+    rarity TEXT,
+    text TEXT,
+    layout TEXT,
+    side TEXT,
+    colors TEXT,
+    colors_sp TEXT,
+    color_mask INTEGER NOT NULL DEFAULT 0,
+    colors_sp_mask INTEGER NOT NULL DEFAULT 0,
+    cmc_key FLOAT NOT NULL DEFAULT -1,
+    price_key FLOAT NOT NULL DEFAULT -1,
+    listed INTEGER NOT NULL DEFAULT 0
+);
+
+CREATE TABLE card_faces (
+    uuid TEXT(36) NOT NULL,
+    other_uuid TEXT(36) NOT NULL,
+    side TEXT,
+    layout TEXT
+);
+
+CREATE TABLE preferred_printing (
+    name_key TEXT PRIMARY KEY,
+    uuid TEXT(36) NOT NULL
+);
+
+CREATE TABLE card_mana (
+    uuid TEXT(36) PRIMARY KEY,
+    cmc FLOAT NOT NULL,
+    w INTEGER NOT NULL,
+    u INTEGER NOT NULL,
+    b INTEGER NOT NULL,
+    r INTEGER NOT NULL,
+    g INTEGER NOT NULL,
+    c INTEGER NOT NULL,
+    s INTEGER NOT NULL,
+    x INTEGER NOT NULL,
+    generic INTEGER NOT NULL,
+    hybrid INTEGER NOT NULL,
+    phyrexian INTEGER NOT NULL,
+    other INTEGER NOT NULL
+);
+
+INSERT INTO card_search (
+    uuid, name, faceName, v_name, name_key, v_names, otherFaceIds, printings,
+    setCode, set_rank, convertedManaCost, manaCost, power, toughness, loyalty,
+    types, subtypes, supertypes, type, rarity, text, layout, side, colors,
+    colors_sp, cmc_key
+)
+SELECT
+    cards.uuid, cards.name, cards.faceName,
+    CASE WHEN cards.faceName IS NULL
+    THEN cards.name
+    ELSE cards.faceName
+    END AS v_name,
+    cards.name_key,
+    replace(cards.name, ' // ', ',') AS v_names,
+    otherFaceIds, printings, setCode, sets.set_rank, convertedManaCost,
+    manaCost, power,
+    toughness, loyalty, types, subtypes, supertypes, cards.type, rarity,
+    cards.text, layout, side, colors,
+    CASE WHEN (layout) IN ('split','aftermath') THEN
+
+            (WITH split(word, str) AS (
+                    SELECT '', otherFaceIds||','
+                    UNION ALL
+                    SELECT
+                    substr(str, 1, instr(str, ',')-1),
+                    substr(str, instr(str, ',')+1)
+                    FROM split WHERE str != ''
+                ) SELECT
+                    group_concat(
+                        (SELECT colors FROM cards c1
+                         WHERE c1.uuid = word)
+                    )
+                FROM split WHERE word != ''
+            )||','||colors
+
+    ELSE colors
+    END AS colors_sp,
+    ifnull(convertedManaCost, -1) AS cmc_key
+FROM cards
+    JOIN sets ON cards.setCode = sets.code
+WHERE instr(','||availability||',', ',paper,') > 0
+ORDER BY sets.set_rank, cards.id;
+
+-- the latest paper price, as joined by `mtgdb.cards_statement`
+UPDATE card_search SET price_key = paper.price
+FROM (
+    SELECT uuid, price, row_number() OVER (
+        PARTITION BY uuid ORDER BY date DESC, id DESC
+    ) AS n
+    FROM prices
+    WHERE type = 'paper'
+) AS paper
+WHERE paper.uuid = card_search.uuid AND paper.n = 1;
+
+-- bits as in `mtgcard.parser.COLOR_BITS`
+UPDATE card_search SET
+    color_mask =
+        (instr(ifnull(colors, ''), 'W') > 0) * 1 +
+        (instr(ifnull(colors, ''), 'U') > 0) * 2 +
+        (instr(ifnull(colors, ''), 'B') > 0) * 4 +
+        (instr(ifnull(colors, ''), 'R') > 0) * 8 +
+        (instr(ifnull(colors, ''), 'G') > 0) * 16,
+    colors_sp_mask =
+        (instr(ifnull(colors_sp, ''), 'W') > 0) * 1 +
+        (instr(ifnull(colors_sp, ''), 'U') > 0) * 2 +
+        (instr(ifnull(colors_sp, ''), 'B') > 0) * 4 +
+        (instr(ifnull(colors_sp, ''), 'R') > 0) * 8 +
+        (instr(ifnull(colors_sp, ''), 'G') > 0) * 16;
+
+UPDATE card_search SET listed = 1
+WHERE
+
+    -- exclude set 'Mystery Booster Playtest Cards (CMB1)'
+    -- exclude set 'Happy Holidays (HHO)'
+    -- exclude set 'Ponies: The Galloping (PTG)'
+    -- exclude set '2016 Heroes of the Realm (HTR)'
+    -- exclude set '2017 Heroes of the Realm (HTR17)'
+    -- exclude set '2018 Heroes of the Realm (HTR18)'
+    -- exclude set 'HasCon (H17)'
+    setCode NOT IN ('CMB1', 'HHO', 'PTG', 'HTR', 'HTR17', 'HTR18', 'H17')
+
+    AND (
+        (side IS NULL AND layout != 'split') OR
+        side = 'a' OR (layout = 'meld' AND side = 'b') OR
+        (side IS NULL AND layout = 'split'
+            AND v_name = substr(name, 1, instr(name||' // ', ' // ')-1))
+    );
+
+-- the row with min(set_rank) provides the bare uuid column
+INSERT INTO preferred_printing (name_key, uuid)
+SELECT name_key, uuid FROM (
+    SELECT name_key, uuid, min(set_rank)
+    FROM card_search
+    GROUP BY name_key
+);
+
+INSERT INTO card_faces (uuid, other_uuid, side, layout)
+SELECT cards.uuid, o.uuid, o.side, cards.layout
+FROM card_search AS cards
+    JOIN json_each('["'||replace(cards.otherFaceIds, ',', '","')||'"]')
+    JOIN card_search AS o ON o.uuid = json_each.value
+WHERE
+    cards.layout in
+        ('adventure','aftermath','flip','split','transform','meld') AND
+    (
+        (o.layout != 'meld' AND o.side != 'a')
+        OR
+        (o.layout = 'meld' AND o.side != 'a' AND o.side != 'b')
+        OR
+        (o.side IS NULL AND o.layout = 'split' AND
+            o.faceName != substr(o.name, 1, instr(o.name||' // ', ' // ')-1))
+    );
+
+CREATE VIRTUAL TABLE card_fts USING fts5(
+    name, text, other_names, other_texts,
+    tokenize = 'trigram', content = ''
+);
+
+WITH other_faces AS (
+    SELECT cards.id, o.faceName, o.text
+    FROM card_search AS cards
+        JOIN card_faces ON card_faces.uuid = cards.uuid
+        JOIN card_search AS o ON o.uuid = card_faces.other_uuid
+    WHERE cards.listed
+)
+INSERT INTO card_fts (rowid, name, text, other_names, other_texts)
+SELECT cards.id, cards.v_name, cards.text, other.names, other.texts
+FROM card_search AS cards
+    LEFT JOIN (
+        SELECT
+            id,
+            group_concat(faceName, char(10)) AS names,
+            group_concat(text, char(10)) AS texts
+        FROM other_faces
+        GROUP BY id
+    ) AS other ON other.id = cards.id
+WHERE cards.listed;
+
+'''.strip()
+
+
+def insert_card_mana(cursor):
+    """Fill `card_mana` from the manacosts in `card_search`.
+
+    :param sqlite3.Cursor cursor: cursor of the database being built
+
+    """
+    columns = ("uuid", "cmc") + MANA_COLUMNS
+    sql = "INSERT INTO card_mana ({:s}) VALUES ({:s})".format(
+        ", ".join(columns), ", ".join("?" * len(columns))
+    )
+    rows = cursor.execute("SELECT uuid, manaCost FROM card_search").fetchall()
+    cursor.executemany(sql, (
+        (uuid, manacost_to_cmc(mc)) + tuple(manacost_counts(mc).values())
+        for uuid, mc in rows
+    ))
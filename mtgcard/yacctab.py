@@ -0,0 +1,54 @@
+
+# yacctab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'CHARS DQUOTE EQ EXACT GE GT KWEQ LE LPAREN LT NE NOT OR RPAREN SQUOTEoption          : option OR combinationoption          : combinationcombination     : combination termcombination     : termterm            : NOT termterm            : LPAREN option RPAREN\n        term           : string\n                       | CHARS\n        \n        term           : EXACT string\n                       | EXACT CHARS\n        \n        term           : CHARS eq EXACT string\n                       | CHARS eq EXACT CHARS\n        \n        term           : CHARS eq string\n                       | CHARS eq CHARS\n        \n        term           : CHARS compare CHARS\n        \n        string          : DQUOTE\n        string          : SQUOTE\n        \n        eq               : EQ\n                         | NE\n                         | KWEQ\n        \n        compare          : GT\n                         | LT\n                         | GE\n                         | LE\n        '
+    
+_lr_action_items = {'NOT':([0,2,3,4,5,6,7,9,10,11,12,13,24,25,26,27,28,30,31,32,33,],[4,4,-4,4,4,-7,-8,-16,-17,4,-3,-5,-9,-10,4,-6,-14,-13,-15,-12,-11,]),'LPAREN':([0,2,3,4,5,6,7,9,10,11,12,13,24,25,26,27,28,30,31,32,33,],[5,5,-4,5,5,-7,-8,-16,-17,5,-3,-5,-9,-10,5,-6,-14,-13,-15,-12,-11,]),'CHARS':([0,2,3,4,5,6,7,8,9,10,11,12,13,15,16,17,18,19,20,21,22,23,24,25,26,27,28,29,30,31,32,33,],[7,7,-4,7,7,-7,-8,25,-16,-17,7,-3,-5,28,31,-18,-19,-20,-21,-22,-23,-24,-9,-10,7,-6,-14,32,-13,-15,-12,-11,]),'EXACT':([0,2,3,4,5,6,7,9,10,11,12,13,15,17,18,19,24,25,26,27,28,30,31,32,33,],[8,8,-4,8,8,-7,-8,-16,-17,8,-3,-5,29,-18,-19,-20,-9,-10,8,-6,-14,-13,-15,-12,-11,]),'DQUOTE':([0,2,3,4,5,6,7,8,9,10,11,12,13,15,17,18,19,24,25,26,27,28,29,30,31,32,33,],[9,9,-4,9,9,-7,-8,9,-16,-17,9,-3,-5,9,-18,-19,-20,-9,-10,9,-6,-14,9,-13,-15,-12,-11,]),'SQUOTE':([0,2,3,4,5,6,7,8,9,10,11,12,13,15,17,18,19,24,25,26,27,28,29,30,31,32,33,],[10,10,-4,10,10,-7,-8,10,-16,-17,10,-3,-5,10,-18,-19,-20,-9,-10,10,-6,-14,10,-13,-15,-12,-11,]),'$end':([1,2,3,6,7,9,10,12,13,24,25,26,27,28,30,31,32,33,],[0,-2,-4,-7,-8,-16,-17,-3,-5,-9,-10,-1,-6,-14,-13,-15,-12,-11,]),'OR':([1,2,3,6,7,9,10,12,13,14,24,25,26,27,28,30,31,32,33,],[11,-2,-4,-7,-8,-16,-17,-3,-5,11,-9,-10,-1,-6,-14,-13,-15,-12,-11,]),'RPAREN':([2,3,6,7,9,10,12,13,14,24,25,26,27,28,30,31,32,33,],[-2,-4,-7,-8,-16,-17,-3,-5,27,-9,-10,-1,-6,-14,-13,-15,-12,-11,]),'EQ':([7,],[17,]),'NE':([7,],[18,]),'KWEQ':([7,],[19,]),'GT':([7,],[20,]),'LT':([7,],[21,]),'GE':([7,],[22,]),'LE':([7,],[23,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'option':([0,5,],[1,14,]),'combination':([0,5,11,],[2,2,26,]),'term':([0,2,4,5,11,26,],[3,12,13,3,3,12,]),'string':([0,2,4,5,8,11,15,26,29,],[6,6,6,6,24,6,30,6,33,]),'eq':([7,],[15,]),'compare':([7,],[16,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> option","S'",1,None,None,None),
+  ('option -> option OR combination','option',3,'p_option_or','parser.py',197),
+  ('option -> combination','option',1,'p_option_combination','parser.py',201),
+  ('combination -> combination term','combination',2,'p_combination_and','parser.py',209),
+  ('combination -> term','combination',1,'p_combination_term','parser.py',213),
+  ('term -> NOT term','term',2,'p_term_not','parser.py',235),
+  ('term -> LPAREN option RPAREN','term',3,'p_term_group','parser.py',239),
+  ('term -> string','term',1,'p_term_name','parser.py',275),
+  ('term -> CHARS','term',1,'p_term_name','parser.py',276),
+  ('term -> EXACT string','term',2,'p_term_exact_name','parser.py',282),
+  ('term -> EXACT CHARS','term',2,'p_term_exact_name','parser.py',283),
+  ('term -> CHARS eq EXACT string','term',4,'p_term_eq_exact_name','parser.py',289),
+  ('term -> CHARS eq EXACT CHARS','term',4,'p_term_eq_exact_name','parser.py',290),
+  ('term -> CHARS eq string','term',3,'p_term_eq','parser.py',301),
+  ('term -> CHARS eq CHARS','term',3,'p_term_eq','parser.py',302),
+  ('term -> CHARS compare CHARS','term',3,'p_term_compare','parser.py',333),
+  ('string -> DQUOTE','string',1,'p_string_dquote_empty','parser.py',584),
+  ('string -> SQUOTE','string',1,'p_string_dquote_empty','parser.py',585),
+  ('eq -> EQ','eq',1,'p_eq','parser.py',595),
+  ('eq -> NE','eq',1,'p_eq','parser.py',596),
+  ('eq -> KWEQ','eq',1,'p_eq','parser.py',597),
+  ('compare -> GT','compare',1,'p_compare','parser.py',603),
+  ('compare -> LT','compare',1,'p_compare','parser.py',604),
+  ('compare -> GE','compare',1,'p_compare','parser.py',605),
+  ('compare -> LE','compare',1,'p_compare','parser.py',606),
+]
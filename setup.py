@@ -12,6 +12,10 @@ if not os.path.exists(sqlite_file):
     mtgcard.update.update_database(verbose=True)
     print( "DOWNLOAD MTGCARD DATA END" )
 
+# lexer and parser tables shipped in the package
+import mtgcard.parser
+mtgcard.parser.write_tables()
+
 import setuptools
 
 with open("README.md", "r") as fh:
@@ -25,7 +29,7 @@ setuptools.setup(
     long_description_content_type="text/markdown",
     url="https://github.com/yoshi1123/mtgcard",
     # packages=setuptools.find_packages(include=['mtgcard']),
-    packages=setuptools.find_packages(exclude=['tests']),
+    packages=setuptools.find_packages(exclude=['tests', 'benchmarks']),
     package_data={
         'mtgcard': ['data/mtg.sqlite'],
         },
@@ -41,5 +45,6 @@ setuptools.setup(
         "License :: OSI Approved :: GNU General Public License v3 (GPLv3)",
         "Operating System :: OS Independent",
     ],
-    python_requires=">=3.6",
+    python_requires=">=3.8",
+    extras_require={"numpy": ["numpy"]},
 )
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from tests import load_tests
+load_tests.__module__ = __name__
+
+import sqlite3
+
+from mtgcard import mtgdb
+from mtgcard import bitmap
+from mtgcard.parser import parser
+from tests.test_parser import QUERIES
+from tests.test_columnar import card_dict
+
+
+class TestBitmap(unittest.TestCase):
+
+    def test_bitmap_ids(self):
+        ids = [0, 1, 7, 8, 63, 64, 1000]
+        self.assertEqual(bitmap.bitmap_ids(bitmap.bitmap(ids)), ids)
+        self.assertEqual(bitmap.bitmap([]), 0)
+        self.assertEqual(bitmap.bitmap_ids(0), [])
+
+    def test_encode(self):
+        bits = bitmap.bitmap([3, 500, 501])
+        self.assertEqual(bitmap.decode(bitmap.encode(bits)), bits)
+
+    def test_color_matches(self):
+        w, u = bitmap.COLOR_BITS['w'], bitmap.COLOR_BITS['u']
+        self.assertTrue(bitmap.color_matches('=', 'wu', w | u))
+        self.assertFalse(bitmap.color_matches('=', 'w', w | u))
+        self.assertTrue(bitmap.color_matches('<=', 'wu', w))
+        self.assertTrue(bitmap.color_matches('>', 'w', w | u))
+
+
+class TestBitmapInterface(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.sqlite = mtgdb.Interface()
+        cls.bitmap = bitmap.BitmapInterface()
+
+    def assertSameCards(self, query, **kwargs):
+        expected = self.sqlite.get_cards(query, **kwargs)
+        actual = self.bitmap.get_cards(query, **kwargs)
+        self.assertEqual(
+            None if actual is None else [card_dict(c) for c in actual],
+            None if expected is None else [card_dict(c) for c in expected])
+
+    def test_queries(self):
+        for q in QUERIES:
+            with self.subTest(query=q):
+                self.assertSameCards(parser.parse(q), prices=True)
+
+    def test_sort_and_limit(self):
+        for sort in ('cmc', 'price', 'setcode'):
+            with self.subTest(sort=sort):
+                self.assertSameCards(parser.parse('t:creature or c:r'),
+                                     sort=sort, reverse=True, limit=3)
+
+    def copy_database(self):
+        conn = sqlite3.connect(':memory:')
+        self.sqlite.cursor.connection.backup(conn)
+        conn.execute('DROP TABLE IF EXISTS bitmaps')
+        return conn
+
+    def test_written_bitmaps(self):
+        conn = self.copy_database()
+        bitmap.write_bitmaps(conn.cursor())
+        self.assertEqual(bitmap.read_bitmaps(conn.cursor()),
+                         bitmap.build_bitmaps(self.sqlite.cursor))
+        self.assertEqual(self.bitmap.bitmaps,
+                         bitmap.build_bitmaps(self.sqlite.cursor))
+
+    def test_missing_bitmaps(self):
+        conn = self.copy_database()
+        self.assertIsNone(bitmap.read_bitmaps(conn.cursor()))
+        conn.execute('CREATE TABLE bitmaps (version INTEGER, data TEXT)')
+        conn.execute("INSERT INTO bitmaps VALUES (1, '{}')")
+        self.assertIsNone(bitmap.read_bitmaps(conn.cursor()))
+
+    def test_bitmaps_in_database(self):
+        # written by the update into the database it replaces
+        self.assertEqual(bitmap.read_bitmaps(self.sqlite.cursor),
+                         bitmap.build_bitmaps(self.sqlite.cursor))
+
+    def test_connect(self):
+        self.assertIsInstance(mtgdb.connect('bitmap'),
+                              bitmap.BitmapInterface)
@@ -0,0 +1,55 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from tests import load_tests
+load_tests.__module__ = __name__
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from mtgcard import mtgdb
+from mtgcard.parser import parser
+from tests.test_parser import QUERIES
+
+
+def card_dict(card):
+    d = dict(vars(card))
+    d['otherfaces'] = [vars(c) for c in card.otherfaces or []]
+    return d
+
+
+@unittest.skipIf(numpy is None, "numpy is not installed")
+class TestColumnarInterface(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        from mtgcard.columnar import ColumnarInterface
+        cls.sqlite = mtgdb.Interface()
+        cls.columnar = ColumnarInterface()
+
+    def assertSameCards(self, query, **kwargs):
+        expected = self.sqlite.get_cards(query, **kwargs)
+        actual = self.columnar.get_cards(query, **kwargs)
+        self.assertEqual(
+            None if actual is None else [card_dict(c) for c in actual],
+            None if expected is None else [card_dict(c) for c in expected])
+
+    def test_queries(self):
+        for q in QUERIES:
+            with self.subTest(query=q):
+                self.assertSameCards(parser.parse(q), prices=True)
+
+    def test_sort_and_limit(self):
+        for sort in ('cmc', 'price', 'setcode'):
+            with self.subTest(sort=sort):
+                self.assertSameCards(parser.parse('t:creature or c:r'),
+                                     sort=sort, reverse=True, limit=3)
+
+    def test_all_cards(self):
+        self.assertSameCards(('', ()))
+
+    def test_connect(self):
+        self.assertIsInstance(mtgdb.connect('numpy'),
+                              type(self.columnar))
@@ -0,0 +1,222 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from tests import load_tests
+load_tests.__module__ = __name__
+
+import io
+import os
+import json
+import contextlib
+import sqlite3
+import tempfile
+import threading
+import http.server
+from unittest.mock import patch
+
+import mtgcard.update
+from mtgcard.update import download
+
+
+FILES = {
+    '/AllPrintings.json.zip': bytes(range(256)) * 1000,
+    '/AllPrices.json.zip': b'prices' * 5000,
+    '/Meta.json': json.dumps(
+        {'meta': {}, 'data': {'date': '2020-06-01', 'version': '5.0.0'}}
+    ).encode(),
+}
+LAST_MODIFIED = 'Mon, 01 Jun 2020 00:00:00 GMT'
+
+
+class Handler(http.server.BaseHTTPRequestHandler):
+    """Stand-in of the MTGJSON server."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers)))
+        if self.path not in FILES:
+            self.send_error(404)
+            return
+        content = FILES[self.path]
+        etag = '"{}-{:d}"'.format(self.path, server.version)
+        if self.headers.get('If-None-Match') == etag or (
+            self.headers.get('If-Modified-Since') == LAST_MODIFIED
+            and 'If-None-Match' not in self.headers
+        ):
+            self.send_response(304)
+            self.end_headers()
+            return
+        start = 0
+        range_ = self.headers.get('Range')
+        if range_ and self.headers.get('If-Range') in (etag, LAST_MODIFIED):
+            start = int(range_[len('bytes='):-1])
+            if start >= len(content):
+                self.send_error(416)
+                return
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes {:d}-{:d}/{:d}'.format(
+                start, len(content) - 1, len(content)))
+        else:
+            self.send_response(200)
+        self.send_header('ETag', etag)
+        self.send_header('Last-Modified', LAST_MODIFIED)
+        self.send_header('Content-Length', str(len(content) - start))
+        self.end_headers()
+        if server.cut:
+            # connection lost halfway
+            self.wfile.write(content[start:start + server.cut])
+            server.cut = None
+            self.close_connection = True
+            return
+        self.wfile.write(content[start:])
+
+
+class TestDownload(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.server = http.server.HTTPServer(('127.0.0.1', 0), Handler)
+        cls.url = 'http://127.0.0.1:{:d}'.format(cls.server.server_port)
+        cls.thread = threading.Thread(target=cls.server.serve_forever)
+        cls.thread.start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        cls.thread.join()
+
+    def setUp(self):
+        self.server.requests = []
+        self.server.version = 1
+        self.server.cut = None
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'download.zip')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def read(self, path=None):
+        with open(path or self.path, 'rb') as f:
+            return f.read()
+
+    def test_download(self):
+        name = '/AllPrintings.json.zip'
+        info = download.download(self.url + name, self.path)
+        self.assertEqual(self.read(), FILES[name])
+        self.assertEqual(info, {'etag': '"{}-1"'.format(name),
+                                'last_modified': LAST_MODIFIED})
+        self.assertEqual(os.listdir(self.tmpdir.name), ['download.zip'])
+
+    def test_not_found(self):
+        with self.assertRaises(OSError):
+            download.download(self.url + '/none.zip', self.path)
+
+    def test_not_modified(self):
+        name = '/AllPrintings.json.zip'
+        info = download.download(self.url + name, self.path)
+        os.remove(self.path)
+        self.assertIsNone(download.download(self.url + name, self.path, info))
+        self.assertFalse(os.path.exists(self.path))
+        self.assertIsNone(download.download(
+            self.url + name, self.path, {'last_modified': LAST_MODIFIED}))
+
+    def test_modified(self):
+        name = '/AllPrintings.json.zip'
+        info = download.download(self.url + name, self.path)
+        self.server.version = 2
+        info2 = download.download(self.url + name, self.path, info)
+        self.assertEqual(info2['etag'], '"{}-2"'.format(name))
+        self.assertEqual(self.read(), FILES[name])
+
+    def test_resume(self):
+        name = '/AllPrintings.json.zip'
+        self.server.cut = 100000
+        with self.assertRaises(OSError):
+            download.download(self.url + name, self.path)
+        self.assertFalse(os.path.exists(self.path))
+        self.assertEqual(self.read(self.path + '.part'), FILES[name][:100000])
+        download.download(self.url + name, self.path)
+        self.assertEqual(self.read(), FILES[name])
+        self.assertEqual(self.server.requests[-1][1]['Range'], 'bytes=100000-')
+        self.assertEqual(os.listdir(self.tmpdir.name), ['download.zip'])
+
+    def test_resume_modified(self):
+        name = '/AllPrintings.json.zip'
+        self.server.cut = 100000
+        with self.assertRaises(OSError):
+            download.download(self.url + name, self.path)
+        # the part is of an older file: downloaded again
+        self.server.version = 2
+        download.download(self.url + name, self.path)
+        self.assertEqual(self.read(), FILES[name])
+
+    def test_resume_complete_part(self):
+        name = '/AllPrices.json.zip'
+        with open(self.path + '.part', 'wb') as f:
+            f.write(FILES[name])
+        with open(self.path + '.part.json', 'w') as f:
+            json.dump({'etag': '"{}-1"'.format(name),
+                       'last_modified': None}, f)
+        download.download(self.url + name, self.path)
+        self.assertEqual(self.read(), FILES[name])
+
+    def test_download_all(self):
+        names = ['/AllPrintings.json.zip', '/AllPrices.json.zip']
+        paths = [os.path.join(self.tmpdir.name, n[1:]) for n in names]
+        infos = download.download_all(
+            [(self.url + n, p, None) for n, p in zip(names, paths)])
+        for name, path, info in zip(names, paths, infos):
+            self.assertEqual(self.read(path), FILES[name])
+            self.assertEqual(info['etag'], '"{}-1"'.format(name))
+        infos = download.download_all(
+            [(self.url + n, p, i) for n, p, i in zip(names, paths, infos)])
+        self.assertEqual(infos, [None, None])
+
+    def test_published_meta(self):
+        self.assertEqual(download.published_meta(self.url + '/Meta.json'),
+                         ('2020-06-01', '5.0.0'))
+
+    def test_last_import(self):
+        path = os.path.join(self.tmpdir.name, 'mtg.sqlite')
+        self.assertIsNone(download.last_import(path))
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE meta (id INTEGER PRIMARY KEY, '
+                     'date DATE, version TEXT)')
+        conn.execute("INSERT INTO meta VALUES (1, '2020-06-01', '5.0.0')")
+        conn.commit()
+        self.assertEqual(download.last_import(path), {
+            'date': '2020-06-01', 'version': '5.0.0', 'downloads': {}})
+        downloads = {self.url: {'etag': '"a"', 'last_modified': None}}
+        download.record_downloads(conn.cursor(), downloads)
+        conn.commit()
+        conn.close()
+        self.assertEqual(download.last_import(path)['downloads'], downloads)
+
+    def test_last_import_uri_characters(self):
+        directory = os.path.join(self.tmpdir.name, 'a?b#c%20d')
+        os.mkdir(directory)
+        path = os.path.join(directory, 'mtg.sqlite')
+        conn = sqlite3.connect(path)
+        conn.execute('CREATE TABLE meta (id INTEGER PRIMARY KEY, '
+                     'date DATE, version TEXT)')
+        conn.execute("INSERT INTO meta VALUES (1, '2020-06-01', '5.0.0')")
+        conn.commit()
+        conn.close()
+        self.assertEqual(download.last_import(path), {
+            'date': '2020-06-01', 'version': '5.0.0', 'downloads': {}})
+
+    def test_old_sqlite(self):
+        err = io.StringIO()
+        with patch.object(sqlite3, 'sqlite_version_info', (3, 31, 1)), \
+                patch.object(sqlite3, 'sqlite_version', '3.31.1'), \
+                patch.object(download, 'last_import') as last_import, \
+                contextlib.redirect_stderr(err):
+            with self.assertRaises(SystemExit):
+                mtgcard.update.update_database()
+        last_import.assert_not_called()
+        self.assertIn('SQLite 3.35.0 or newer is required, found 3.31.1',
+                      err.getvalue())
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from tests import load_tests
+load_tests.__module__ = __name__
+
+import pathlib
+import sqlite3
+from unittest.mock import patch
+
+from mtgcard.update import json2sql
+
+
+class TestBatchedInserts(unittest.TestCase):
+
+    def setUp(self):
+        handle = sqlite3.connect(':memory:')
+        handle.execute('''
+            CREATE TABLE cards (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT,
+                power TEXT,
+                isReprint INTEGER NOT NULL DEFAULT 0,
+                uuid TEXT UNIQUE NOT NULL
+            )''')
+        self.output_file = {
+            'path': pathlib.Path('mtg.sqlite'),
+            'handle': handle,
+            'columns': {},
+            'batches': {},
+            'timings': {},
+        }
+
+    def insert(self, rows):
+        for row in rows:
+            json2sql.sql_dict_insert(row, 'cards', self.output_file)
+        json2sql.flush_inserts(self.output_file)
+        return self.output_file['handle'].execute(
+            'SELECT id, name, power, isReprint FROM cards ORDER BY id'
+        ).fetchall()
+
+    def test_order_and_defaults(self):
+        rows = [
+            {'name': 'Shock', 'uuid': '1'},
+            {'name': 'Serra Angel', 'power': '4', 'uuid': '2'},
+            {'name': 'Sol Ring', 'isReprint': 1, 'uuid': '3'},
+        ]
+        with patch.object(json2sql, 'BATCH_SIZE', 2):
+            self.assertEqual(self.insert(rows), [
+                (1, 'Shock', None, 0),
+                (2, 'Serra Angel', '4', 0),
+                (3, 'Sol Ring', None, 1),
+            ])
+        self.assertEqual(self.output_file['timings']['cards'][0], 3)
+
+    def test_failing_rows_skipped(self):
+        rows = [
+            {'name': 'Shock', 'uuid': '1'},
+            {'name': 'Shock again', 'uuid': '1'},
+            {'name': 'Sol Ring', 'uuid': '3'},
+            {'name': 'Unknown', 'color': 'R', 'uuid': '4'},
+        ]
+        with self.assertLogs(json2sql.LOGGER, 'WARNING') as logs:
+            cards = self.insert(rows)
+        self.assertEqual([name for _, name, _, _ in cards],
+                         ['Shock', 'Sol Ring'])
+        self.assertEqual(len(logs.output), 2)
@@ -0,0 +1,82 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from tests import load_tests
+load_tests.__module__ = __name__
+
+import io
+import os
+import json
+import tempfile
+import zipfile
+
+from mtgcard.update.jsonstream import Reader, ZipMember, iter_members
+
+
+DOCUMENT = {
+    'meta': {'date': '2020-06-01', 'version': '5.0.0'},
+    'data': {
+        'M20': {'cards': [{'name': 'Shock', 'cmc': 1.0}], 'size': 280},
+        'IKO': {'cards': [], 'tokens': None, 'isFoil': False},
+        'EMPTY': {},
+    },
+    'tail': [1, -2.5e10, 'café \\"quoted\\"', 123456789],
+}
+
+
+class TestReader(unittest.TestCase):
+
+    def read(self, text, chunk_size):
+        reader = Reader(io.StringIO(text), chunk_size=chunk_size)
+        result = {}
+        for key in reader.keys():
+            if key == 'data':
+                result[key] = {}
+                for code in reader.keys():
+                    result[key][code] = reader.value()
+            else:
+                result[key] = reader.value()
+        return result
+
+    def test_chunks(self):
+        for indent in (None, 2):
+            text = json.dumps(DOCUMENT, indent=indent)
+            for chunk_size in (1, 2, 5, 64, 1 << 20):
+                with self.subTest(indent=indent, chunk_size=chunk_size):
+                    self.assertEqual(self.read(text, chunk_size), DOCUMENT)
+
+    def test_number_across_chunks(self):
+        reader = Reader(io.StringIO('{"a": 1234567}'), chunk_size=8)
+        self.assertEqual(next(reader.keys()), 'a')
+        self.assertEqual(reader.value(), 1234567)
+
+    def test_empty_object(self):
+        self.assertEqual(list(Reader(io.StringIO(' {} ')).keys()), [])
+
+    def test_invalid(self):
+        with self.assertRaises(ValueError):
+            self.read('{"a": 1 "b": 2}', 4)
+        with self.assertRaises(ValueError):
+            self.read('{"a": [1, 2', 4)
+
+    def test_iter_members(self):
+        f = io.StringIO(json.dumps(DOCUMENT))
+        self.assertEqual(dict(iter_members(f, 'data')), DOCUMENT['data'])
+
+
+class TestZipMember(unittest.TestCase):
+
+    def test_read(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            path = os.path.join(tmpdir, 'download.zip')
+            with zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED) as zf:
+                zf.writestr('AllPrintings.json', json.dumps(DOCUMENT))
+            member = ZipMember(path, 'AllPrintings.json')
+            self.assertTrue(member.is_file())
+            self.assertEqual(str(member.parent), tmpdir)
+            with member.open('r', encoding='utf8') as f:
+                members = dict(iter_members(f, 'data'))
+            self.assertEqual(members, DOCUMENT['data'])
+            self.assertFalse(ZipMember(path, 'AllPrices.json').is_file())
+            self.assertFalse(ZipMember(path + '.none', 'a.json').is_file())
+            self.assertEqual(os.listdir(tmpdir), ['download.zip'])
@@ -52,6 +52,7 @@ from mtgcard import get_defaults
 from mtgcard import mtgdb
 from mtgcard.mtgcard import get_and_print_card
 from mtgcard.mtgcard import list_cards
+from mtgcard.mtgcard import iter_list_cards
 from mtgcard.mtgcard import list_cards_detailed
 from mtgcard.mtgcard import list_cards_images
 from mtgcard.card import Card
@@ -239,6 +240,34 @@ Gisela, the Broken Blade
         actual_result = list_cards(db, "gisela", onlynames=True)[0]
         self.assertEqual(actual_result, expected_result)
 
+    def test_iter_list_cards(self):
+        stats = {}
+        lines = iter_list_cards(db, "Shock", onlynames=True, stats=stats)
+        first = next(lines)
+        self.assertEqual(stats['total'], 1)
+        self.assertEqual([first] + list(lines),
+                         list_cards(db, "Shock", onlynames=True)[0].split('\n'))
+        self.assertEqual(stats['total'], list_cards(db, "Shock")[1])
+
+    def test_list_cards_limit_total(self):
+        names, total = list_cards(db, "t:creature", limit=2)
+        self.assertEqual(len(names.split('\n')), 2)
+        self.assertEqual(total, list_cards(db, "t:creature")[1])
+        self.assertGreater(total, 2)
+
+    def test_list_cards_after(self):
+        names = list_cards(db, "t:creature")[0].split('\n')
+        after, total = list_cards(db, "t:creature", after=names[1].lower())
+        self.assertEqual(after.split('\n'), names[2:])
+        self.assertEqual(total, len(names))
+
+    def test_iter_list_cards_no_header(self):
+        stats = {}
+        lines = iter_list_cards(db, "!'No Such Card'", onlynames=False,
+                                stats=stats)
+        self.assertEqual(list(lines), [])
+        self.assertEqual(stats['total'], 0)
+
 class TestListCardsDetailed(unittest.TestCase):
 
     ###################
@@ -4,16 +4,22 @@ import unittest
 from tests import load_tests
 load_tests.__module__ = __name__
 
+import os
 import sqlite3
+import tempfile
+import functools
+from unittest.mock import patch
 
 from mtgcard.card import Card
 from mtgcard import mtgdb
 from mtgcard.mtgdb import csv_len, csv_set_contains, manacost_contains
 from mtgcard.mtgdb import manacost_to_cmc, csv_element, csv_in
+from mtgcard.mtgdb import manacost_counts, name_key
 from mtgcard.mtgdb import facename_element
 from mtgcard.mtgdb import r_unbraced_char
 from mtgcard.mtgdb import collate_exp_core_first
 from mtgcard.parser import parser
+from mtgcard.parser import COLOR_BITS
 from mtgcard import util
 from mtgcard import settings
 
@@ -176,6 +182,18 @@ class TestMTGDatabaseSQLiteColorSetContains(unittest.TestCase):
         self.assertTrue(actual_result)
 
 
+class TestMTGDatabaseSQLiteNameKey(unittest.TestCase):
+
+    def test_case(self):
+        self.assertEqual(name_key('Serra Angel'), 'serra angel')
+
+    def test_unicode(self):
+        self.assertEqual(name_key("Lim-DÛL'S VAULT"), "lim-dûl's vault")
+
+    def test_none(self):
+        self.assertIsNone(name_key(None))
+
+
 class TestMTGDatabaseSQLiteManaCostToCMC(unittest.TestCase):
 
     def test_one(self):
@@ -435,6 +453,30 @@ class TestMTGDatabaseSQLiteManaListContains(unittest.TestCase):
         self.assertTrue(actual_result)
 
 
+class TestMTGDatabaseSQLiteManaCostCounts(unittest.TestCase):
+
+    def nonzero(self, manacost):
+        return {k: v for k, v in manacost_counts(manacost).items() if v}
+
+    def test_mix(self):
+        expected_result = {'w': 1, 'g': 1, 'generic': 2}
+        self.assertEqual(self.nonzero('2{w}G'), expected_result)
+
+    def test_x(self):
+        expected_result = {'x': 2, 'generic': 10}
+        self.assertEqual(self.nonzero('{X}{X}{10}'), expected_result)
+
+    def test_hybrid_phyrexian(self):
+        expected_result = {'hybrid': 2, 'phyrexian': 1}
+        self.assertEqual(self.nonzero('{2/r}{w/p}{w/u}'), expected_result)
+
+    def test_not_mana(self):
+        self.assertEqual(self.nonzero('z'), {'other': 1})
+
+    def test_none(self):
+        self.assertEqual(self.nonzero(None), {})
+
+
 class TestMTGDatabaseGetCards(unittest.TestCase):
 
     ###################
@@ -467,6 +509,213 @@ class TestMTGDatabaseGetCards(unittest.TestCase):
         self.assertEqual(cards[0].name, 'Shock')
         self.assertEqual(len(cards), 1)
 
+    def test_text_ranges_not_contradictions(self):
+        # power, toughness and loyalty compare as text in SQL
+        for a, b in (('loyalty>10', 'loyalty<5'), ('power>10', 'power<5')):
+            with self.subTest(query=a + ' ' + b):
+                (sql_a, params_a), (sql_b, params_b) = map(
+                    parser.parse, (a, b))
+                unoptimized = ('{} AND {}'.format(sql_a, sql_b),
+                               params_a + params_b)
+                optimized = parser.parse(a + ' ' + b)
+                self.assertEqual(
+                    [c.name for c in
+                     db_mtgjson_sqlite.get_cards(optimized) or []],
+                    [c.name for c in
+                     db_mtgjson_sqlite.get_cards(unoptimized) or []])
+
+    def test_other_faces_one_query(self):
+        statements = []
+        conn = db_mtgjson_sqlite.cursor.connection
+        conn.set_trace_callback(statements.append)
+        try:
+            with patch.object(mtgdb, 'CARDS_BATCH', 10000):
+                cards = db_mtgjson_sqlite.get_cards(
+                    parser.parse("t:creature"))
+        finally:
+            conn.set_trace_callback(None)
+        # cards, then other faces of all cards of the batch
+        self.assertEqual(len(statements), 2)
+        knight = [c for c in cards if c.name == 'Rimrock Knight'][0]
+        self.assertEqual(knight.otherfaces[0].name, 'Boulder Rush')
+
+    def test_iter_cards(self):
+        query = parser.parse("t:creature")
+        with patch.object(mtgdb, 'CARDS_BATCH', 2):
+            names = [c.name for c in db_mtgjson_sqlite.iter_cards(query)]
+        self.assertEqual(
+            names, [c.name for c in db_mtgjson_sqlite.get_cards(query)])
+
+    def test_iter_cards_first_batch(self):
+        statements = []
+        conn = db_mtgjson_sqlite.cursor.connection
+        conn.set_trace_callback(statements.append)
+        try:
+            with patch.object(mtgdb, 'CARDS_BATCH', 2):
+                cards = db_mtgjson_sqlite.iter_cards(
+                    parser.parse("t:creature"))
+                first = next(cards)
+                cards.close()
+        finally:
+            conn.set_trace_callback(None)
+        # cards, then other faces of the first batch only
+        self.assertEqual(len(statements), 2)
+        self.assertEqual(
+            first.name,
+            db_mtgjson_sqlite.get_cards(parser.parse("t:creature"))[0].name)
+
+    def test_iter_cards_no_cards(self):
+        query = (mtgdb.NO_CARDS, ())
+        self.assertEqual(list(db_mtgjson_sqlite.iter_cards(query)), [])
+        self.assertIsNone(db_mtgjson_sqlite.get_cards(query))
+
+    def test_count_cards(self):
+        for q in ("t:creature", "Shock", "c:r or set:m20", "-f:modern"):
+            with self.subTest(query=q):
+                query = parser.parse(q)
+                self.assertEqual(
+                    db_mtgjson_sqlite.count_cards(query),
+                    len(list(db_mtgjson_sqlite.iter_cards(query))))
+        self.assertEqual(
+            db_mtgjson_sqlite.count_cards(("", ())),
+            len(list(db_mtgjson_sqlite.iter_cards(("", ())))))
+        self.assertEqual(
+            db_mtgjson_sqlite.count_cards((mtgdb.NO_CARDS, ())), 0)
+
+    def test_pages(self):
+        query = parser.parse("t:creature or c:r")
+        for sort in ('name', 'cmc', 'price', 'setcode'):
+            for reverse in (False, True):
+                with self.subTest(sort=sort, reverse=reverse):
+                    cards = db_mtgjson_sqlite.get_cards(
+                        query, sort=sort, reverse=reverse)
+                    pages, after = [], None
+                    while True:
+                        page = db_mtgjson_sqlite.get_cards(
+                            query, sort=sort, reverse=reverse, limit=2,
+                            after=after)
+                        if page is None:
+                            break
+                        pages += page
+                        after = mtgdb.page_key(page[-1], sort)
+                    self.assertEqual([c.name for c in pages],
+                                     [c.name for c in cards])
+
+    def steps(self, sql, params=()):
+        conn = db_mtgjson_sqlite.cursor.connection
+        count = [0]
+
+        def step():
+            count[0] += 1
+
+        conn.set_progress_handler(step, 1)
+        try:
+            conn.execute(sql, params).fetchall()
+        finally:
+            conn.set_progress_handler(None, 1)
+        return count[0]
+
+    def test_limit_by_name_stops_early(self):
+
+        def steps(limit):
+            return self.steps(
+                mtgdb.cards_statement('', 'name', False, limit, True))
+
+        self.assertLess(steps(1) * 2, steps(100000))
+
+    def test_limit_by_key_stops_early(self):
+        for sort in mtgdb.INDEXED_SORTS:
+            for reverse in (False, True):
+                with self.subTest(sort=sort, reverse=reverse):
+                    cards = db_mtgjson_sqlite.get_cards(
+                        ('', ()), sort=sort, reverse=reverse)
+                    key = mtgdb.page_key(cards[len(cards) // 2], sort)
+                    after = mtgdb.cards_statement(
+                        '', sort, reverse, 1, True,
+                        "key" if key[0] is not None else "null")
+                    if key[0] is None:
+                        key = key[1:]
+                    every = mtgdb.cards_statement(
+                        '', sort, reverse, 100000, True)
+                    first = mtgdb.cards_statement(
+                        '', sort, reverse, 1, True)
+                    self.assertLess(self.steps(first) * 2, self.steps(every))
+                    self.assertLess(self.steps(after, key) * 2,
+                                    self.steps(every))
+
+    def database_copy(self, sql):
+        tmpdir = tempfile.TemporaryDirectory()
+        self.addCleanup(tmpdir.cleanup)
+        filepath = os.path.join(tmpdir.name, 'mtg.sqlite')
+        conn = sqlite3.connect(filepath)
+        db_mtgjson_sqlite.cursor.connection.backup(conn)
+        conn.executescript(sql)
+        conn.commit()
+        conn.close()
+        with patch.object(mtgdb, 'database_path', return_value=filepath):
+            db = mtgdb.Interface()
+        self.addCleanup(db.cursor.connection.close)
+        return db
+
+    def test_several_prices(self):
+        # an older price of every printing
+        db = self.database_copy('''
+            INSERT INTO prices (date, price, type, uuid)
+            SELECT '2000-01-01', price + 100, type, uuid FROM prices;
+        ''')
+        for sort in mtgdb.SORT_KEYS:
+            with self.subTest(sort=sort):
+                cards = db.get_cards(
+                    ('', ()), sort=sort, limit=5, prices=True)
+                expected = db_mtgjson_sqlite.get_cards(
+                    ('', ()), sort=sort, limit=5, prices=True)
+                self.assertEqual(
+                    [(c.name, c.price) for c in cards],
+                    [(c.name, c.price) for c in expected])
+                self.assertEqual(len(cards), 5)
+
+    def test_price_pages(self):
+        # a free printing, and an older price of every printing
+        db = self.database_copy('''
+            UPDATE prices SET price = 0 WHERE uuid = (
+                SELECT uuid FROM card_search WHERE v_name = 'Sol Ring'
+            );
+            UPDATE card_search SET price_key = 0 WHERE v_name = 'Sol Ring';
+            INSERT INTO prices (date, price, type, uuid)
+            SELECT '2000-01-01', 100 - price, type, uuid FROM prices;
+        ''')
+        for reverse in (False, True):
+            with self.subTest(reverse=reverse):
+                cards = db.get_cards(('', ()), sort='price', reverse=reverse)
+                pages, after = [], None
+                while True:
+                    page = db.get_cards(
+                        ('', ()), sort='price', reverse=reverse, limit=2,
+                        after=after)
+                    if page is None:
+                        break
+                    pages += page
+                    after = mtgdb.page_key(page[-1], 'price')
+                self.assertEqual([c.name for c in pages],
+                                 [c.name for c in cards])
+
+    def test_offset(self):
+        query = parser.parse("t:creature")
+        cards = db_mtgjson_sqlite.get_cards(query, sort='cmc')
+        page = db_mtgjson_sqlite.get_cards(query, sort='cmc', limit=2,
+                                           offset=2)
+        self.assertEqual([c.name for c in page],
+                         [c.name for c in cards[2:4]])
+
+    def test_find_page_key(self):
+        query = parser.parse("t:creature")
+        cards = db_mtgjson_sqlite.get_cards(query, sort='cmc')
+        key = db_mtgjson_sqlite.find_page_key(query, cards[1].name.upper(),
+                                              sort='cmc')
+        self.assertEqual(key, mtgdb.page_key(cards[1], 'cmc'))
+        with self.assertRaises(ValueError):
+            db_mtgjson_sqlite.find_page_key(query, 'No Such Card')
+
     def test_partial_name(self):
         cards = db_mtgjson_sqlite.get_cards(parser.parse("Shock"))
         self.assertEqual(cards[0].name, 'Aether Shockwave')
@@ -509,6 +758,27 @@ class TestMTGDatabaseGetCards(unittest.TestCase):
         cards = db_mtgjson_sqlite.get_cards(parser.parse("set:m20"), limit=10)
         self.assertEqual(len(cards), 10)
 
+    def test_not_format(self):
+        cards = db_mtgjson_sqlite.get_cards(parser.parse("!Shock -f:modern"))
+        self.assertEqual(cards, None)
+
+    def test_prices(self):
+        cards = db_mtgjson_sqlite.get_cards(parser.parse("!'Serra Angel'"),
+                                            prices=True)
+        self.assertEqual(type(cards[0].price), float)
+
+    def test_prices_not_joined(self):
+        cards = db_mtgjson_sqlite.get_cards(parser.parse("!'Serra Angel'"))
+        self.assertEqual(cards[0].price, None)
+
+    def test_statement_cached(self):
+        query = parser.parse("t:elf")
+        db_mtgjson_sqlite.get_cards(query, limit=3)
+        info = mtgdb.cards_statement.cache_info()
+        db_mtgjson_sqlite.get_cards(query, limit=3)
+        self.assertEqual(mtgdb.cards_statement.cache_info().hits,
+                         info.hits + 1)
+
 
 class TestMTGDatabaseGetCard(unittest.TestCase):
 
@@ -792,3 +1062,86 @@ class TestMTGDatabaseGetToken(unittest.TestCase):
         card = db_mtgjson_sqlite.get_token('Beast')
         self.assertEqual(card.name, 'Beast')
         self.assertEqual(card.types[0], 'Token')
+
+
+class TestMTGDatabaseCardSearch(unittest.TestCase):
+
+    def test_split_colors_sp(self):
+        row = db_mtgjson_sqlite.cursor.execute(
+                "SELECT colors_sp FROM card_search "
+                "WHERE v_name = 'Fire' AND setCode = 'APC'").fetchone()
+        self.assertEqual(set(row['colors_sp'].split(',')), {'R', 'U'})
+
+    def test_adventure_side_b_not_listed(self):
+        rows = db_mtgjson_sqlite.cursor.execute(
+                "SELECT v_name, listed FROM card_search "
+                "WHERE name = 'Rimrock Knight // Boulder Rush' "
+                "AND setCode = 'ELD'").fetchall()
+        listed = {r['v_name']: r['listed'] for r in rows}
+        self.assertEqual(listed, {'Rimrock Knight': 1, 'Boulder Rush': 0})
+
+    def test_split_color_masks(self):
+        row = db_mtgjson_sqlite.cursor.execute(
+                "SELECT color_mask, colors_sp_mask FROM card_search "
+                "WHERE v_name = 'Fire' AND setCode = 'APC'").fetchone()
+        self.assertEqual(row['color_mask'], COLOR_BITS['r'])
+        self.assertEqual(row['colors_sp_mask'],
+                         COLOR_BITS['r'] | COLOR_BITS['u'])
+
+    def test_name_key(self):
+        row = db_mtgjson_sqlite.cursor.execute(
+                "SELECT name_key FROM card_search "
+                "WHERE v_name = 'Boulder Rush' AND setCode = 'ELD'").fetchone()
+        self.assertEqual(row['name_key'], 'boulder rush')
+
+    def test_set_rank_main_sets_first(self):
+        rows = db_mtgjson_sqlite.cursor.execute(
+                "SELECT type, releaseDate FROM sets "
+                "ORDER BY set_rank").fetchall()
+        expected_result = sorted(rows, key=lambda r: r['releaseDate'],
+                                 reverse=True)
+        expected_result = sorted(expected_result, reverse=True,
+                                 key=functools.cmp_to_key(
+                                     lambda a, b: collate_exp_core_first(
+                                         a['type'], b['type'])))
+        self.assertEqual([tuple(r) for r in rows],
+                         [tuple(r) for r in expected_result])
+
+    def test_preferred_printing(self):
+        row = db_mtgjson_sqlite.cursor.execute(
+                "SELECT cards.setCode FROM preferred_printing "
+                "JOIN card_search AS cards "
+                "ON cards.uuid = preferred_printing.uuid "
+                "WHERE preferred_printing.name_key = 'fire'").fetchone()
+        self.assertEqual(row['setCode'], 'APC')
+
+    def test_card_faces(self):
+        rows = db_mtgjson_sqlite.cursor.execute(
+                "SELECT o.faceName, card_faces.side, card_faces.layout "
+                "FROM card_search AS cards "
+                "JOIN card_faces ON card_faces.uuid = cards.uuid "
+                "JOIN card_search AS o ON o.uuid = card_faces.other_uuid "
+                "WHERE cards.faceName = 'Rimrock Knight'").fetchall()
+        self.assertEqual([tuple(r) for r in rows],
+                         [('Boulder Rush', 'b', 'adventure')])
+
+    def test_card_faces_not_front(self):
+        row = db_mtgjson_sqlite.cursor.execute(
+                "SELECT count(*) FROM card_faces "
+                "JOIN card_search AS o ON o.uuid = card_faces.other_uuid "
+                "WHERE o.side = 'a'").fetchone()
+        self.assertEqual(row[0], 0)
+
+
+class TestMTGDatabaseConnection(unittest.TestCase):
+
+    def test_query_only(self):
+        if not settings.DB_READ_ONLY:
+            self.skipTest("database opened read-write")
+        with self.assertRaises(sqlite3.OperationalError):
+            db_mtgjson_sqlite.cursor.execute(
+                "DELETE FROM sets WHERE code = 'M20'")
+
+    def test_mmap_size(self):
+        row = db_mtgjson_sqlite.cursor.execute("PRAGMA mmap_size").fetchone()
+        self.assertEqual(row[0], settings.DB_MMAP_SIZE)
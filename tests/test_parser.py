@@ -4,8 +4,23 @@ import unittest
 from tests import load_tests
 load_tests.__module__ = __name__
 
+import os
+import sys
+import subprocess
+
 from mtgcard.parser import parser
+from mtgcard.parser import _lexer
+from mtgcard.parser import _parser
+from mtgcard.parser import normalize_query
+from mtgcard.parser import Term, Not, And, Or
+from mtgcard.parser import optimize_tree, emit_sql
+from mtgcard.common import NO_CARDS
 from mtgcard.parser import sql_where_card_or_otherids
+from mtgcard.parser import sql_exists
+from mtgcard.parser import sql_popcount
+from mtgcard.parser import sql_manacost
+from mtgcard.parser import sql_fts_match
+from mtgcard.common import manacost_counts
 
 from mtgcard import settings
 
@@ -33,29 +48,42 @@ class TestSqlWhereCardOrOtherids(unittest.TestCase):
 class TestParser(unittest.TestCase):
 
     def test_no_keywords_single_search(self):
-        expected_result = (sql_where_card_or_otherids(
-                               "lower(v_name) LIKE lower(?)",
-                               "lower(cards.faceName) LIKE lower(?)"),
-                           ('%angel%','%angel%'))
+        expected_result = (sql_where_card_or_otherids(sql_fts_match()),
+                           ('{name other_names} : "angel"',))
         actual_result = parser.parse('angel')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_name_case(self):
-        expected_result = (sql_where_card_or_otherids(
-                               "lower(v_name) LIKE lower(?)",
-                               "lower(cards.faceName) LIKE lower(?)"),
-                           ('%angel%','%angel%'))
+        expected_result = (sql_where_card_or_otherids(sql_fts_match()),
+                           ('{name other_names} : "angel"',))
         actual_result = parser.parse('name:angel')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_name_keyword(self):
-        expected_result = (sql_where_card_or_otherids(
-                               "lower(v_name) LIKE lower(?)",
-                               "lower(cards.faceName) LIKE lower(?)"),
-                           ('%angel%','%angel%'))
+        expected_result = (sql_where_card_or_otherids(sql_fts_match()),
+                           ('{name other_names} : "angel"',))
         actual_result = parser.parse('name:angel')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
+    def test_name_short(self):
+        # too short for trigrams
+        expected_result = (sql_where_card_or_otherids(
+                               "lower(v_name) LIKE lower(?) ESCAPE '\\'",
+                               "lower(cards.faceName) LIKE lower(?) "
+                               "ESCAPE '\\'"),
+                           ('%an%','%an%'))
+        actual_result = parser.parse('name:an')
+        self.assertEqual(actual_result[0:2], expected_result[0:2])
+
+    def test_name_short_wildcards_literal(self):
+        self.assertEqual(parser.parse("name:'%'")[1], ('%\\%%',) * 2)
+        self.assertEqual(parser.parse("name:'_'")[1], ('%\\_%',) * 2)
+
+    def test_name_quote_in_phrase(self):
+        expected_result = ('{name other_names} : "a ""b"""',)
+        actual_result = parser.parse("name:'a \"b\"'")
+        self.assertEqual(expected_result, actual_result[1])
+
     def test_name_keyword_exact(self):
         expected_result = (sql_where_card_or_otherids(
                 "lower(v_name) = lower(?)",
@@ -65,26 +93,20 @@ class TestParser(unittest.TestCase):
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_name_keyword_double_quotes(self):
-        expected_result = (sql_where_card_or_otherids(
-                               "lower(v_name) LIKE lower(?)",
-                               "lower(cards.faceName) LIKE lower(?)"),
-                           ('%angel%','%angel%'))
+        expected_result = (sql_where_card_or_otherids(sql_fts_match()),
+                           ('{name other_names} : "angel"',))
         actual_result = parser.parse('name:"angel"')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_name_keyword_single_quotes(self):
-        expected_result = (sql_where_card_or_otherids(
-                               "lower(v_name) LIKE lower(?)",
-                               "lower(cards.faceName) LIKE lower(?)"),
-                           ('%angel%','%angel%'))
+        expected_result = (sql_where_card_or_otherids(sql_fts_match()),
+                           ('{name other_names} : "angel"',))
         actual_result = parser.parse('name:\'angel\'')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_name_keyword_with_spaces(self):
-        expected_result = (sql_where_card_or_otherids(
-                               "lower(v_name) LIKE lower(?)",
-                               "lower(cards.faceName) LIKE lower(?)"),
-                           ('%serra angel%','%serra angel%'))
+        expected_result = (sql_where_card_or_otherids(sql_fts_match()),
+                           ('{name other_names} : "serra angel"',))
         actual_result = parser.parse('name:"serra angel"')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
@@ -97,7 +119,8 @@ class TestParser(unittest.TestCase):
 
     def test_format(self):
         expected_result = (sql_where_card_or_otherids(
-                "lower(legalities.format) = lower(?)"),
+                sql_exists("legalities",
+                           "lower(legalities.format) = lower(?)")),
             ('modern',))
         actual_result = parser.parse('legal:modern')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
@@ -116,10 +139,8 @@ class TestParser(unittest.TestCase):
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_text(self):
-        expected_result = (sql_where_card_or_otherids(
-                "lower(cards.text) LIKE lower(?)",
-                "lower(cards.text) LIKE lower(?)"),
-            ('%angel%','%angel%'))
+        expected_result = (sql_where_card_or_otherids(sql_fts_match()),
+            ('{text other_texts} : "angel"',))
         actual_result = parser.parse('text:angel')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
@@ -168,7 +189,7 @@ class TestParser(unittest.TestCase):
     def test_year_ne(self):
         expected_result = (sql_where_card_or_otherids(
                 "CAST(strftime('%Y', DATE(sets.releaseDate)) AS INTEGER) != ?"),
-            (2010,2010))
+            (2010,))
         actual_result = parser.parse('year != 2010')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
@@ -176,17 +197,19 @@ class TestParser(unittest.TestCase):
     # floats
 
     def test_price_le(self):
-        expected_result = (sql_where_card_or_otherids('''
-        ( prices.price = round(?,2) AND prices.type = 'paper' )
-        '''),
+        expected_result = (sql_where_card_or_otherids(
+                sql_exists("prices",
+                           "prices.price = round(?,2) AND "
+                           "prices.type = 'paper'")),
         (float( 0.5 / settings.US_TO_CUR_RATE),))
         actual_result = parser.parse('price = 0.5')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_price_integer(self):
-        expected_result = (sql_where_card_or_otherids('''
-        ( prices.price = round(?,2) AND prices.type = 'paper' )
-        '''),
+        expected_result = (sql_where_card_or_otherids(
+                sql_exists("prices",
+                           "prices.price = round(?,2) AND "
+                           "prices.type = 'paper'")),
         (float( 1 / settings.US_TO_CUR_RATE),))
         actual_result = parser.parse('price = 1')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
@@ -199,47 +222,61 @@ class TestParser(unittest.TestCase):
 
     def test_colors_lt(self):
         expected_result = (sql_where_card_or_otherids('''
-        ( csv_len(colors_sp) < csv_len(lower(?)) AND
-        csv_set_contains(lower(?), lower(colors_sp)) )
-        ''', '''
-        ( csv_len(cards.colors) < csv_len(lower(?)) AND
-        csv_set_contains(lower(?), lower(cards.colors)) )
-        ''', other_layouts=("'transform'","'meld'")),
-        ('u,b','u,b','u,b','u,b'))
+        ( {} < ? AND
+        (colors_sp_mask & ?) = colors_sp_mask )
+        '''.format(sql_popcount('colors_sp_mask')), '''
+        ( {} < ? AND
+        (cards.color_mask & ?) = cards.color_mask )
+        '''.format(sql_popcount('cards.color_mask')),
+        other_layouts=("'transform'","'meld'")),
+        (2, 6, 2, 6))
         actual_result = parser.parse('colors<ub')
-        self.assertEqual(actual_result[0:2], expected_result[0:2])
+        self.assertEqual(expected_result, actual_result)
 
     def test_colors_gt(self):
         expected_result = (sql_where_card_or_otherids('''
-        ( csv_len(colors_sp) > csv_len(lower(?)) AND
-        csv_set_contains(lower(colors_sp), lower(?)) )
-        ''', '''
-        ( csv_len(cards.colors) > csv_len(lower(?)) AND
-        csv_set_contains(lower(cards.colors), lower(?)) )
-        ''', other_layouts=("'transform'","'meld'")),
-        ('u,b','u,b','u,b','u,b'))
+        ( {} > ? AND
+        (colors_sp_mask & ?) = ? )
+        '''.format(sql_popcount('colors_sp_mask')), '''
+        ( {} > ? AND
+        (cards.color_mask & ?) = ? )
+        '''.format(sql_popcount('cards.color_mask')),
+        other_layouts=("'transform'","'meld'")),
+        (2, 6, 6, 2, 6, 6))
         actual_result = parser.parse('colors>ub')
-        self.assertEqual(actual_result[0:2], expected_result[0:2])
+        self.assertEqual(expected_result, actual_result)
 
     def test_colors_eq(self):
         expected_result = (sql_where_card_or_otherids('''
-        ( csv_len(colors_sp) = csv_len(lower(?)) AND
-        csv_set_contains(lower(?), lower(colors_sp)) AND
-        csv_set_contains(lower(colors_sp), lower(?)) )
-        ''', '''
-        ( csv_len(cards.colors) = csv_len(lower(?)) AND
-        csv_set_contains(lower(?), lower(cards.colors)) AND
-        csv_set_contains(lower(cards.colors), lower(?)) )
-        ''', other_layouts=("'transform'","'meld'")),
-        ('u,b','u,b','u,b','u,b','u,b','u,b'))
+        ( {} = ? AND
+        (colors_sp_mask & ?) = colors_sp_mask AND
+        (colors_sp_mask & ?) = ? )
+        '''.format(sql_popcount('colors_sp_mask')), '''
+        ( {} = ? AND
+        (cards.color_mask & ?) = cards.color_mask AND
+        (cards.color_mask & ?) = ? )
+        '''.format(sql_popcount('cards.color_mask')),
+        other_layouts=("'transform'","'meld'")),
+        (2, 6, 6, 6, 2, 6, 6, 6))
         actual_result = parser.parse('colors=ub')
-        self.assertEqual(actual_result[0:2], expected_result[0:2])
+        self.assertEqual(expected_result, actual_result)
 
     def test_colors_colon(self):
-        expected_result = ('u,b','u,b','u,b','u,b')
+        expected_result = (2, 6, 6, 2, 6, 6)
         actual_result = parser.parse('colors:ub')
         self.assertEqual(expected_result, actual_result[1])
 
+    def test_colors_not_wubrg(self):
+        # no card has a color other than WUBRG
+        expected_result = (2, 33, 33, 2, 33, 33)
+        actual_result = parser.parse('colors>=wx')
+        self.assertEqual(expected_result, actual_result[1])
+
+    def test_popcount(self):
+        self.assertEqual(sql_popcount('m'),
+                         '(((m >> 0) & 1) + ((m >> 1) & 1) + ((m >> 2) & 1) + '
+                         '((m >> 3) & 1) + ((m >> 4) & 1))')
+
 
     # mana>2WUU : card.cmc > 5 AND 1,1,2,u,u in card.mana
     # mana>=2WUU: card.cmc >= 5 AND 1,1,2,u,u in card.mana
@@ -248,43 +285,52 @@ class TestParser(unittest.TestCase):
     # mana<2WUU : cmc < 5 AND card.mana in 1,1,2,u,u
 
     def test_mana_eq(self):
-        expected_result = (sql_where_card_or_otherids('''
-        ( manacost_to_cmc(cards.manaCost) = manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower(?), lower(cards.manaCost)) AND
-        manacost_contains(lower(cards.manaCost), lower(?)) )
-        ''', '''
-        ( manacost_to_cmc(cards.manaCost) = manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower(?), lower(cards.manaCost)) AND
-        manacost_contains(lower(cards.manaCost), lower(?)) )
-        ''', ("'adventure'","'split'","'aftermath'")),
-        ('ub','ub','ub','ub','ub','ub'))
+        sql_query = '''
+        cards.uuid IN (
+            SELECT card_mana.uuid FROM card_mana
+            WHERE card_mana.cmc = ? AND card_mana.w = ? AND card_mana.u = ? AND card_mana.b = ? AND card_mana.r = ? AND card_mana.g = ? AND card_mana.c = ? AND card_mana.s = ? AND card_mana.x = ? AND card_mana.generic = ? AND card_mana.hybrid = ? AND card_mana.phyrexian = ? AND card_mana.other = ?
+        )
+        '''
+        expected_result = (sql_where_card_or_otherids(sql_query, sql_query,
+            ("'adventure'","'split'","'aftermath'")),
+        (2, 0, 1, 1, 0, 0, 0, 0, 0, 0, 0, 0, 0) * 2)
         actual_result = parser.parse('mana=ub')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_mana_lt(self):
-        expected_result = (sql_where_card_or_otherids('''
-        ( manacost_to_cmc(cards.manaCost) < manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower(?), lower(cards.manaCost)) )
-        ''', '''
-        ( manacost_to_cmc(cards.manaCost) < manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower(?), lower(cards.manaCost)) )
-        ''', ("'adventure'","'split'","'aftermath'")),
-        ('1ub','1ub','1ub','1ub'))
+        sql_query = sql_manacost('<', 3, manacost_counts('1ub'))[0]
+        expected_result = (sql_where_card_or_otherids(sql_query, sql_query,
+            ("'adventure'","'split'","'aftermath'")),
+        (3, 0, 1, 1, 0, 0, 0, 0, 0, 1, 0, 0, 0) * 2)
         actual_result = parser.parse('mana<1ub')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
     def test_mana_gt(self):
-        expected_result = (sql_where_card_or_otherids('''
-        ( manacost_to_cmc(cards.manaCost) > manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower(cards.manaCost), lower(?)) )
-        ''', '''
-        ( manacost_to_cmc(cards.manaCost) > manacost_to_cmc(lower(?)) AND
-        manacost_contains(lower(cards.manaCost), lower(?)) )
-        ''', ("'adventure'","'split'","'aftermath'")),
-        ('1ub','1ub','1ub','1ub'))
+        sql_query = '''
+        cards.uuid IN (
+            SELECT card_mana.uuid FROM card_mana
+            WHERE card_mana.cmc > ? AND card_mana.u >= ? AND card_mana.b >= ? AND card_mana.generic >= ?
+        )
+        '''
+        expected_result = (sql_where_card_or_otherids(sql_query, sql_query,
+            ("'adventure'","'split'","'aftermath'")),
+        (3, 1, 1, 1) * 2)
         actual_result = parser.parse('mana>1ub')
         self.assertEqual(actual_result[0:2], expected_result[0:2])
 
+    def test_mana_hybrid(self):
+        # hybrid symbols are not counted by symbol, compare strings
+        sql_query = '''
+        ( manacost_to_cmc(cards.manaCost) >=
+            manacost_to_cmc(lower(?)) AND
+        manacost_contains(lower(cards.manaCost), lower(?)) )
+        '''
+        expected_result = (sql_where_card_or_otherids(sql_query, sql_query,
+            ("'adventure'","'split'","'aftermath'")),
+        ('{2/w}',) * 4)
+        actual_result = parser.parse('mana:{2/w}')
+        self.assertEqual(actual_result[0:2], expected_result[0:2])
+
 
     # strings
 
@@ -304,7 +350,7 @@ class TestParser(unittest.TestCase):
     def test_not(self):
         # expected_result = ('NOT lower(v_name) LIKE lower(?)'.strip(),
         #                    ('%serra angel%',))
-        expected_result = ('%serra angel%','%serra angel%')
+        expected_result = ('{name other_names} : "serra angel"',)
         actual_result = parser.parse("-'serra angel'")
         self.assertEqual(expected_result, actual_result[1])
 
@@ -312,14 +358,14 @@ class TestParser(unittest.TestCase):
         # expected_result = ('''
         # ( lower(v_name) LIKE lower(?) OR lower(v_name) LIKE lower(?) )
         # '''.strip(), ('%serra angel%', '%shivan dragon%'))
-        expected_result = ('%serra angel%','%serra angel%',
-                           '%shivan dragon%','%shivan dragon%')
+        expected_result = ('{name other_names} : "serra angel"',
+                           '{name other_names} : "shivan dragon"')
         actual_result = parser.parse("('serra angel' or 'shivan dragon')")
         self.assertEqual(expected_result, actual_result[1])
 
     def test_brackets_not_first(self):
-        expected_result = ('eld', 'b', 'b', 'b', 'b', 'b', 'b',
-                                  'w', 'w', 'w', 'w', 'w', 'w')
+        expected_result = ('eld', 1, 4, 4, 4, 1, 4, 4, 4,
+                                  1, 1, 1, 1, 1, 1, 1, 1)
         actual_result = parser.parse("set:eld (colors=b or colors=w)")
         self.assertEqual(expected_result, actual_result[1])
 
@@ -327,7 +373,8 @@ class TestParser(unittest.TestCase):
 
     def test_no_keywords_or_search(self):
         # expected_result = ("lower(v_name) LIKE lower(?) OR lower(v_name) LIKE lower(?)", ('%angel%','%bird%') )
-        expected_result = ('%angel%','%angel%','%bird%','%bird%')
+        expected_result = ('{name other_names} : "angel"',
+                           '{name other_names} : "bird"')
         actual_result = parser.parse('angel or bird')
         self.assertEqual(expected_result, actual_result[1])
 
@@ -336,14 +383,16 @@ class TestParser(unittest.TestCase):
         #         "lower(v_name) LIKE lower(?) AND lower(v_name) LIKE lower(?)",
         #         "lower(v_name) LIKE lower(?) AND lower(v_name) LIKE lower(?)"),
         #     ('%serra%','%serra%','%angel%','%angel%'))
-        expected_result = ('%serra%','%serra%','%angel%','%angel%')
+        expected_result = ('{name other_names} : "serra"',
+                           '{name other_names} : "angel"')
         actual_result = parser.parse('name:serra angel')
         self.assertEqual(expected_result, actual_result[1])
 
     def test_name_and_type_keyword(self):
         # expected_result = ("lower(v_name) LIKE lower(?) AND "+self.type_term,
         #         ('%serra%', 'angel', 'angel'))
-        expected_result = ('%serra%','%serra%','angel','angel','angel','angel','angel','angel')
+        expected_result = ('{name other_names} : "serra"',
+                           'angel','angel','angel','angel','angel','angel')
         actual_result = parser.parse('name:serra type:angel')
         self.assertEqual(expected_result, actual_result[1])
 
@@ -351,8 +400,8 @@ class TestParser(unittest.TestCase):
         # expected_result = ('''
         # ( lower(v_name) LIKE lower(?) OR lower(v_name) LIKE lower(?) )
         # '''.strip(), ('%serra angel%', '%shivan dragon%'))
-        expected_result = ('%serra angel%','%serra angel%',
-                           '%shivan dragon%','%shivan dragon%')
+        expected_result = ('{name other_names} : "serra angel"',
+                           '{name other_names} : "shivan dragon"')
         actual_result = parser.parse("('serra angel' or 'shivan dragon')")
         self.assertEqual(expected_result, actual_result[1])
 
@@ -365,8 +414,8 @@ class TestParser(unittest.TestCase):
         self.assertEqual(expected_result, actual_result[1])
 
     def test_color_and_color(self):
-        expected_result = ('b', 'b', 'b', 'b', 'b', 'b',
-                           'w', 'w', 'w', 'w', 'w', 'w')
+        expected_result = (1, 4, 4, 4, 1, 4, 4, 4,
+                           1, 1, 1, 1, 1, 1, 1, 1)
         actual_result = parser.parse("colors=b colors=w")
         self.assertEqual(expected_result, actual_result[1])
 
@@ -383,3 +432,129 @@ class TestParser(unittest.TestCase):
 
     def test_invalid_keyword_and_valid_keyword(self):
         self.assertRaises(SyntaxError, parser.parse, "badkey:ral name:ral")
+
+
+class TestTables(unittest.TestCase):
+
+    def test_lextab_up_to_date(self):
+        shipped = _lexer()
+        built = _lexer(optimize=False)
+        self.assertEqual(shipped.lextokens, built.lextokens)
+        self.assertEqual(
+            {s: [r.pattern for r, f in lre]
+             for s, lre in shipped.lexstatere.items()},
+            {s: [r.pattern for r, f in lre]
+             for s, lre in built.lexstatere.items()})
+
+    def test_yacctab_up_to_date(self):
+        shipped = _parser()
+        built = _parser(optimize=False, tabmodule='mtgcard.no_such_tab')
+        self.assertEqual(
+            [p.str for p in shipped.productions],
+            [p.str for p in built.productions])
+        self.assertEqual(shipped.action, built.action)
+        self.assertEqual(
+            {k: v for k, v in shipped.goto.items() if v},
+            {k: v for k, v in built.goto.items() if v})
+
+    def test_parser_built_lazily(self):
+        code = ('import sys; import mtgcard.mtgcard; '
+                'from mtgcard.parser import parser; '
+                'print(parser.parser is None, '
+                '"mtgcard.yacctab" in sys.modules)')
+        out = subprocess.check_output(
+            [sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(out.split(), [b'True', b'False'])
+
+    def test_no_database_module(self):
+        code = ('import sys; from mtgcard.parser import parser; '
+                'parser.parse("mana>=1w"); '
+                'print("mtgcard.mtgdb" in sys.modules)')
+        out = subprocess.check_output(
+            [sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(out.split(), [b'False'])
+
+
+class TestCompile(unittest.TestCase):
+
+    def test_normalize_query(self):
+        self.assertEqual(
+            normalize_query("  t:elf \t  text:'a  b'   c:g "),
+            "t:elf text:'a  b' c:g")
+        self.assertEqual(normalize_query('name:"x  y"'), 'name:"x  y"')
+
+    def test_compile_cached(self):
+        expected = parser.parse("t:elf c:g")
+        hits = parser.cache_info().hits
+        self.assertEqual(parser.compile("t:elf  c:g"), expected)
+        self.assertEqual(parser.compile(" t:elf c:g"), expected)
+        self.assertEqual(parser.cache_info().hits, hits + 1)
+
+    def test_compile_error_not_cached(self):
+        self.assertRaises(SyntaxError, parser.compile, "badkey:ral")
+        self.assertRaises(SyntaxError, parser.compile, "badkey:ral")
+
+
+class TestOptimizer(unittest.TestCase):
+
+    a = Term('a', [1], 1)
+    b = Term('b', [2], 5)
+    c = Term('c', [3], 2)
+
+    def test_cheap_first(self):
+        self.assertEqual(emit_sql(optimize_tree(And([self.b, self.a]))),
+                         ('a AND b', (1, 2)))
+
+    def test_duplicates_merged(self):
+        self.assertEqual(emit_sql(optimize_tree(And([self.a, self.a]))),
+                         ('a', (1,)))
+
+    def test_flatten_and_group(self):
+        tree = And([And([self.b, Or([self.c, self.a])]), self.a])
+        self.assertEqual(emit_sql(optimize_tree(tree)),
+                         ('a AND ( a OR c ) AND b', (1, 1, 3, 2)))
+
+    def test_not_pushed_down(self):
+        tree = Not(And([self.b, Not(self.a)]))
+        self.assertEqual(emit_sql(optimize_tree(tree)),
+                         ('a OR NOT b', (1, 2)))
+
+    def test_term_and_not_term(self):
+        tree = And([self.a, Not(self.a)])
+        self.assertEqual(emit_sql(optimize_tree(tree)), (NO_CARDS, ()))
+
+    def test_contradiction(self):
+        self.assertEqual(parser.parse('cmc=2 cmc=3'), (NO_CARDS, ()))
+        self.assertEqual(parser.parse('cmc>3 cmc<=3'), (NO_CARDS, ()))
+        self.assertEqual(parser.parse('cmc>=3 -cmc>2 cmc!=3'), (NO_CARDS, ()))
+        self.assertEqual(parser.parse('set:m20 set:eld'), (NO_CARDS, ()))
+        self.assertNotEqual(parser.parse('cmc>=3 cmc<=3')[0], NO_CARDS)
+        self.assertNotEqual(parser.parse('power=2 power=3')[0], NO_CARDS)
+        # TEXT: '4' > '10' in SQL
+        self.assertNotEqual(parser.parse('loyalty>10 loyalty<5')[0], NO_CARDS)
+
+    def test_contradiction_in_option(self):
+        self.assertEqual(parser.parse('cmc=2 cmc=3 or set:m20'),
+                         parser.parse('set:m20'))
+
+
+# searches of the tests above, with others over the test database, for
+# comparing search engines
+QUERIES = [
+    'angel', 'angel or bird', 'name:an', 'name:!angel', 'name:serra angel',
+    "name:!''", "-'serra angel'", "('serra angel' or 'shivan dragon')",
+    "set:m15 !'Serra Angel'", 'set = eld', 'set:m20 set:eld', 'legal:modern',
+    'type:angel', 'name:serra type:angel', 't:elf c:g', 'text:angel',
+    'cmc > 3', 'cmc:3', 'cmc=2 cmc=3 or set:m20', 'cmc>=3 cmc<=3',
+    'power < 3', 'power=2 power=3', 'toughness >= 3', 'loyalty <= 4',
+    'year != 2010', 'price = 0.5', 'price = 1', 'colors<ub', 'colors>ub',
+    'colors=ub', 'colors:ub', 'colors>=wx', 'colors=b colors=w',
+    'set:eld (colors=b or colors=w)', 'mana=ub', 'mana<1ub', 'mana>1ub',
+    'mana:{2/w}', 'shock', '!shock', 't:creature c:r', 'c<=c', 'c=c',
+    'mana>=ww', 'mana<=3rr', 'rarity:rare', 'layout:meld', 'insectile',
+    'boulder', 'brisela', '-t:creature', '-(c:r or c:w)', '(c:r or c:u) cmc<=2',
+    't:instant -c:r', '-power>2', '-(power>2 toughness<3)', 'year>=2019',
+    'price<1', 'f:modern shock', 'mana<=2r or t:elf',
+]
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+
+import unittest
+from tests import load_tests
+load_tests.__module__ = __name__
+
+import io
+import os
+import sys
+import stat
+import time
+import socket
+import tempfile
+import threading
+import subprocess
+from unittest.mock import patch
+
+from mtgcard import main
+from mtgcard import mtgdb
+from mtgcard import server
+
+
+class TestServer(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.tmpdir = tempfile.TemporaryDirectory()
+        cls.path = os.path.join(cls.tmpdir.name, 'mtgcard.sock')
+        cls.proc = subprocess.Popen(
+            [sys.executable, '-c',
+             # without numpy, to tell the engine of a command
+             'import sys; sys.modules["numpy"] = None; '
+             'from mtgcard import server; server.serve(sys.argv[1])',
+             cls.path],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        for i in range(200):
+            sock = server.connect(cls.path, 1)
+            if sock is not None:
+                sock.close()
+                break
+            time.sleep(0.05)
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.proc.terminate()
+        cls.proc.wait()
+        cls.tmpdir.cleanup()
+
+    def request(self, argv, path=None, timeout=30):
+        out, err = io.StringIO(), io.StringIO()
+        status = server.request(argv, path=path or self.path,
+                                timeout=timeout, out=out, err=err)
+        if status is None:
+            self.assertEqual((out.getvalue(), err.getvalue()), ('', ''))
+            return None
+        return {'status': status, 'out': out.getvalue(), 'err': err.getvalue()}
+
+    def fake_server(self, reply):
+        """Return the socket path of a server answering `reply` once."""
+        path = os.path.join(self.tmpdir.name, 'fake.sock')
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.bind(path)
+        os.chmod(path, 0o700)
+        sock.listen(1)
+        done = threading.Event()
+
+        def answer():
+            conn, _ = sock.accept()
+            with conn:
+                conn.makefile('rb').readline()
+                conn.sendall(reply)
+                done.wait(5)
+
+        thread = threading.Thread(target=answer)
+        thread.start()
+
+        def cleanup():
+            done.set()
+            thread.join()
+            sock.close()
+            os.remove(path)
+
+        self.addCleanup(cleanup)
+        return path
+
+    def run_local(self, argv):
+        out, err = io.StringIO(), io.StringIO()
+        status = main.run(main.get_args(argv), mtgdb.Interface(), out, err)
+        return {'status': status, 'out': out.getvalue(), 'err': err.getvalue()}
+
+    def test_card(self):
+        argv = ['-g', 'Shock']
+        self.assertEqual(self.request(argv), self.run_local(argv))
+
+    def test_listing(self):
+        argv = ['-g', '-l', 't:creature']
+        self.assertEqual(self.request(argv), self.run_local(argv))
+
+    def test_card_not_found(self):
+        response = self.request(['-g', 'No Such Card'])
+        self.assertEqual(response['status'], 1)
+        self.assertIn('card not found', response['err'])
+
+    def test_incompatible_options(self):
+        response = self.request(['-l', '-n', 'Shock'])
+        self.assertEqual(response['status'], 1)
+        self.assertIn('not compatible', response['err'])
+
+    def test_no_server(self):
+        path = os.path.join(self.tmpdir.name, 'none.sock')
+        self.assertIsNone(self.request(['Shock'], path=path))
+
+    def test_not_private(self):
+        os.chmod(self.path, 0o777)
+        try:
+            self.assertIsNone(self.request(['Shock']))
+        finally:
+            os.chmod(self.path, 0o700)
+        self.assertIsNotNone(self.request(['Shock']))
+
+    def test_not_a_socket(self):
+        path = os.path.join(self.tmpdir.name, 'file.sock')
+        with open(path, 'w'):
+            pass
+        self.assertFalse(server.is_private(path, stat.S_IFSOCK))
+
+    def test_engine(self):
+        response = self.request(['-l', '--engine', 'numpy', 't:creature'])
+        self.assertEqual(response['status'], 1)
+        self.assertIn('requires numpy', response['err'])
+        argv = ['-g', '-l', '--engine', 'sqlite', 't:creature']
+        self.assertEqual(self.request(argv), self.run_local(argv))
+
+    def test_stop_early(self):
+        sock = server.connect(self.path, 5)
+        with sock, sock.makefile('rb') as f:
+            sock.sendall(b'{"argv": ["-l", ""]}\n')
+            self.assertEqual(server.read_message(f), {'started': True})
+            self.assertIn('out', server.read_message(f))
+        # the server goes on with the next command
+        self.assertEqual(self.request(['-g', 'Shock']),
+                         self.run_local(['-g', 'Shock']))
+
+    def test_streamed_response(self):
+        path = self.fake_server(b'{"started": true}\n{"out": "a\\n"}\n'
+                                b'{"err": "b\\n"}\n{"out": "c"}\n'
+                                b'{"status": 2}\n')
+        self.assertEqual(self.request(['Shock'], path=path),
+                         {'status': 2, 'out': 'a\nc', 'err': 'b\n'})
+
+    def test_lost_connection(self):
+        for reply in (b'', b'not json\n', b'{"out": 1}\n'):
+            with self.subTest(reply=reply):
+                path = self.fake_server(
+                    b'{"started": true}\n{"out": "a\\n"}\n' + reply)
+                response = self.request(['Shock'], path=path, timeout=5)
+                self.doCleanups()
+                self.assertEqual(response['status'], 1)
+                self.assertEqual(response['out'], 'a\n')
+                self.assertIn('lost the connection', response['err'])
+
+    def test_not_started(self):
+        path = self.fake_server(b'')
+        self.assertIsNone(self.request(['Shock'], path=path, timeout=0.1))
+
+    def test_malformed_response(self):
+        for reply in (b'not json\n', b'[1, 2]\n', b'{"status": 0}\n',
+                      b'{"started": "yes"}\n'):
+            with self.subTest(reply=reply):
+                path = self.fake_server(reply)
+                self.assertIsNone(self.request(['Shock'], path=path))
+                self.doCleanups()
+
+    def test_socket_path(self):
+        with patch.dict(os.environ, {'XDG_RUNTIME_DIR': ''}):
+            path = server.socket_path()
+        self.assertEqual(os.path.basename(os.path.dirname(path)),
+                         'mtgcard-{}'.format(os.getuid()))